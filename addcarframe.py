@@ -14,6 +14,7 @@ FUNCTION
     __init__                 -- stores master, tk, and car_data in the AddCarFrame
                                 object, and initializes the widgets in the view
                                 allowing the user to add cars to the maintenance list
+    refresh                  -- clears the entries and message each time the view is shown
     do_add                   -- adds an additional car entry to the CarMaintenance object
                                 and returns control to the MainFrame object
     do_cancel                -- returns control to the MainFrame object
@@ -30,7 +31,7 @@ DATA
 import carmaintenance as cm
 import validation as v
 from tkinter import *
-from PIL import ImageTk, Image
+import assets
 
 
 #
@@ -48,15 +49,11 @@ class AddCarFrame:
         self.frame.pack(fill=BOTH, expand=TRUE)
 
         # Create and insert phone background image
-        load_file = "phone-background.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-background.png")
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=0, y=0, relwidth=1, relheight=1, anchor=NW)
-        load_file = "phone-hdr.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-hdr.png")
         self.img_hdr_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_hdr_panel.image = photo
         self.img_hdr_panel.place(x=20, y=80, anchor=NW)
@@ -72,10 +69,7 @@ class AddCarFrame:
         self.add_label.place(x=150, y=150, anchor=CENTER)
 
         # Create and insert car image
-        load_file = "car.png"
-        img = Image.open(load_file)
-        img = img.resize((75,75),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("car.png", (75, 75))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=150, y=230, anchor=CENTER)
@@ -102,6 +96,12 @@ class AddCarFrame:
                                      font=("Helvetica", 12), bg=self.tk.background)
         self.add_car_button.place(x=15, y=530, anchor=SW)
 
+    # clears the entries and message (called each time the view is shown)
+    def refresh(self):
+        self.car_name_entry.delete(0, END)
+        self.mileage_entry.delete(0, END)
+        self.info_label.config(text="")
+
     # adds an additional car entry to the CarMaintenance object
     def do_add(self):
 
@@ -112,13 +112,14 @@ class AddCarFrame:
         if not cm.car_data.is_new_car(car_name):
             self.info_label.config(text="Enter a new car name!")
         else:
-            mileage = self.mileage_entry.get()
+            mileage, error = v.parse_number(self.mileage_entry.get())
 
             # Verify mileage entered as a number
-            if not v.is_valid_number(mileage):
+            if mileage is None:
                 self.info_label.config(text="Enter mileage as a number!")
             else:
-                cm.car_data.add_car(car_name, mileage)
+                with self.master.data_lock.write_locked():
+                    cm.car_data.add_car(car_name, mileage)
                 self.car_name_entry.delete(0, END)
                 self.mileage_entry.delete(0, END)
                 cm.selections.set_car_selected(car_name)
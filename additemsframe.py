@@ -15,6 +15,8 @@ FUNCTION
                                  object, and initializes the widgets in the view
                                  allowing the user to add items to the maintenance list
                                  for a selected car
+    refresh                   -- clears the entries and message and shows the selected item
+                                 each time the view is shown
     do_add                    -- adds an additional item entry to the CarMaintenance object
                                  for a selected car and returns control to the ItemsFrame
                                  object
@@ -35,7 +37,7 @@ DATA
 import carmaintenance as cm
 import validation as v
 from tkinter import *
-from PIL import ImageTk, Image
+import assets
 
 
 #
@@ -55,15 +57,11 @@ class AddItemsFrame:
         self.frame.pack(fill=BOTH, expand=TRUE)
 
         # Create and insert phone background image
-        load_file = "phone-background.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-background.png")
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=0, y=0, relwidth=1, relheight=1, anchor=NW)
-        load_file = "phone-hdr.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-hdr.png")
         self.img_hdr_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_hdr_panel.image = photo
         self.img_hdr_panel.place(x=20, y=80, anchor=NW)
@@ -75,10 +73,7 @@ class AddItemsFrame:
         self.cancel_button.place(x=10, y=95, anchor=NW)
 
         # Create and insert car image
-        load_file = "car.png"
-        img = Image.open(load_file)
-        img = img.resize((40,40),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("car.png", (40, 40))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=150, y=120, anchor=CENTER)
@@ -88,10 +83,7 @@ class AddItemsFrame:
         self.car_name_label.place(x=150, y=160, anchor=CENTER)
 
         # Create and insert wrench image
-        load_file = "wrench.png"
-        img = Image.open(load_file)
-        img = img.resize((40,40),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("wrench.png", (40, 40))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=150, y=230, anchor=CENTER)
@@ -137,6 +129,15 @@ class AddItemsFrame:
         self.additem_button.place(x=15, y=530, anchor=SW)
 
         # Build the item list and display items to the user
+        self.refresh()
+
+    # clears the entries and message and shows the selected item (called each time the view is shown)
+    def refresh(self):
+        self.item_name_entry.config(state=NORMAL)
+        self.item_name_entry.delete(0, END)
+        self.mileage_freq_entry.delete(0, END)
+        self.months_freq_entry.delete(0, END)
+        self.info_label.config(text="")
         self.build_item_info()
 
     # add an additional item for the selected car into the CarMaintenance object
@@ -144,12 +145,12 @@ class AddItemsFrame:
         info_text = ""
         car = cm.selections.get_car_selected()
         item = self.item_name_entry.get().replace(' ','_')
-        freq_miles = self.mileage_freq_entry.get()
+        freq_miles, error = v.parse_number(self.mileage_freq_entry.get())
 
         # construct error message if invalid data entered
-        if not v.is_valid_number_or_blank(freq_miles): info_text = "Enter mileages as a number!"
-        freq_time = self.months_freq_entry.get()
-        if not v.is_valid_number_or_blank(freq_time): info_text = "Enter number of months as a number!"
+        if error is not None: info_text = "Enter mileages as a number!"
+        freq_time, error = v.parse_number(self.months_freq_entry.get())
+        if error is not None: info_text = "Enter number of months as a number!"
 
         # Issue warning to user if no Maintenance Item specified
         if item == "":
@@ -164,15 +165,18 @@ class AddItemsFrame:
                     self.info_label.config(text="Maintenance item already exists!")
                 else:
                     # if updating get the stored data for the last time maintenance was performed for this item
-                    if self.update_mode:
-                        last_maint_mileage = cm.car_data.get_item_last_mileage(car, item)
-                        last_maint_date = cm.car_data.get_item_last_date(car, item)
-                    else:
-                        last_maint_mileage = ""
-                        last_maint_date = ""
-
-                    # update the stored information for this maintenance item
-                    cm.car_data.add_car_items(car, item, freq_miles, freq_time, last_maint_mileage, last_maint_date)
+                    # (with the data lock held, so a service recorded through the API meanwhile is kept)
+                    with self.master.data_lock.write_locked():
+                        if self.update_mode:
+                            last_maint_mileage = cm.car_data.get_item_last_mileage(car, item)
+                            last_maint_date = cm.car_data.get_item_last_date(car, item)
+                        else:
+                            last_maint_mileage = None
+                            last_maint_date = None
+
+                        # update the stored information for this maintenance item
+                        cm.car_data.add_car_items(car, item, freq_miles, freq_time, last_maint_mileage,
+                                                  last_maint_date)
 
                     # return to perform maintenance view if updating or to the items view if adding new item data
                     if self.update_mode:
@@ -208,9 +212,9 @@ class AddItemsFrame:
             self.item_name_entry.insert(0, item_text_entry)
             self.item_name_entry.config(state=DISABLED)
             freq_miles = cm.car_data.get_item_freq_miles(car, item)
-            if freq_miles != 0: self.mileage_freq_entry.insert(0, freq_miles)
+            if freq_miles is not None: self.mileage_freq_entry.insert(0, freq_miles)
             freq_months = cm.car_data.get_item_freq_time(car, item)
-            if freq_months != 0: self.months_freq_entry.insert(0, freq_months)
+            if freq_months is not None: self.months_freq_entry.insert(0, freq_months)
             self.add_items_label.config(text="Update Maintenance Item")
         else:
             self.add_items_label.config(text="Add Maintenance Item")
@@ -0,0 +1,153 @@
+"""
+Name
+    apiloadtest
+
+DESCRIPTION
+    This module contains the load test of the API server (see apiserver).  Each connection is
+    a thread sending its requests one after another on a kept open HTTP/1.1 connection, a mix
+    of reading a car (GET /cars/<car>), the due items (GET /due) and updating a car's mileage
+    (PUT /cars/<car>/mileage).  The latency of every request is recorded and the requests per
+    second and the p50/p90/p99 latencies reported.
+
+        python apiloadtest.py [--url http://HOST:PORT] [--connections N] [--requests N]
+                              [--writes FRACTION] [--due FRACTION]
+
+    Without --url a server is started in this process for a generated fleet (the server then
+    competes with the load test for the interpreter, so use --url for the server's own numbers).
+
+CLASS
+    None
+
+FUNCTION
+    run_connection        -- sends the requests of one connection and records their latencies
+    run_load_test         -- runs the connections and returns the results
+    get_percentile        -- returns a percentile of the sorted latencies
+    print_results         -- prints the requests per second and the latencies
+    main                  -- runs the load test from the command line
+
+DATA
+    None
+"""
+
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+
+#
+# Sends the requests on one kept open connection, appending the latency of each request to
+# latencies and the failed requests to errors
+#
+def run_connection(host, port, car_names, request_count, writes, due, latencies, errors, seed):
+    choose = random.Random(seed)
+    connection = http.client.HTTPConnection(host, port)
+    mileage = 100000 + seed * request_count
+    for request in range(request_count):
+        car = quote(choose.choice(car_names))
+        choice = choose.random()
+        if choice < writes:
+            mileage += 1
+            method, path, body = 'PUT', '/cars/' + car + '/mileage', json.dumps({'mileage': mileage})
+        elif choice < writes + due:
+            method, path, body = 'GET', '/due', None
+        else:
+            method, path, body = 'GET', '/cars/' + car, None
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body, {'Content-Type': 'application/json'} if body else {})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(method + " " + path + ": " + str(response.status))
+        except (OSError, http.client.HTTPException) as error:
+            errors.append(method + " " + path + ": " + str(error))
+            connection.close()
+            connection = http.client.HTTPConnection(host, port)
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+#
+# Runs the connections against the server at the url (or a server started in this process for a
+# generated fleet), returns (latencies in seconds, errors, elapsed seconds)
+#
+def run_load_test(url=None, connections=8, requests=2000, writes=0.1, due=0.01, car_count=1000):
+    server = None
+    if url is None:
+        import apiserver
+        import benchmarks
+        server = apiserver.start_server(benchmarks.make_fleet(car_count, 5), port=0)
+        host, port = server.server_address[:2]
+    else:
+        address = urlsplit(url)
+        host, port = address.hostname, address.port or 80
+
+    connection = http.client.HTTPConnection(host, port)
+    connection.request('GET', '/cars')
+    car_names = [car['car'] for car in json.loads(connection.getresponse().read())]
+    connection.close()
+
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=run_connection, args=(host, port, car_names, requests // connections,
+                                                             writes, due, latencies, errors, number))
+               for number in range(connections)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    return latencies, errors, elapsed
+
+
+#
+# Returns the percentile (0 to 100) of the sorted latencies
+#
+def get_percentile(sorted_latencies, percentile):
+    if not sorted_latencies:
+        return 0.0
+    index = min(len(sorted_latencies) - 1, int(len(sorted_latencies) * percentile / 100))
+    return sorted_latencies[index]
+
+
+#
+# Prints the requests per second and the p50/p90/p99/max latencies
+#
+def print_results(name, latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    print("    %-24s %8.0f req/s  p50 %6.2f ms  p90 %6.2f ms  p99 %6.2f ms  max %6.2f ms  errors %d" % (
+        name, len(latencies) / elapsed, get_percentile(latencies, 50) * 1e3, get_percentile(latencies, 90) * 1e3,
+        get_percentile(latencies, 99) * 1e3, latencies[-1] * 1e3 if latencies else 0.0, len(errors)))
+    for error in errors[:5]:
+        print("        " + error)
+
+
+#
+# Runs the load test from the command line
+#
+def main(args):
+    parser = argparse.ArgumentParser(prog='apiloadtest', description="Load test of the API server")
+    parser.add_argument('--url', help="server to test, e.g. http://127.0.0.1:8080 (default: a server in this process)")
+    parser.add_argument('--connections', type=int, default=8, help="number of connections (default 8)")
+    parser.add_argument('--requests', type=int, default=4000, help="total number of requests (default 4000)")
+    parser.add_argument('--writes', type=float, default=0.1, help="fraction of mileage updates (default 0.1)")
+    parser.add_argument('--due', type=float, default=0.01, help="fraction of due item requests (default 0.01)")
+    args = parser.parse_args(args)
+
+    latencies, errors, elapsed = run_load_test(args.url, args.connections, args.requests, args.writes, args.due)
+    print("api load test: %d requests on %d connections" % (len(latencies), args.connections))
+    print_results("%d connections" % args.connections, latencies, errors, elapsed)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,343 @@
+"""
+Name
+    apiserver
+
+DESCRIPTION
+    This module contains the HTTP/JSON API server letting dispatch terminals and scripts query
+    and update the car maintenance data.  It runs on localhost by default
+
+        python apiserver.py [--file FILE] [--host HOST] [--port PORT]
+
+    and answers the requests (car and item names as in the views, spaces may be used for
+    underscores, dates are mm/dd/yyyy)
+
+        GET  /cars                            -- [{"car", "mileage", "needs_maintenance"}]
+        GET  /cars/<car>                      -- {"car", "mileage", "needs_maintenance",
+                                                  "items": [{"item", "freq_miles", "freq_time",
+                                                  "last_mileage", "last_date", "due_date",
+                                                  "needs_maintenance"}]}
+        GET  /due                             -- {car: [items needing maintenance]}
+        PUT  /cars/<car>/mileage              -- {"mileage"}, returns {"car", "mileage",
+                                                  "newly_due"}
+        POST /cars/<car>/items/<item>/service -- {"mileage", "date"} (the car's mileage and
+                                                  today if not given), returns the item as
+                                                  for GET /cars/<car>
+
+    Errors are answered with {"error": message} and a 400 (invalid request) or 404 (unknown
+    car, item or path) status.
+
+    Each connection is served by its own thread and kept open between requests (HTTP/1.1
+    keep-alive), the requests sent on a connection without waiting for the answers are
+    answered in order.  The data is guarded by a ReadWriteLock so any number of requests
+    reading the data run together and only the updates run alone.  The requests reading the
+    data still fill the status caches and build the FleetStatus, so the data is served as a
+    ConcurrentCarMaintenance (see concurrentfleet), whose car and fleet locks keep the readers
+    from racing each other (and the autosave thread from copying a half changed car).  Changes
+    are written to the data file as the application does (the journal and SQLite storages
+    write each change, a pickle file and the .dat snapshot are autosaved).
+
+    To use the API while the application runs, start the application with --api-port PORT:
+    it serves its own data with start_server on a daemon thread, sharing the ReadWriteLock
+    its views hold while they change the data (see carmaintmain).  Run on its own, the server
+    locks the data file while it runs (see locking.DataFileLock) and refuses to start while
+    the application, the odometer ingestion service or the command line is using it.
+
+CLASS
+    ApiError              -- error answered to a request, with its HTTP status
+    ApiServer             -- threading HTTP server holding the car maintenance data and its lock
+    ApiRequestHandler     -- answers the requests of a connection
+
+FUNCTION
+                            -- ApiServer methods
+    __init__              -- creates the server for the car maintenance data
+                            -- ApiRequestHandler methods
+    do_GET, do_PUT, do_POST -- answer the requests
+    handle_api            -- routes a request to its method and sends the answer
+    read_json             -- reads the JSON body of a request
+    send_json             -- sends a JSON answer
+    log_message           -- logs the requests only when the server is verbose
+    get_cars              -- GET /cars
+    get_car               -- GET /cars/<car>
+    get_due               -- GET /due
+    set_mileage           -- PUT /cars/<car>/mileage
+    record_service        -- POST /cars/<car>/items/<item>/service
+    get_item              -- returns the JSON of an item
+    check_car             -- raises a 404 ApiError for an unknown car
+                            -- Additional Functions
+    check_status_date     -- updates the cached status with the write lock held once the date
+                             changes
+    start_server          -- starts a server on a background thread
+    main                  -- runs the server from the command line
+
+DATA
+    default_port          -- port the server listens on unless another is given
+    self.car_data         -- ConcurrentCarMaintenance served (a CarMaintenance object given is
+                             taken over)
+    self.lock             -- ReadWriteLock guarding the car maintenance data
+    self.verbose          -- True to log each request
+"""
+
+import argparse
+import json
+import sys
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+import carmaintenance as cm
+import concurrentfleet
+import locking
+import validation as v
+
+default_port = 8080
+
+
+#
+# Error answered to a request with its HTTP status
+#
+class ApiError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+#
+# Threading HTTP server holding the car maintenance data and the lock guarding it
+#
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    # creates the server for the car maintenance data, lock is shared with any other threads using
+    # the data, a CarMaintenance object is taken over by a ConcurrentCarMaintenance (see
+    # self.car_data)
+    def __init__(self, car_data, address=('127.0.0.1', default_port), lock=None, verbose=False):
+        super().__init__(address, ApiRequestHandler)
+        if not isinstance(car_data, concurrentfleet.ConcurrentCarMaintenance):
+            car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(car_data)
+        self.car_data = car_data
+        self.lock = locking.ReadWriteLock() if lock is None else lock
+        self.verbose = verbose
+
+
+#
+# Answers the requests of a connection, the connection is kept open between requests
+#
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    # answer the requests
+    def do_GET(self):
+        self.handle_api('GET')
+
+    def do_PUT(self):
+        self.handle_api('PUT')
+
+    def do_POST(self):
+        self.handle_api('POST')
+
+    # routes the request to its method by the path and sends the answer (or the error)
+    def handle_api(self, method):
+        try:
+            body = self.read_json()
+            path = urlsplit(self.path).path.strip('/')
+            parts = [unquote(part).replace(' ', '_') for part in path.split('/')]
+            if method == 'GET' and parts == ['cars']:
+                answer = self.get_cars()
+            elif method == 'GET' and parts == ['due']:
+                answer = self.get_due()
+            elif method == 'GET' and len(parts) == 2 and parts[0] == 'cars':
+                answer = self.get_car(parts[1])
+            elif method == 'PUT' and len(parts) == 3 and parts[0] == 'cars' and \
+                    parts[2] == 'mileage':
+                answer = self.set_mileage(parts[1], body)
+            elif method == 'POST' and len(parts) == 5 and parts[0] == 'cars' and \
+                    parts[2] == 'items' and parts[4] == 'service':
+                answer = self.record_service(parts[1], parts[3], body)
+            else:
+                raise ApiError(404, "Unknown request " + method + " " + self.path)
+            self.send_json(200, answer)
+        except ApiError as error:
+            self.send_json(error.status, {'error': error.message})
+
+    # reads the JSON object sent with the request (an empty object when there is no body)
+    def read_json(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            # the rest of the request cannot be found, the connection is closed after the answer
+            self.close_connection = True
+            raise ApiError(400, "Invalid Content-Length")
+        if length <= 0:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(400, "Request is not valid JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "Request is not a JSON object")
+        return body
+
+    # sends the answer as JSON with its length, so the connection can be kept open
+    def send_json(self, status, answer):
+        data = json.dumps(answer).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # logs the request only when the server is verbose
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # returns the cars with their mileage and maintenance needed status
+    def get_cars(self):
+        car_data = self.server.car_data
+        check_status_date(self.server)
+        with self.server.lock.read_locked():
+            return [{'car': car, 'mileage': car_data.get_mileage(car),
+                     'needs_maintenance': car_data.does_car_need_maintenance(car)}
+                    for car in car_data.get_car_list()]
+
+    # returns the car with its items
+    def get_car(self, car):
+        car_data = self.server.car_data
+        check_status_date(self.server)
+        with self.server.lock.read_locked():
+            self.check_car(car)
+            return {'car': car, 'mileage': car_data.get_mileage(car),
+                    'needs_maintenance': car_data.does_car_need_maintenance(car),
+                    'items': [self.get_item(car, item) for item in car_data.get_items_list(car)]}
+
+    # returns the items needing maintenance of each car needing maintenance
+    def get_due(self):
+        check_status_date(self.server)
+        with self.server.lock.read_locked():
+            return self.server.car_data.get_items_needing_maintenance()
+
+    # sets the car's mileage, returns the items that became due
+    def set_mileage(self, car, body):
+        mileage, error = v.parse_number(str(body.get('mileage', "")).strip())
+        if mileage is None:
+            raise ApiError(400, "Enter mileage as a number!")
+        with self.server.lock.write_locked():
+            self.check_car(car)
+            newly_due = self.server.car_data.set_mileage(car, mileage)
+        return {'car': car, 'mileage': mileage, 'newly_due': newly_due}
+
+    # records the maintenance performed on the car's item (at the car's mileage and today unless
+    # given)
+    def record_service(self, car, item, body):
+        mileage, error = v.parse_number(str(body.get('mileage', "")).strip())
+        if error is not None:
+            raise ApiError(400, "Enter mileages as a number!")
+        service_date, error = v.parse_date(str(body.get('date', "")).strip())
+        if error is not None:
+            raise ApiError(400, "Enter valid date as mm/dd/yyyy!")
+        car_data = self.server.car_data
+        with self.server.lock.write_locked():
+            self.check_car(car)
+            if car_data.is_new_item(car, item):
+                raise ApiError(404, "Unknown maintenance item " + item + "!")
+            if mileage is None:
+                mileage = car_data.get_mileage(car)
+            if service_date is None:
+                service_date = date.today()
+            car_data.add_car_items(car, item, car_data.get_item_freq_miles(car, item),
+                                   car_data.get_item_freq_time(car, item), mileage, service_date)
+            return self.get_item(car, item)
+
+    # returns the JSON of the car's item (with the lock held)
+    def get_item(self, car, item):
+        car_data = self.server.car_data
+        return {'item': item,
+                'freq_miles': car_data.get_item_freq_miles(car, item),
+                'freq_time': car_data.get_item_freq_time(car, item),
+                'last_mileage': car_data.get_item_last_mileage(car, item),
+                'last_date': cm.date_to_text(car_data.get_item_last_date(car, item)),
+                'due_date': cm.date_to_text(car_data.get_item_due_date(car, item)),
+                'needs_maintenance': car_data.does_item_need_maintenance(car, item)}
+
+    # raises a 404 error for an unknown car (with the lock held)
+    def check_car(self, car):
+        if car not in self.server.car_data.cars:
+            raise ApiError(404, "Unknown car " + car + "!")
+
+
+#
+# Updates the cached maintenance needed status once the date changes, with the write lock held
+# since the status of many items may change (the readers only fill the caches with status
+# worked out from the data they are reading)
+#
+def check_status_date(server):
+    if server.car_data.status_date != date.today():
+        with server.lock.write_locked():
+            server.car_data.check_status_date()
+
+
+#
+# Starts a server for the car maintenance data on a background thread (port 0 picks a free
+# port, see server.server_address), stop it with server.shutdown() - use server.car_data
+# from then on (see ApiServer)
+#
+def start_server(car_data, host='127.0.0.1', port=default_port, lock=None, verbose=False):
+    server = ApiServer(car_data, (host, port), lock, verbose)
+    threading.Thread(target=server.serve_forever, name='api-server', daemon=True).start()
+    return server
+
+
+#
+# Runs the server for the data file until interrupted, then stores the data, returns 1 if
+# another process is using the data file
+#
+def main(args):
+    import autosave
+    import storage
+    parser = argparse.ArgumentParser(prog='apiserver',
+                                     description="HTTP/JSON API over the car maintenance data")
+    parser.add_argument('--file', default=cm.storage_file_name,
+                        help="data file (default " + cm.storage_file_name + ")")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="address to listen on (default 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=default_port,
+                        help="port to listen on (default %d)" % default_port)
+    parser.add_argument('--verbose', action='store_true', help="log each request")
+    args = parser.parse_args(args)
+
+    data_file_lock = locking.DataFileLock(args.file)
+    try:
+        data_file_lock.acquire()
+    except OSError as error:
+        print("apiserver: " + str(error), file=sys.stderr)
+        print("apiserver: start the application with --api-port PORT to serve the API while it "
+              "runs", file=sys.stderr)
+        return 1
+    car_data = cm.retrieve_car_maintenance_data(args.file)
+    car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(car_data)
+    autosaver = autosave.start_autosave(car_data, args.file)
+
+    server = ApiServer(car_data, (args.host, args.port), verbose=args.verbose)
+    print("Serving on http://%s:%d/" % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        with server.lock.write_locked():
+            if autosaver is not None:
+                autosaver.close()
+            else:
+                cm.store_car_maintenance_data(car_data, args.file)
+            storage.close_attached(car_data)
+        data_file_lock.release()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
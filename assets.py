@@ -0,0 +1,109 @@
+"""
+Name
+    assets
+
+DESCRIPTION
+    This module contains the image cache shared by all of the views.  Each image file is
+    opened, decoded and resized once per size requested and the PhotoImage created from it is
+    shared by every view showing the image, so switching views does not read any image files.
+    The images can be decoded ahead of time (optionally on a background thread) by preload,
+    the PhotoImages themselves are created on the user interface thread when first used.
+    PIL is only imported when the first image is decoded, so importing this module is cheap
+    and a background preload also takes the PIL import off the user interface thread.
+
+CLASS
+    None
+
+FUNCTION
+    get_image             -- returns the decoded (and resized) PIL image for a file and size
+    get_photo             -- returns the shared PhotoImage for a file and size
+    preload               -- decodes and resizes the images used by the views
+    wait_for_preload      -- waits for a background preload to finish
+
+DATA
+    view_images           -- (file name, size) of each image used by the views
+    images                -- decoded images, (file name, size) -> PIL image
+    photos                -- shared PhotoImages, (file name, size) -> PhotoImage
+    images_lock           -- held while an image is decoded
+    preload_thread        -- thread running a background preload (None if not started)
+"""
+
+import threading
+
+view_images = [
+    ("phone-background.png", None),
+    ("phone-hdr.png", None),
+    ("car.png", (75, 75)),
+    ("car.png", (40, 40)),
+    ("car.png", (30, 30)),
+    ("car.png", (25, 25)),
+    ("wrench.png", (40, 40)),
+    ("wrench.png", (30, 30)),
+]
+images = {}
+photos = {}
+images_lock = threading.Lock()
+preload_thread = None
+
+
+#
+# Returns the decoded PIL image for the file, resized to the (width, height) size if given,
+# the file is only read and resized the first time
+#
+def get_image(file_name, size=None):
+    key = (file_name, size)
+    image = images.get(key)
+    if image is None:
+        with images_lock:
+            image = images.get(key)
+            if image is None:
+                from PIL import Image
+                image = Image.open(file_name)
+                image.load()
+                if size is not None:
+                    image = image.resize(size, Image.LANCZOS)
+                images[key] = image
+    return image
+
+
+#
+# Returns the PhotoImage for the file and size shared by all views (call from the user interface thread)
+#
+def get_photo(file_name, size=None):
+    key = (file_name, size)
+    photo = photos.get(key)
+    if photo is None:
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(get_image(file_name, size))
+        photos[key] = photo
+    return photo
+
+
+#
+# Decodes and resizes the images used by the views, on a background thread if requested
+#
+def preload(image_keys=None, background=False):
+    global preload_thread
+    if image_keys is None:
+        image_keys = view_images
+
+    def load_images():
+        for file_name, size in image_keys:
+            try:
+                get_image(file_name, size)
+            except OSError:
+                print("Error loading image " + file_name)
+
+    if background:
+        preload_thread = threading.Thread(target=load_images, name='preload-images', daemon=True)
+        preload_thread.start()
+    else:
+        load_images()
+
+
+#
+# Waits for a background preload to finish
+#
+def wait_for_preload():
+    if preload_thread is not None:
+        preload_thread.join()
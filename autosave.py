@@ -0,0 +1,255 @@
+"""
+Name
+    autosave
+
+DESCRIPTION
+    This module contains the autosave of the car maintenance data to a pickle file (or the
+    snapshot of a journaled pickle file).  The
+    AutoSaver is attached to the CarMaintenance object as a listener (see storage) and marks
+    the data dirty after each change.  A worker thread waits until no change has been made
+    for the debounce delay, so a burst of edits is saved once, then pickles the data and
+    writes it through a temporary file, fsync and rename, so the user interface never waits
+    for a save and a crash leaves either the old or the new file.
+
+    Changes made while a snapshot is being pickled mark the data dirty again, so they are
+    saved by the next save.  No save is started in the middle of a batch of changes.
+
+    For the default journaled data file (.dat, JournaledPickleStorage) the journal still
+    hands each change to the OS as it is made, and the AutoSaver writes the snapshot: the
+    journal is moved aside while a copy of the data is taken with no car changing (see
+    ConcurrentCarMaintenance.get_snapshot), and removed once the snapshot holding its changes
+    is written.  The journal no longer folds itself into the snapshot on a thread of its own,
+    so every snapshot write is debounced, atomic and counted in get_stats.  The SQLite storage
+    commits each change as it is made and is not autosaved.
+
+CLASS
+    AutoSaver             -- listener that saves the data a short time after it changes
+
+FUNCTION
+                            -- AutoSaver methods
+    __init__              -- store the file name and debounce delay and start the worker thread
+    attach                -- attaches the saver to a CarMaintenance object (and its journal)
+    detach                -- detaches the saver from its CarMaintenance object
+    mark_dirty            -- records a change and restarts the debounce delay
+    run                   -- worker thread waiting for the data to change and saving it
+    save                  -- saves the data now if it changed since the last save
+    flush                 -- saves the data now if it changed since the last save
+    close                 -- stops the worker thread and saves any unsaved changes
+    get_stats             -- returns the save latency, bytes written and save counters
+    begin_batch, end_batch -- listener methods called around a batch of changes
+    add_car               -- listener methods marking the data dirty
+    del_car
+    set_mileage
+    add_car_items
+    del_car_items
+                            -- Additional Functions
+    snapshot              -- pickles the CarMaintenance object while it may be changing
+    start_autosave        -- returns an AutoSaver attached to the data of a pickle or journaled
+                             pickle file (None for the other storages)
+
+DATA
+    delay                 -- default number of seconds without changes before saving
+    self.journal          -- JournaledPickleStorage of the data file attached to the data (or None),
+                             whose snapshot the saver writes
+    self.changes          -- number of changes not yet saved
+    self.last_change      -- time.monotonic() of the last change
+    self.save_lock        -- held while a save is running (one save at a time)
+    self.condition        -- guards the change counters and wakes the worker thread
+"""
+
+import os
+import pickle
+import threading
+import time
+import storage
+
+delay = 2.0
+
+
+#
+# Listener saving the CarMaintenance object to a pickle file a short time after it changes
+#
+class AutoSaver(storage.Storage):
+
+    # store the file name and debounce delay and start the worker thread
+    def __init__(self, file_name, debounce_delay=None):
+        super().__init__(file_name)
+        self.delay = delay if debounce_delay is None else debounce_delay
+        self.car_data = None
+        self.journal = None
+        self.changes = 0
+        self.last_change = 0.0
+        self.batch_depth = 0
+        self.stopping = False
+        self.save_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.save_count = 0
+        self.saves_skipped = 0
+        self.save_errors = 0
+        self.bytes_written = 0
+        self.last_save_seconds = 0.0
+        self.max_save_seconds = 0.0
+        self.total_save_seconds = 0.0
+        self.worker = threading.Thread(target=self.run, name='autosave', daemon=True)
+        self.worker.start()
+
+    # attaches the saver to the CarMaintenance object (detaching it from the previous one), when
+    # the data file's journal is attached to the object the saver writes the journal's snapshot
+    def attach(self, car_data):
+        self.detach()
+        self.car_data = car_data
+        journal = storage.open_journals.get(os.path.abspath(self.file_name))
+        if journal is not None and journal in car_data.listeners:
+            self.journal = journal
+            journal.saver = self
+        car_data.add_listener(self)
+
+    # detaches the saver from its CarMaintenance object
+    def detach(self):
+        if self.car_data is not None and self in self.car_data.listeners:
+            self.car_data.remove_listener(self)
+        if self.journal is not None:
+            self.journal.saver = None
+            self.journal = None
+        self.car_data = None
+
+    # records a change and restarts the debounce delay
+    def mark_dirty(self):
+        with self.condition:
+            self.changes += 1
+            self.last_change = time.monotonic()
+            self.condition.notify()
+
+    # worker thread - waits until the data changed and then stayed unchanged for the
+    # debounce delay (outside of a batch), then saves it
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopping:
+                    if self.changes and self.batch_depth == 0:
+                        wait = self.last_change + self.delay - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self.condition.wait(wait)
+                    else:
+                        self.condition.wait()
+                if self.stopping:
+                    return
+            self.save()
+
+    # saves the data now if it changed since the last save, returns True if it was saved
+    def save(self):
+        with self.save_lock:
+            with self.condition:
+                changes = self.changes
+                self.changes = 0
+            car_data = self.car_data
+            journal = self.journal
+            if car_data is None or changes == 0:
+                with self.condition:
+                    self.saves_skipped += 1
+                return False
+
+            start = time.perf_counter()
+            try:
+                if journal is not None:
+                    # the journal is moved aside with no car changing, the copy holds its changes
+                    data = snapshot(car_data.get_snapshot(journal.start_snapshot))
+                    storage.write_file_atomically(self.file_name, data)
+                    journal.end_snapshot()
+                else:
+                    data = snapshot(car_data)
+                    storage.write_file_atomically(self.file_name, data)
+            except OSError:
+                print("Error saving file " + self.file_name)
+                with self.condition:
+                    self.changes += changes
+                    self.save_errors += 1
+                return False
+            seconds = time.perf_counter() - start
+
+            with self.condition:
+                self.save_count += 1
+                self.bytes_written += len(data)
+                self.last_save_seconds = seconds
+                self.max_save_seconds = max(self.max_save_seconds, seconds)
+                self.total_save_seconds += seconds
+            return True
+
+    # saves the data now if it changed since the last save
+    def flush(self):
+        self.save()
+
+    # stops the worker thread and saves any changes not yet saved
+    def close(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.worker.join()
+        self.save()
+
+    # returns the save latency (seconds), bytes written and save counters
+    def get_stats(self):
+        with self.condition:
+            return {'saves': self.save_count, 'skipped': self.saves_skipped, 'errors': self.save_errors,
+                    'pending_changes': self.changes, 'bytes_written': self.bytes_written,
+                    'last_seconds': self.last_save_seconds, 'max_seconds': self.max_save_seconds,
+                    'mean_seconds': self.total_save_seconds / self.save_count if self.save_count else 0.0}
+
+    # listener methods - no save is started in the middle of a batch of changes
+    def begin_batch(self):
+        with self.condition:
+            self.batch_depth += 1
+
+    def end_batch(self):
+        with self.condition:
+            self.batch_depth -= 1
+            self.condition.notify()
+
+    # listener methods - mark the data dirty after each change
+    def add_car(self, car_name, mileage):
+        self.mark_dirty()
+
+    def del_car(self, car_name):
+        self.mark_dirty()
+
+    def set_mileage(self, car_name, mileage):
+        self.mark_dirty()
+
+    def add_car_items(self, car_name, item_name, freq_miles, freq_time, last_mileage, last_date):
+        self.mark_dirty()
+
+    def del_car_items(self, car_name, item_name):
+        self.mark_dirty()
+
+
+#
+# Pickles the CarMaintenance object, retrying if the user interface changed a dictionary
+# while it was being pickled (the change marked the data dirty, so it is saved next time)
+#
+def snapshot(car_data, attempts=5):
+    for attempt in range(attempts - 1):
+        try:
+            return pickle.dumps(car_data)
+        except RuntimeError:
+            pass
+    return pickle.dumps(car_data)
+
+
+#
+# Returns an AutoSaver attached to the data retrieved from a pickle or journaled pickle file, or
+# None for the other storages (SQLite commits each change, a binary fleet file is only written
+# when stored).  The journal can only be moved aside while no change is made to a
+# ConcurrentCarMaintenance, other journaled data is left to the journal's own compaction (None).
+#
+def start_autosave(car_data, file_name):
+    import concurrentfleet
+    storage_class = storage.get_storage_class(file_name)
+    if storage_class is storage.JournaledPickleStorage:
+        if not isinstance(car_data, concurrentfleet.ConcurrentCarMaintenance):
+            return None
+    elif storage_class is not storage.PickleStorage:
+        return None
+    saver = AutoSaver(file_name)
+    saver.attach(car_data)
+    return saver
@@ -0,0 +1,266 @@
+"""
+Name
+    backupstore
+
+DESCRIPTION
+    This module contains the backup store keeping many point in time snapshots of the car
+    maintenance data in a directory:
+
+        chunks/xx/<digest>[.z]  -- one chunk per car holding its mileage and items as JSON,
+                                   named by the SHA-256 digest of the JSON (.z if zlib compressed)
+        snapshots/<id>.json     -- manifest of a snapshot, its creation time and the
+                                   (car name, chunk digest) of each car in car list order
+
+    A car's chunk is only written once, so cars unchanged between snapshots share their chunk.
+    Attached to the CarMaintenance object as a listener (see storage), the store tracks the
+    cars changed since the last backup or restore, so a backup only encodes the changed cars
+    and a restore only reads and applies the chunks of the cars that differ.  Listing and
+    diffing snapshots only read the manifests.
+
+CLASS
+    BackupStore           -- directory of snapshots made of per car content addressed chunks
+
+FUNCTION
+                            -- BackupStore methods
+    __init__              -- store the directory and whether new chunks are compressed
+    attach                -- attaches the store to a CarMaintenance object to track changed cars
+    detach                -- detaches the store from its CarMaintenance object
+    get_car_digest        -- returns the chunk digest of a car (encoding it only if it changed)
+    get_chunk_file_name   -- returns the file name of a chunk
+    write_chunk           -- writes a chunk unless it is already stored
+    read_chunk            -- reads a car from its chunk
+    backup                -- writes a snapshot of the data, returns the snapshot id
+    list_snapshots        -- returns the id, creation time and car count of each snapshot
+    latest_snapshot       -- returns the id of the newest snapshot
+    read_manifest_file    -- returns the contents of a snapshot's manifest
+    read_manifest         -- returns the (car name, digest) of each car in a snapshot
+    diff_snapshots        -- returns the cars added, removed and changed between two snapshots
+    restore               -- restores all or selected cars of a snapshot into the data
+    add_car               -- listener methods recording the changed cars
+    del_car
+    set_mileage
+    add_car_items
+    del_car_items
+                            -- Additional Functions
+    encode_car            -- returns the JSON chunk of a car
+    decode_car            -- returns the car stored in a JSON chunk
+
+DATA
+    self.digests          -- chunk digest of each unchanged car, car name -> digest
+    self.changed          -- names of the cars changed since they were backed up or restored
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime
+import carmaintenance as cm
+import storage
+
+
+#
+# Directory of snapshots of the car maintenance data made of per car content addressed chunks
+#
+class BackupStore(storage.Storage):
+
+    # store the directory and whether new chunks are zlib compressed
+    def __init__(self, directory, compress=True):
+        super().__init__(directory)
+        self.directory = directory
+        self.compress = compress
+        self.chunks_directory = os.path.join(directory, 'chunks')
+        self.snapshots_directory = os.path.join(directory, 'snapshots')
+        self.car_data = None
+        self.digests = {}
+        self.changed = set()
+
+    # attaches the store to the CarMaintenance object to track the cars changed from now on
+    def attach(self, car_data):
+        self.detach()
+        self.car_data = car_data
+        car_data.add_listener(self)
+
+    # detaches the store from its CarMaintenance object, no changed cars are tracked
+    def detach(self):
+        if self.car_data is not None and self in self.car_data.listeners:
+            self.car_data.remove_listener(self)
+        self.car_data = None
+        self.digests = {}
+        self.changed = set()
+
+    # returns the chunk digest of the car and its chunk (None unless the car had to be encoded),
+    # a car unchanged since it was backed up or restored is not encoded again
+    def get_car_digest(self, car_data, car_name):
+        if car_data is self.car_data and car_name not in self.changed and car_name in self.digests:
+            return self.digests[car_name], None
+        chunk = encode_car(car_data.cars[car_name])
+        return hashlib.sha256(chunk).hexdigest(), chunk
+
+    # returns the file name of the chunk
+    def get_chunk_file_name(self, digest, compressed):
+        return os.path.join(self.chunks_directory, digest[:2], digest + ('.z' if compressed else ''))
+
+    # writes the chunk unless a chunk with the same digest is already stored
+    def write_chunk(self, digest, chunk):
+        if os.path.exists(self.get_chunk_file_name(digest, True)) or \
+                os.path.exists(self.get_chunk_file_name(digest, False)):
+            return
+        file_name = self.get_chunk_file_name(digest, self.compress)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        storage.write_file_atomically(file_name, zlib.compress(chunk) if self.compress else chunk)
+
+    # reads the car stored in the chunk
+    def read_chunk(self, car_name, digest):
+        file_name = self.get_chunk_file_name(digest, True)
+        if os.path.exists(file_name):
+            with open(file_name, 'rb') as file:
+                return decode_car(car_name, zlib.decompress(file.read()))
+        with open(self.get_chunk_file_name(digest, False), 'rb') as file:
+            return decode_car(car_name, file.read())
+
+    # writes a snapshot of the CarMaintenance object (the attached one if none given) and
+    # returns its id, only the chunks of cars changed since the last backup are written
+    def backup(self, car_data=None):
+        if car_data is None:
+            car_data = self.car_data
+        cars = []
+        for car_name in car_data.cars:
+            digest, chunk = self.get_car_digest(car_data, car_name)
+            if chunk is not None:
+                self.write_chunk(digest, chunk)
+            cars.append([car_name, digest])
+
+        created = datetime.now()
+        snapshot_id = created.strftime('%Y%m%d-%H%M%S-%f')
+        os.makedirs(self.snapshots_directory, exist_ok=True)
+        manifest = {'id': snapshot_id, 'created': created.isoformat(timespec='seconds'), 'cars': cars}
+        storage.write_file_atomically(os.path.join(self.snapshots_directory, snapshot_id + '.json'),
+                                      json.dumps(manifest, separators=(',', ':')).encode('utf-8'))
+        if car_data is self.car_data:
+            self.digests = dict(cars)
+            self.changed = set()
+        return snapshot_id
+
+    # returns the (id, creation time, car count) of each snapshot, oldest first
+    def list_snapshots(self):
+        if not os.path.isdir(self.snapshots_directory):
+            return []
+        snapshots = []
+        for file_name in sorted(os.listdir(self.snapshots_directory)):
+            if file_name.endswith('.json'):
+                manifest = self.read_manifest_file(file_name[:-len('.json')])
+                snapshots.append((manifest['id'], manifest['created'], len(manifest['cars'])))
+        return snapshots
+
+    # returns the id of the newest snapshot (None if there are no snapshots), ids sort by time
+    def latest_snapshot(self):
+        if not os.path.isdir(self.snapshots_directory):
+            return None
+        snapshot_ids = [file_name[:-len('.json')] for file_name in os.listdir(self.snapshots_directory)
+                        if file_name.endswith('.json')]
+        if not snapshot_ids:
+            return None
+        return max(snapshot_ids)
+
+    # returns the contents of the snapshot's manifest
+    def read_manifest_file(self, snapshot_id):
+        with open(os.path.join(self.snapshots_directory, snapshot_id + '.json'), encoding='utf-8') as file:
+            return json.load(file)
+
+    # returns the (car name, chunk digest) of each car in the snapshot in car list order
+    def read_manifest(self, snapshot_id):
+        return [(car_name, digest) for car_name, digest in self.read_manifest_file(snapshot_id)['cars']]
+
+    # returns the names of the cars added, removed and changed from the old to the new snapshot
+    def diff_snapshots(self, old_snapshot_id, new_snapshot_id):
+        old_cars = dict(self.read_manifest(old_snapshot_id))
+        new_cars = dict(self.read_manifest(new_snapshot_id))
+        added = [car_name for car_name in new_cars if car_name not in old_cars]
+        removed = [car_name for car_name in old_cars if car_name not in new_cars]
+        changed = [car_name for car_name in new_cars
+                   if car_name in old_cars and old_cars[car_name] != new_cars[car_name]]
+        return added, removed, changed
+
+    # restores the cars (all if no car names given) of the snapshot (the newest if none given)
+    # into the CarMaintenance object (the attached one if none given) through its methods, so
+    # attached storages record the changes.  Only cars differing from the snapshot are read
+    # and changed, cars not in the snapshot are deleted.  Returns the names of the cars changed.
+    def restore(self, snapshot_id=None, car_names=None, car_data=None):
+        if snapshot_id is None:
+            snapshot_id = self.latest_snapshot()
+        if car_data is None:
+            car_data = self.car_data
+        snapshot_cars = dict(self.read_manifest(snapshot_id))
+        if car_names is None:
+            car_names = list(snapshot_cars) + [car_name for car_name in car_data.cars
+                                               if car_name not in snapshot_cars]
+
+        restored = {}
+        car_data.begin_batch()
+        try:
+            for car_name in car_names:
+                digest = snapshot_cars.get(car_name)
+                if car_name in car_data.cars:
+                    if digest == self.get_car_digest(car_data, car_name)[0]:
+                        continue
+                    if digest is None:
+                        car_data.del_car(car_name)
+                        restored[car_name] = None
+                        continue
+                elif digest is None:
+                    continue
+                car = self.read_chunk(car_name, digest)
+                car_data.add_car(car_name, car.mileage)
+                for item_name, item in car.items.items():
+                    car_data.add_car_items(car_name, item_name, item.freq_miles, item.freq_time,
+                                           item.last_mileage, item.last_date)
+                restored[car_name] = digest
+        finally:
+            car_data.end_batch()
+
+        if car_data is self.car_data:
+            for car_name, digest in restored.items():
+                self.changed.discard(car_name)
+                if digest is None:
+                    self.digests.pop(car_name, None)
+                else:
+                    self.digests[car_name] = digest
+        return list(restored)
+
+    # listener methods - record the changed cars
+    def add_car(self, car_name, mileage):
+        self.changed.add(car_name)
+
+    def del_car(self, car_name):
+        self.changed.add(car_name)
+
+    def set_mileage(self, car_name, mileage):
+        self.changed.add(car_name)
+
+    def add_car_items(self, car_name, item_name, freq_miles, freq_time, last_mileage, last_date):
+        self.changed.add(car_name)
+
+    def del_car_items(self, car_name, item_name):
+        self.changed.add(car_name)
+
+
+#
+# Returns the JSON chunk of the car, the same car always gives the same chunk
+#
+def encode_car(car):
+    items = [[item_name, item.freq_miles, item.freq_time, item.last_mileage, storage.date_to_ordinal(item.last_date)]
+             for item_name, item in car.items.items()]
+    return json.dumps({'mileage': car.mileage, 'items': items}, separators=(',', ':')).encode('utf-8')
+
+
+#
+# Returns the car stored in the JSON chunk
+#
+def decode_car(car_name, chunk):
+    values = json.loads(chunk.decode('utf-8'))
+    car = cm.CarToMaintain(car_name, values['mileage'])
+    for item_name, freq_miles, freq_time, last_mileage, last_date in values['items']:
+        car.items[item_name] = cm.MaintenanceItem(freq_miles, freq_time, last_mileage,
+                                                  storage.ordinal_to_date(last_date))
+    return car
@@ -0,0 +1,816 @@
+"""
+Name
+    benchmarks
+
+DESCRIPTION
+    This module contains micro-benchmarks for the car maintenance data operations.
+    Run it from the command line and name the benchmarks to run (all are run if none
+    are named), e.g.
+
+        python benchmarks.py add_months
+
+CLASS
+    None
+
+FUNCTION
+    time_it                       -- returns the best time in seconds of several runs of a function
+    add_months_by_day_stepping    -- the original day at a time version of add_months_to_date,
+                                     kept as the baseline for the add_months benchmark
+    bench_add_months              -- compares add_months_to_date against the day stepping version
+    make_fleet                    -- returns a CarMaintenance object with generated cars and items
+    bench_autosave                -- compares saving after every edit against the debounced autosave
+    bench_backup                  -- compares full pickle backups against incremental snapshots
+    bench_assets                  -- compares decoding the view images per view against the shared cache
+    bench_navigation              -- times each view transition of a scripted navigation, rebuilding
+                                     the views against showing the pooled views
+    bench_car_list                -- compares filling a Listbox with every car against the virtual list
+    bench_status                  -- compares the user interface thread time finding the status of every
+                                     car against the status worker threads (and the status cache)
+    get_import_times              -- returns the time to import modules and their -X importtime times
+    is_valid_number_original      -- the original validation functions (validate only, the value is
+    is_valid_day_original            parsed again afterwards), kept as the baseline for the
+    is_valid_date_original           validation benchmark
+    bench_validation              -- compares validating then converting a million mileages and dates
+                                     against the single pass parse functions
+    bench_api                     -- load tests the API server with 1, 4 and 16 connections
+    stress_fleet                  -- hammers a ConcurrentCarMaintenance from many threads, returns
+                                     the operations per second and the invariants broken
+    check_fleet_invariants        -- returns the invariants broken by a fleet after a stress run
+    bench_concurrency             -- stress tests the thread-safe fleet with 1 to 8 threads, with
+                                     striped car locks and with one lock for every car
+    bench_parallel                -- compares evaluating a million items in this process against
+                                     1, 2, 4 and 8 worker processes (fork and shared memory), and
+                                     times the FleetStatus query after adding and deleting an item
+    bench_ingest                  -- compares applying every odometer reading against the ingestion
+                                     service coalescing them per car, and the service over TCP
+    bench_startup                 -- reports the startup import times of the application and the
+                                     command line interface and the time to show the main view
+    main                          -- runs the benchmarks named on the command line
+
+DATA
+    benchmarks                    -- maps benchmark names to the functions running them
+    deferred_modules              -- modules that must not be imported before the main window is painted
+"""
+
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+import carmaintenance as cm
+
+
+#
+# Returns the best time in seconds of several runs of a function
+#
+def time_it(function, repeat=5):
+    best = None
+    for run in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+#
+# Original add_months_to_date - advances one day at a time until the month changes
+#
+def add_months_by_day_stepping(date, num_months):
+    one_day = timedelta(days=1)
+    current_day = date.day
+    one_month_later = date
+    current_month = date.month
+    while num_months > 0:
+        num_months -= 1
+        one_month_later += one_day
+        while one_month_later.month == current_month:
+            one_month_later += one_day
+        current_month = one_month_later.month
+        while one_month_later.day < current_day:
+            one_month_later += one_day
+            if one_month_later.month != current_month:
+                one_month_later -= one_day
+                break
+    return one_month_later
+
+
+#
+# Compares add_months_to_date (uncached and cached) against the day stepping version
+#
+def bench_add_months():
+    dates = [datetime(2015, 1, 1) + timedelta(days=day) for day in range(0, 3650, 7)]
+    months = [1, 3, 6, 12, 24, 60]
+    calls = len(dates) * len(months)
+
+    def run(function):
+        for date in dates:
+            for num_months in months:
+                function(date, num_months)
+
+    results = [
+        ("day stepping", time_it(lambda: run(add_months_by_day_stepping), repeat=1)),
+        ("closed form", time_it(lambda: run(cm.add_months_to_date.__wrapped__))),
+    ]
+    cm.add_months_to_date.cache_clear()
+    run(cm.add_months_to_date)
+    results.append(("closed form (memoized)", time_it(lambda: run(cm.add_months_to_date))))
+
+    print("add_months_to_date: %d calls" % calls)
+    for name, elapsed in results:
+        print("    %-24s %10.1f ns/call" % (name, elapsed / calls * 1e9))
+
+
+#
+# Returns a CarMaintenance object with the number of cars, each with the number of items
+#
+def make_fleet(car_count, items_per_car):
+    car_data = cm.CarMaintenance()
+    for car in range(car_count):
+        car_name = "car%d" % car
+        car_data.add_car(car_name, 10000 + car)
+        for item in range(items_per_car):
+            car_data.add_car_items(car_name, "item%d" % item, 3000 * (item + 1), 6 + item,
+                                   1000 * item, date(2020, 1 + item % 12, 1))
+    return car_data
+
+
+#
+# Compares the time the user interface waits for saves when the data is stored after every
+# edit against the debounced autosave, for a burst of mileage updates
+#
+def bench_autosave():
+    import autosave
+    import storage
+
+    car_data = make_fleet(1000, 10)
+    edits = 200
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'fleet.pkl')
+
+        start = time.perf_counter()
+        for edit in range(edits):
+            car_data.set_mileage("car%d" % edit, 20000 + edit)
+            storage.store(car_data, file_name)
+        store_each_edit = time.perf_counter() - start
+
+        saver = autosave.AutoSaver(file_name, 0.05)
+        saver.attach(car_data)
+        start = time.perf_counter()
+        for edit in range(edits):
+            car_data.set_mileage("car%d" % edit, 30000 + edit)
+        autosaved = time.perf_counter() - start
+        saver.close()
+        stats = saver.get_stats()
+
+    print("autosave: %d edits of a 1000 car fleet" % edits)
+    print("    %-24s %10.3f ms waiting" % ("store after each edit", store_each_edit * 1e3))
+    print("    %-24s %10.3f ms waiting" % ("debounced autosave", autosaved * 1e3))
+    print("    %d save(s), %d bytes written, %.3f ms mean save latency, %d skipped" %
+          (stats['saves'], stats['bytes_written'], stats['mean_seconds'] * 1e3, stats['skipped']))
+
+
+#
+# Compares the time to backup and restore a fleet with a few changed cars as a full pickle
+# against the incremental snapshots of the backup store
+#
+def bench_backup():
+    import backupstore
+    import storage
+
+    car_data = make_fleet(5000, 10)
+    changed = 10
+    with tempfile.TemporaryDirectory() as directory:
+        backup_file_name = os.path.join(directory, 'fleet.bak')
+        backups = backupstore.BackupStore(os.path.join(directory, 'backups'))
+        backups.attach(car_data)
+
+        full_pickle = time_it(lambda: storage.store(car_data, backup_file_name), repeat=3)
+        first_snapshot = time_it(backups.backup, repeat=1)
+        for car in range(changed):
+            car_data.set_mileage("car%d" % car, 50000)
+        incremental_snapshot = time_it(backups.backup, repeat=1)
+        for car in range(changed):
+            car_data.set_mileage("car%d" % car, 60000)
+        full_restore = time_it(lambda: storage.PickleStorage(backup_file_name).load(), repeat=3)
+        incremental_restore = time_it(backups.restore, repeat=1)
+
+    print("backup: 5000 car fleet, %d cars changed" % changed)
+    print("    %-24s %10.3f ms" % ("full pickle backup", full_pickle * 1e3))
+    print("    %-24s %10.3f ms" % ("first snapshot", first_snapshot * 1e3))
+    print("    %-24s %10.3f ms" % ("incremental snapshot", incremental_snapshot * 1e3))
+    print("    %-24s %10.3f ms" % ("full pickle restore", full_restore * 1e3))
+    print("    %-24s %10.3f ms" % ("incremental restore", incremental_restore * 1e3))
+
+
+#
+# Compares opening, decoding and resizing the images of a view every time it is shown against
+# the shared image cache (the PhotoImage creation needs a display and is left out)
+#
+def bench_assets():
+    import assets
+    from PIL import Image
+
+    view = [("phone-background.png", None), ("phone-hdr.png", None), ("car.png", (40, 40)),
+            ("wrench.png", (40, 40))]
+
+    def decode_each_time():
+        for file_name, size in view:
+            image = Image.open(file_name)
+            image.load()
+            if size is not None:
+                image.resize(size, Image.LANCZOS)
+
+    def cached():
+        for file_name, size in view:
+            assets.get_image(file_name, size)
+
+    assets.preload(view)
+    results = [("decode per view", time_it(decode_each_time)), ("shared cache", time_it(cached))]
+    print("assets: images of one view")
+    for name, elapsed in results:
+        print("    %-24s %10.3f ms/view" % (name, elapsed * 1e3))
+
+
+#
+# Times each view transition of a scripted navigation through the views (including the layout
+# and drawing of the new view), first destroying and rebuilding every view as it is shown and
+# then showing the views pooled by CarMaintenanceGui.  Needs a display.
+#
+def bench_navigation():
+    from tkinter import TclError
+    import carmaintmain
+
+    cm.car_data = make_fleet(50, 10)
+    cm.selections.set_car_selected("car1")
+    cm.selections.set_item_selected("item1")
+    try:
+        gui = carmaintmain.CarMaintenanceGui()
+    except TclError as error:
+        print("navigation: needs a display (" + str(error) + ")")
+        return
+    gui.tk.update()
+    script = [("items", gui.activate_items_window), ("perform maint", gui.activate_perform_maint_window),
+              ("add items", gui.activate_add_items_window), ("perform maint", gui.activate_perform_maint_window),
+              ("items", gui.activate_items_window), ("update mileage", gui.activate_update_mileage_window),
+              ("items", gui.activate_items_window), ("main", gui.activate_main_window),
+              ("maint info", gui.activate_maint_info_window), ("main", gui.activate_main_window),
+              ("add car", gui.activate_add_car_window), ("main", gui.activate_main_window)]
+
+    def rebuild(activate):
+        view = gui.view
+        del gui.views[type(view)]
+        view.frame.destroy()
+        gui.view = None
+        activate()
+
+    def run(rebuild_views):
+        times = []
+        for name, activate in script:
+            start = time.perf_counter()
+            if rebuild_views:
+                rebuild(activate)
+            else:
+                activate()
+            gui.tk.update()
+            times.append(time.perf_counter() - start)
+        return times
+
+    run(False)
+    rebuilt = [min(times) for times in zip(*[run(True) for repeat in range(3)])]
+    pooled = [min(times) for times in zip(*[run(False) for repeat in range(3)])]
+    gui.tk.destroy()
+
+    print("navigation: %d transitions" % len(script))
+    print("    %-24s %10s %10s" % ("to view", "rebuilt", "pooled"))
+    for (name, activate), rebuilt_time, pooled_time in zip(script, rebuilt, pooled):
+        print("    %-24s %7.3f ms %7.3f ms" % (name, rebuilt_time * 1e3, pooled_time * 1e3))
+    print("    %-24s %7.3f ms %7.3f ms" % ("mean", sum(rebuilt) / len(rebuilt) * 1e3, sum(pooled) / len(pooled) * 1e3))
+
+
+#
+# Compares inserting and coloring every car in a Listbox against the virtual list of the main
+# view (only the visible rows) as the fleet grows.  Needs a display.
+#
+def bench_car_list():
+    from tkinter import Tk, Frame, Listbox, END, TclError
+    import virtuallist
+
+    try:
+        tk = Tk()
+    except TclError as error:
+        print("car_list: needs a display (" + str(error) + ")")
+        return
+    frame = Frame(tk)
+    frame.pack()
+
+    print("car_list: time to show the main view's car list")
+    print("    %-24s %10s %10s" % ("cars", "Listbox", "virtual"))
+    for car_count in (1000, 10000, 100000):
+        cm.car_data = make_fleet(car_count, 3)
+        car_list = cm.car_data.get_car_list()
+        listbox = Listbox(frame)
+        listbox.pack()
+
+        def fill_listbox():
+            listbox.delete(0, END)
+            for car_index, car in enumerate(car_list):
+                listbox.insert(END, car.replace('_', ' '))
+                listbox.itemconfig(car_index, {'bg': 'yellow' if cm.car_data.does_car_need_maintenance(car) else 'white'})
+            tk.update()
+
+        virtual = virtuallist.VirtualListbox(frame, lambda index: car_list[index].replace('_', ' '),
+                                             lambda index: 'yellow' if cm.car_data.does_car_need_maintenance(
+                                                 car_list[index]) else 'white')
+        virtual.listbox.pack()
+
+        def fill_virtual():
+            virtual.set_row_count(len(car_list))
+            tk.update()
+
+        print("    %-24d %7.1f ms %7.1f ms" % (car_count, time_it(fill_listbox, repeat=1) * 1e3,
+                                             time_it(fill_virtual, repeat=3) * 1e3))
+        listbox.destroy()
+        virtual.listbox.destroy()
+        virtual.scrollbar.destroy()
+    tk.destroy()
+
+
+#
+# Compares the time the user interface thread spends finding the maintenance needed status of
+# every car itself against handing it to the status worker threads (the user interface thread
+# then only makes the request and stores the results), and the time for the request made when
+# the view is shown again (answered from the status cache).  The after() calls of the status
+# worker are run by a timer standing in for the tkinter event loop.
+#
+def bench_status():
+    import concurrentfleet
+    import statusworker
+
+    class PollTimer:
+        def __init__(self):
+            self.function = None
+
+        def after(self, delay, function):
+            self.function = function
+            return 1
+
+        def after_idle(self, function):
+            return self.after(0, function)
+
+        def after_cancel(self, after_id):
+            self.function = None
+
+    def request_cars(worker, timer, car_data, car_names):
+        car_status = {}
+        start = time.perf_counter()
+        worker.request_cars(car_data, car_names, car_status.update)
+        ui_time = time.perf_counter() - start
+        while timer.function is not None:
+            time.sleep(statusworker.poll_interval / 1000)
+            poll_start = time.perf_counter()
+            function, timer.function = timer.function, None
+            function()
+            ui_time += time.perf_counter() - poll_start
+        return ui_time, time.perf_counter() - start
+
+    print("status: user interface thread time to find every car's status")
+    print("    %-24s %10s %10s %12s %10s" % ("cars", "inline", "worker", "worker done", "cached"))
+    for car_count in (1000, 10000, 50000):
+        car_data = make_fleet(car_count, 5)
+        car_names = car_data.get_car_list()
+        inline = time_it(lambda: statusworker.get_car_status(car_data, car_names), repeat=1)
+
+        car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(make_fleet(car_count, 5))
+        timer = PollTimer()
+        worker = statusworker.StatusWorker(timer)
+        ui_time, done = request_cars(worker, timer, car_data, car_names)
+        cached_time, cached_done = request_cars(worker, timer, car_data, car_names)
+        worker.close()
+        print("    %-24d %7.1f ms %7.1f ms %9.1f ms %7.1f ms" % (car_count, inline * 1e3, ui_time * 1e3,
+                                                              done * 1e3, cached_time * 1e3))
+
+
+deferred_modules = ['PIL', 'addcarframe', 'itemsframe', 'additemsframe', 'updatemileageframe',
+                    'performmaintframe', 'maintinfoframe', 'autosave', 'backupstore', 'storage']
+
+
+#
+# Returns the seconds taken to import the modules in a new interpreter and the -X importtime
+# cumulative microseconds of each module imported, {module: microseconds}
+#
+def get_import_times(modules):
+    code = ("from time import perf_counter; start = perf_counter(); import " + ", ".join(modules) +
+            "; print(perf_counter() - start)")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            self_time, cumulative, module = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                import_times[module.strip()] = int(cumulative)
+    return float(result.stdout), import_times
+
+
+#
+# Reports the time to import the application at startup against importing every view module
+# up front (as before the fast start), the slowest modules imported at startup and any of the
+# deferred modules imported at startup, then the time taken by each startup phase (needs a display)
+#
+def bench_startup():
+    eager_modules = ['carmaintmain', 'mainframe', 'PIL.ImageTk'] + deferred_modules[1:]
+    startup_seconds, startup = min((get_import_times(['carmaintmain']) for repeat in range(5)),
+                                   key=lambda times: times[0])
+    eager_seconds, eager = min((get_import_times(eager_modules) for repeat in range(5)),
+                               key=lambda times: times[0])
+    cli_seconds, cli = min((get_import_times(['carmaintcli']) for repeat in range(5)),
+                           key=lambda times: times[0])
+    print("startup: time to import the application (-X importtime adds to the times)")
+    print("    %-24s %7.1f ms" % ("startup imports", startup_seconds * 1e3))
+    print("    %-24s %7.1f ms" % ("all views imported", eager_seconds * 1e3))
+    print("    %-24s %7.1f ms" % ("command line interface", cli_seconds * 1e3))
+    print("    slowest modules imported at startup:")
+    for module in sorted(startup, key=startup.get, reverse=True)[1:9]:
+        print("        %-20s %7.1f ms" % (module, startup[module] / 1e3))
+    imported = [module for module in startup if module.split('.')[0] in deferred_modules]
+    if imported:
+        print("    deferred modules imported at startup: " + ", ".join(imported))
+    imported = [module for module in cli if module.split('.')[0] in ('tkinter', '_tkinter', 'PIL')]
+    if imported:
+        print("    user interface modules imported by the command line interface: " + ", ".join(imported))
+
+    result = subprocess.run([sys.executable, 'carmaintmain.py', '--startup-report'], capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        print("startup: the startup report needs a display (" + result.stderr.strip().splitlines()[-1] + ")")
+        return
+    print("startup: time to show the main view")
+    for line in result.stdout.splitlines():
+        print("    " + line)
+
+
+#
+# Original is_valid_number - the value is converted again by the caller
+#
+def is_valid_number_original(text):
+    is_valid = True
+    try:
+        value = int(text)
+        if value < 0:
+            raise ValueError
+    except ValueError:
+        is_valid = False
+    return is_valid
+
+
+#
+# Original is_valid_day - no leap years
+#
+def is_valid_day_original(month, day):
+    is_valid = True
+    if int(month) in [2,4,6,9,11]:
+        if int(month) == 2:
+            if int(day) > 28:
+                is_valid = False
+        else:
+            if int(day) > 30:
+                is_valid = False
+    else:
+        if int(day) > 31:
+            is_valid = False
+    return is_valid
+
+
+#
+# Original is_valid_date - uncompiled match, then split, the date is parsed again by the caller
+#
+def is_valid_date_original(text):
+    is_valid = True
+    if text != "":
+        date_match = re.match('^[0-9][0-9][/](.*)[0-9][0-9][/](.*)[0-9][0-9]$', text)
+        if date_match is not None:
+            extract_date = re.split('[/]', text)
+            month = extract_date[0]
+            if int(month) > 12:
+                is_valid = False
+            else:
+                day = extract_date[1]
+                is_valid = is_valid_day_original(month, day)
+        else:
+            is_valid = False
+    return is_valid
+
+
+#
+# Compares validating and then converting a million mileages and a million dates (as the views
+# and imports did) against the single pass parse functions, one at a time and a column at a time
+#
+def bench_validation():
+    import validation
+
+    random.seed(21)
+    count = 1000000
+    mileages = [str(random.randrange(200000)) if random.random() < 0.95 else random.choice(["", "12x", "-5"])
+                for index in range(count)]
+    dates = ["%02d/%02d/%d" % (random.randint(1, 12), random.randint(1, 28), random.randint(2015, 2026))
+             if random.random() < 0.95 else random.choice(["", "13/01/2020", "1/2/20"]) for index in range(count)]
+
+    def validate_then_convert_mileages():
+        for text in mileages:
+            if is_valid_number_original(text):
+                int(text)
+
+    def validate_then_convert_dates():
+        for text in dates:
+            if text != "" and is_valid_date_original(text):
+                try:
+                    cm.text_to_date(text)
+                except ValueError:
+                    pass
+
+    # one at a time, keeping the values and errors as the column forms do
+    def parse_mileages():
+        values = []
+        errors = {}
+        for index, text in enumerate(mileages):
+            value, error = validation.parse_number(text)
+            if error is not None:
+                errors[index] = error
+            values.append(value)
+
+    def parse_dates():
+        values = []
+        errors = {}
+        for index, text in enumerate(dates):
+            value, error = validation.parse_date(text)
+            if error is not None:
+                errors[index] = error
+            values.append(value)
+
+    print("validation: %d mileages and %d dates" % (count, count))
+    print("    %-32s %10s %10s" % ("", "mileages", "dates"))
+    for name, mileage_function, date_function in (
+            ("validate then convert", validate_then_convert_mileages, validate_then_convert_dates),
+            ("parse (one at a time)", parse_mileages, parse_dates),
+            ("parse (a column at a time)", lambda: validation.parse_numbers(mileages),
+             lambda: validation.parse_dates(dates))):
+        print("    %-32s %7.1f ms %7.1f ms" % (name, time_it(mileage_function, repeat=3) * 1e3,
+                                              time_it(date_function, repeat=3) * 1e3))
+
+
+#
+# Load tests an API server started in this process (see apiloadtest) with more and more connections
+#
+def bench_api():
+    import apiloadtest
+
+    print("api: 4000 requests (10% mileage updates, 1% due items) on a 1000 car fleet")
+    for connections in (1, 4, 16):
+        latencies, errors, elapsed = apiloadtest.run_load_test(connections=connections, requests=4000)
+        apiloadtest.print_results("%d connections" % connections, latencies, errors, elapsed)
+
+
+#
+# Hammers a thread-safe fleet with set_mileage/add_car_items from the threads while a reader takes
+# snapshots and asks for the items due, returns (operations per second, invariants broken)
+#
+def stress_fleet(thread_count, operations=40000, car_count=500):
+    import concurrentfleet
+
+    car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(make_fleet(car_count, 5))
+    car_names = car_data.get_car_list()
+    written = [[] for thread in range(thread_count)]
+    problems = []
+    done = threading.Event()
+
+    def write(thread):
+        choose = random.Random(thread)
+        for operation in range(operations // thread_count):
+            car_name = choose.choice(car_names)
+            if choose.random() < 0.8:
+                mileage = choose.randrange(10000, 100000)
+                car_data.set_mileage(car_name, mileage)
+                written[thread].append((car_name, mileage))
+            else:
+                car_data.add_car_items(car_name, "item%d" % choose.randrange(10), 3000, 6, choose.randrange(50000),
+                                       date(2025, choose.randint(1, 12), 1))
+
+    def read():
+        while not done.is_set():
+            snapshot = car_data.get_snapshot()
+            for car_name in car_names:
+                if not 5 <= len(snapshot.cars[car_name].items) <= 10:
+                    problems.append("snapshot of " + car_name + " has " + str(len(snapshot.cars[car_name].items)) + " items")
+            car_data.get_items_needing_maintenance()
+
+    reader = threading.Thread(target=read)
+    writers = [threading.Thread(target=write, args=(thread,)) for thread in range(thread_count)]
+    reader.start()
+    start = time.perf_counter()
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    reader.join()
+    return operations / elapsed, problems[:3] + check_fleet_invariants(car_data, written)
+
+
+#
+# Returns the invariants broken by the fleet after a stress run: every car's mileage is one of the
+# mileages written to it, the cached status, due mileage index, FleetStatus and due date queue
+# agree with the status worked out again from a copy of the data
+#
+def check_fleet_invariants(car_data, written):
+    problems = []
+    mileages_written = {}
+    for thread_written in written:
+        for car_name, mileage in thread_written:
+            mileages_written.setdefault(car_name, set()).add(mileage)
+    fresh = car_data.get_snapshot()
+    items_due = {}
+    for car_name in fresh.get_car_list():
+        mileage = car_data.get_mileage(car_name)
+        if car_name in mileages_written and mileage not in mileages_written[car_name]:
+            problems.append(car_name + " has mileage " + str(mileage) + " that was never written")
+        # items due at the same mileage may be in any order
+        due_mileages, item_names = car_data.get_mileage_index(car_name)
+        if due_mileages != sorted(due_mileages) or \
+                sorted(zip(due_mileages, item_names)) != sorted(zip(*fresh.get_mileage_index(car_name))):
+            problems.append(car_name + " due mileage index differs")
+        for item_name in fresh.get_items_list(car_name):
+            need = fresh.compute_item_need(car_name, item_name)
+            if car_data.does_item_need_maintenance(car_name, item_name) != need:
+                problems.append(car_name + " " + item_name + " cached status differs")
+            if need:
+                items_due.setdefault(car_name, []).append(item_name)
+    if car_data.get_items_needing_maintenance() != items_due:
+        problems.append("FleetStatus items due differ")
+    if car_data.get_next_due_date() != fresh.get_next_due_date():
+        problems.append("due date queue differs")
+    return problems
+
+
+#
+# Stress tests the thread-safe fleet with more and more threads, with the striped car locks and
+# with a single lock for every car (concurrentfleet.stripe_count = 1) for comparison
+#
+def bench_concurrency():
+    import concurrentfleet
+
+    print("concurrency: 40000 set_mileage/add_car_items on 500 cars while snapshots are taken")
+    print("    %-24s %14s %14s" % ("threads", "64 car locks", "1 car lock"))
+    stripes = concurrentfleet.stripe_count
+    for thread_count in (1, 2, 4, 8):
+        results = []
+        for stripe_count in (stripes, 1):
+            concurrentfleet.stripe_count = stripe_count
+            operations_per_second, problems = stress_fleet(thread_count)
+            results.append(operations_per_second)
+            for problem in problems[:5]:
+                print("        invariant broken: " + problem)
+        concurrentfleet.stripe_count = stripes
+        print("    %-24d %10.0f op/s %10.0f op/s" % (thread_count, results[0], results[1]))
+
+
+#
+# Compares finding the items needing maintenance of a million item fleet in this process (the
+# FleetStatus columns built from scratch, and the same per item rules as the workers) against
+# the parallelfleet worker processes, with the cars inherited by fork and packed in shared memory -
+# the speed up is bounded by the CPUs available to this process, the workers beyond them share them
+#
+def bench_parallel():
+    import gc
+    import fleetstatus
+    import parallelfleet
+
+    car_data = make_fleet(100000, 10)
+    today = date.today()
+    items_due = parallelfleet.get_items_due(car_data, 1, today, 'fork')
+    cpus = parallelfleet.worker_count
+    print("parallel: items needing maintenance for 100000 cars, 1000000 items (%d CPUs available)" % cpus)
+    print("    %-24s %10.0f ms" % ("FleetStatus", time_it(lambda: fleetstatus.FleetStatus(car_data).get_items_due(today),
+                                                           repeat=1) * 1e3))
+    serial = time_it(lambda: parallelfleet.evaluate_local_cars(list(car_data.cars.values()), today), repeat=1)
+    print("    %-24s %10.0f ms" % ("one process", serial * 1e3))
+    print("    %-24s %13s %13s" % ("workers (1 runs here)", "fork", "shared memory"))
+    for workers in (1, 2, 4, 8):
+        elapsed = []
+        for method in ('fork', 'shared_memory'):
+            gc.collect()
+            start = time.perf_counter()
+            if parallelfleet.get_items_due(car_data, workers, today, method) != items_due:
+                print("        " + method + " results differ")
+            elapsed.append(time.perf_counter() - start)
+        print("    %-24d %7.0f ms %4.1fx %7.0f ms %4.1fx%s" % (workers, elapsed[0] * 1e3, serial / elapsed[0],
+                                                           elapsed[1] * 1e3, serial / elapsed[1],
+                                                           "  more workers than CPUs" if workers > cpus else ""))
+    print("    the speed up is bounded by the CPUs available: at most %dx" % cpus)
+
+    # the FleetStatus columns are updated by each change, not built again
+    car_data.get_fleet_status()
+    edits = iter(range(1000000))
+
+    def edit_and_query():
+        car_name = "car%d" % next(edits)
+        car_data.add_car_items(car_name, "new item", 5000, 12, 0, today)
+        car_data.del_car_items(car_name, "item0")
+        return car_data.get_items_needing_maintenance()
+    print("    %-24s %10.0f ms" % ("FleetStatus after edits", time_it(edit_and_query) * 1e3))
+
+
+#
+# Compares applying every odometer reading with set_mileage (each change committed to the SQLite
+# storage) against the ingestion service coalescing the readings per car into batches, then
+# runs the load generator against the service over TCP
+#
+def bench_ingest():
+    import asyncio
+    import odometeringest
+    import odometerload
+
+    car_names = ["car%d" % car for car in range(1000)]
+    lines = odometerload.generate_readings(car_names, 100000, 0)[0]
+    readings = [odometeringest.parse_reading(line.decode('utf-8'))[:2] for line in lines]
+
+    async def ingest(car_data, readings):
+        service = odometeringest.OdometerIngest(car_data, window=0.05)
+        await service.start()
+        for car, mileage in readings:
+            await service.put(car, mileage)
+        await service.close()
+        return service.get_metrics()
+
+    # applying every reading is slow, it is timed for the first 10000 readings
+    print("ingest: odometer readings for 1000 cars, SQLite storage")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, count in (("set_mileage per reading", 10000), ("coalesced batches", 100000)):
+            file_name = os.path.join(directory, name.split()[0] + '.db')
+            cm.store_car_maintenance_data(make_fleet(1000, 5), file_name)
+            car_data = cm.retrieve_car_maintenance_data(file_name)
+            highest = {car: car_data.get_mileage(car) for car in car_names}
+            for car, mileage in readings[:count]:
+                highest[car] = max(mileage, highest[car])
+            start = time.perf_counter()
+            if name == "coalesced batches":
+                updates = asyncio.run(ingest(car_data, readings[:count]))['applied']
+            else:
+                updates = 0
+                for car, mileage in readings[:count]:
+                    if mileage > car_data.get_mileage(car):
+                        car_data.set_mileage(car, mileage)
+                        updates += 1
+            elapsed = time.perf_counter() - start
+            wrong = sum(car_data.get_mileage(car) != mileage for car, mileage in highest.items())
+            print("    %-24s %6d readings %8.0f ms %6d set_mileage %8.0f readings/s  %d wrong" % (
+                name, count, elapsed * 1e3, updates, count / elapsed, wrong))
+            car_data.cars.storage.close()
+
+    metrics, elapsed, sent, wrong = odometerload.run_local_load(1000, 100000)
+    print("    %-24s %6d readings %8.0f ms %6d set_mileage %8.0f readings/s  %d wrong" % (
+        "TCP, 4 senders", sent, elapsed * 1e3, metrics['applied'], sent / elapsed, len(wrong)))
+    print("    %d batches, %d queue waits (%.0f ms), max queue depth %d, max batch %.1f ms" % (
+        metrics['batches'], metrics['queue_waits'], metrics['queue_wait_seconds'] * 1e3,
+        metrics['max_queue_depth'], metrics['max_batch_ms']))
+
+
+benchmarks = {
+    'add_months': bench_add_months,
+    'autosave': bench_autosave,
+    'backup': bench_backup,
+    'assets': bench_assets,
+    'navigation': bench_navigation,
+    'car_list': bench_car_list,
+    'status': bench_status,
+    'startup': bench_startup,
+    'validation': bench_validation,
+    'api': bench_api,
+    'concurrency': bench_concurrency,
+    'parallel': bench_parallel,
+    'ingest': bench_ingest,
+}
+
+
+#
+# Runs the benchmarks named on the command line (all of them if none named)
+#
+def main(args):
+    names = args or list(benchmarks)
+    for name in names:
+        if name not in benchmarks:
+            print("Unknown benchmark " + name + " (choose from: " + ", ".join(benchmarks) + ")")
+            return 1
+    for name in names:
+        benchmarks[name]()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,239 @@
+"""
+Name
+    binaryfleet
+
+DESCRIPTION
+    This module contains the binary file format for the car maintenance data used for very
+    large fleets.  The file holds a string table with the car and item names followed by
+    fixed size records for the cars and the items, with mileages and frequencies stored as
+    integers and dates as day ordinals:
+
+        header      magic, version, counts and the offset of each section
+        strings     (string count + 1) offsets followed by the UTF-8 encoded names
+        cars        name, first item, item count, mileage
+        items       car, name, freq miles, last mileage, due mileage, freq time, last date, due date
+
+    Values not entered are stored as -1 (0 for dates).  The due mileage and due date of each
+    item are stored too, so the fleet's maintenance needed status can be found straight from
+    the file.  BinaryFleet opens the file with mmap and, when NumPy is installed, views the
+    records as NumPy arrays without copying them, so a status scan only touches the columns
+    it uses and never creates Python objects for the cars or items.
+
+CLASS
+    BinaryFleet           -- object to read a binary fleet file through mmap
+
+FUNCTION
+                            -- BinaryFleet methods
+    __init__              -- open and map the file and read the header
+    __enter__, __exit__   -- allow use in a with statement (closing the file at the end)
+    close                 -- release the views and close the file
+    get_string            -- returns a name from the string table
+    get_car_names         -- returns the names of all cars
+    items_due             -- returns the due flag for every item
+    get_cars_due          -- returns the names of the cars needing maintenance
+    get_items_due         -- returns the items needing maintenance for every car
+    to_car_maintenance    -- creates the CarMaintenance object from the records
+                            -- Additional Functions
+    write_binary_fleet    -- writes the CarMaintenance object to a binary fleet file
+    read_binary_fleet     -- reads a binary fleet file into a CarMaintenance object
+
+DATA
+    np                    -- the numpy module or None if numpy is not installed
+    magic                 -- bytes identifying a binary fleet file
+    version               -- version of the file layout
+    header_format         -- struct format of the header
+    car_format            -- struct format of a car record
+    item_format           -- struct format of an item record
+    car_dtype, item_dtype -- NumPy dtypes matching the car and item records
+    no_due_mileage        -- due mileage stored for items without a mileage based check
+    no_due_date           -- due date stored for items without a time based check
+"""
+
+import mmap
+import struct
+from datetime import date
+import carmaintenance as cm
+import storage
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+magic = b'CMFB'
+version = 1
+header_format = struct.Struct('<4sIIIIIQQQ')
+car_format = struct.Struct('<IIIxxxxq')
+item_format = struct.Struct('<IIqqqiiixxxx')
+no_due_mileage = 2 ** 63 - 1
+no_due_date = date.max.toordinal() + 1
+
+if np is not None:
+    car_dtype = np.dtype({'names': ['name', 'first_item', 'item_count', 'mileage'],
+                          'formats': ['<u4', '<u4', '<u4', '<i8'],
+                          'offsets': [0, 4, 8, 16], 'itemsize': car_format.size})
+    item_dtype = np.dtype({'names': ['car', 'name', 'freq_miles', 'last_mileage', 'due_mileage',
+                                     'freq_time', 'last_date', 'due_date'],
+                           'formats': ['<u4', '<u4', '<i8', '<i8', '<i8', '<i4', '<i4', '<i4'],
+                           'offsets': [0, 4, 8, 16, 24, 32, 36, 40], 'itemsize': item_format.size})
+
+
+#
+# Reads a binary fleet file through mmap
+#
+class BinaryFleet:
+
+    # open and map the file, read the header and create the views of the records
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (file_magic, file_version, self.car_count, self.item_count, self.string_count, unused,
+         self.strings_offset, self.cars_offset, self.items_offset) = header_format.unpack_from(self.map, 0)
+        if file_magic != magic or file_version != version:
+            self.map.close()
+            raise ValueError(file_name + " is not a binary fleet file")
+        self.buffer = memoryview(self.map)
+        self.string_offsets = self.buffer[self.strings_offset:
+                                          self.strings_offset + 8 * (self.string_count + 1)].cast('Q')
+        self.strings_data = self.strings_offset + 8 * (self.string_count + 1)
+        if np is not None:
+            self.cars = np.frombuffer(self.map, dtype=car_dtype, count=self.car_count, offset=self.cars_offset)
+            self.items = np.frombuffer(self.map, dtype=item_dtype, count=self.item_count, offset=self.items_offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # release the views of the file and close it
+    def close(self):
+        if np is not None:
+            self.cars = self.items = None
+        self.string_offsets.release()
+        self.buffer.release()
+        self.map.close()
+
+    # returns the name stored at the index in the string table
+    def get_string(self, index):
+        start = self.strings_data + self.string_offsets[index]
+        end = self.strings_data + self.string_offsets[index + 1]
+        return bytes(self.buffer[start:end]).decode('utf-8')
+
+    # returns the names of all cars in car list order
+    def get_car_names(self):
+        return [self.get_string(name) for (name, first_item, item_count, mileage)
+                in car_format.iter_unpack(self.buffer[self.cars_offset:self.cars_offset +
+                                                      self.car_count * car_format.size])]
+
+    # returns the due flag for every item (same rules as CarMaintenance.does_item_need_maintenance),
+    # only the mileage, car, due mileage and due date columns are read
+    def items_due(self, today=None):
+        if today is None:
+            today = date.today()
+        today = today.toordinal()
+
+        if np is not None:
+            mileage = self.cars['mileage'][self.items['car']]
+            return (mileage > self.items['due_mileage']) | (self.items['due_date'] <= today)
+
+        car_mileage = [record[3] for record in car_format.iter_unpack(
+            self.buffer[self.cars_offset:self.cars_offset + self.car_count * car_format.size])]
+        return [car_mileage[record[0]] > record[4] or record[7] <= today for record in item_format.iter_unpack(
+            self.buffer[self.items_offset:self.items_offset + self.item_count * item_format.size])]
+
+    # returns the names of the cars needing maintenance in car list order
+    def get_cars_due(self, today=None):
+        return list(self.get_items_due(today))
+
+    # returns a dictionary of car name -> list of items needing maintenance in car list order,
+    # only the names of the cars and items needing maintenance are decoded
+    def get_items_due(self, today=None):
+        due = self.items_due(today)
+        if np is not None:
+            due_items = zip(self.items['car'][due].tolist(), self.items['name'][due].tolist())
+        else:
+            records = item_format.iter_unpack(
+                self.buffer[self.items_offset:self.items_offset + self.item_count * item_format.size])
+            due_items = [(record[0], record[1]) for record, need in zip(records, due) if need]
+
+        items_due = {}
+        car_names = {}
+        for car_index, item_name in due_items:
+            if car_index not in car_names:
+                name = car_format.unpack_from(self.buffer, self.cars_offset + car_index * car_format.size)[0]
+                car_names[car_index] = self.get_string(name)
+            items_due.setdefault(car_names[car_index], []).append(self.get_string(item_name))
+        return items_due
+
+    # creates the CarMaintenance object from the records
+    def to_car_maintenance(self):
+        car_data = cm.CarMaintenance()
+        cars = []
+        for name, first_item, item_count, mileage in car_format.iter_unpack(
+                self.buffer[self.cars_offset:self.cars_offset + self.car_count * car_format.size]):
+            car = cm.CarToMaintain(self.get_string(name), None if mileage < 0 else mileage)
+            car_data.cars[car.car_name] = car
+            cars.append(car)
+        for car_index, name, freq_miles, last_mileage, due_mileage, freq_time, last_date, due_date in \
+                item_format.iter_unpack(self.buffer[self.items_offset:self.items_offset +
+                                                    self.item_count * item_format.size]):
+            cars[car_index].items[self.get_string(name)] = cm.MaintenanceItem(
+                None if freq_miles < 0 else freq_miles, None if freq_time < 0 else freq_time,
+                None if last_mileage < 0 else last_mileage, date.fromordinal(last_date) if last_date else None)
+        return car_data
+
+
+#
+# Writes the CarMaintenance object to a binary fleet file (through a temporary file and rename)
+#
+def write_binary_fleet(car_data, file_name):
+    strings = {}
+    car_records = bytearray()
+    item_records = bytearray()
+
+    def string_index(text):
+        if text not in strings:
+            strings[text] = len(strings)
+        return strings[text]
+
+    def stored(value):
+        return -1 if value is None else value
+
+    item_count = 0
+    for car_index, (car_name, car) in enumerate(car_data.cars.items()):
+        car_records += car_format.pack(string_index(car_name), item_count, len(car.items), stored(car.mileage))
+        for item_name, item in car.items.items():
+            due_mileage = no_due_mileage
+            if item.freq_miles:
+                due_mileage = (item.last_mileage or 0) + item.freq_miles
+            due_date = no_due_date
+            if item.last_date is not None and item.freq_time is not None:
+                due_date = cm.add_months_to_date(item.last_date, item.freq_time).toordinal()
+            item_records += item_format.pack(car_index, string_index(item_name), stored(item.freq_miles),
+                                             stored(item.last_mileage), due_mileage, stored(item.freq_time),
+                                             item.last_date.toordinal() if item.last_date else 0, due_date)
+            item_count += 1
+
+    encoded = [text.encode('utf-8') for text in strings]
+    string_offsets = [0]
+    for text in encoded:
+        string_offsets.append(string_offsets[-1] + len(text))
+    string_table = struct.pack('<%dQ' % len(string_offsets), *string_offsets) + b''.join(encoded)
+    string_table += bytes(-len(string_table) % 8)
+
+    strings_offset = header_format.size + (-header_format.size % 8)
+    cars_offset = strings_offset + len(string_table)
+    items_offset = cars_offset + len(car_records)
+    header = header_format.pack(magic, version, len(car_data.cars), item_count, len(strings), 0,
+                                strings_offset, cars_offset, items_offset)
+    header += bytes(strings_offset - len(header))
+    storage.write_file_atomically(file_name, header + string_table + bytes(car_records) + bytes(item_records))
+
+
+#
+# Reads a binary fleet file into a CarMaintenance object
+#
+def read_binary_fleet(file_name):
+    with BinaryFleet(file_name) as fleet:
+        return fleet.to_car_maintenance()
@@ -0,0 +1,246 @@
+"""
+Name
+    carmaintcli
+
+DESCRIPTION
+    This module contains the command line interface for running batch operations on the car
+    maintenance data without the user interface, e.g. from nightly jobs.  It uses the same
+    data file (and storage backends) as the application and the same validation as the views,
+    and never imports tkinter or PIL so it starts straight away on a server.
+
+        python carmaintcli.py [--file FILE] import FILE        add/update cars and items in bulk
+        python carmaintcli.py [--file FILE] odometer FILE      apply odometer readings (car, mileage)
+        python carmaintcli.py [--file FILE] due [--csv] [--workers N]
+                                                             list the items needing maintenance
+        python carmaintcli.py [--file FILE] report KIND [-o OUTPUT]
+                                                             write the needed or recent report
+        python carmaintcli.py [--file FILE] export FILE        write every car and item to a file
+
+    The import and odometer files are CSV (with a header row) or JSON lines files, see
+    fleetio for the columns.  Rejected rows are reported on stderr with their line number and
+    the exit status is 1 if any row was rejected.  The data file is locked while the command
+    runs (see locking.DataFileLock), the exit status is 2 if another process is using it or
+    the data file cannot be read.  Everything but the command's own output (e.g. skipped
+    journal records) is printed on stderr, so `due --csv` and `export -` can be piped.
+
+CLASS
+    None
+
+FUNCTION
+    load_car_data         -- retrieves the data file through its storage
+    apply_odometer_rows   -- applies odometer readings, generating (line number, car, error, newly due items)
+    do_import             -- import subcommand
+    do_odometer           -- odometer subcommand
+    do_due                -- due subcommand
+    do_report             -- report subcommand
+    do_export             -- export subcommand
+    print_errors          -- prints rejected rows on stderr, returns the number printed
+    get_parser            -- returns the argument parser
+    main                  -- runs the command line, returns the exit status
+
+DATA
+    report_kinds          -- report name -> report generator (see reports)
+"""
+
+import argparse
+import contextlib
+import csv
+import sys
+import carmaintenance as cm
+import fleetio
+import locking
+import reports
+import storage
+import validation as v
+
+report_kinds = {
+    'needed': reports.maint_needed_report,
+    'recent': reports.recent_maint_report,
+}
+
+
+#
+# Retrieves the car maintenance data from the file through its storage, so a journal left
+# without a snapshot is replayed and a pickle file is migrated to a new SQLite database.  The
+# messages printed while loading go to stderr and a file that cannot be read raises OSError -
+# unless missing_ok is set and the file does not exist yet, which gives an empty CarMaintenance
+# object (created when the data is stored)
+#
+def load_car_data(file_name, missing_ok=False):
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            return storage.retrieve(file_name)
+        except FileNotFoundError:
+            if not missing_ok:
+                raise
+            return cm.CarMaintenance()
+
+
+#
+# Applies the odometer readings in the (line number, row) pairs, each row giving a car and its
+# mileage, committing the changes in batches, and generates (line number, car, error message or
+# None, items that became due) for each row
+#
+def apply_odometer_rows(car_data, numbered_rows, rows_per_batch=None):
+    if rows_per_batch is None:
+        rows_per_batch = fleetio.batch_size
+    rows_in_batch = 0
+    car_data.begin_batch()
+    try:
+        for line_number, row in numbered_rows:
+            if isinstance(row, str):
+                yield line_number, "", row, []
+                continue
+            car = str(row.get('car') or "").strip().replace(' ', '_')
+            mileage, error = v.parse_number(fleetio.get_row_values(row)['mileage'])
+            if car == "":
+                yield line_number, car, "Enter a car name!", []
+            elif car not in car_data.cars:
+                yield line_number, car, "Unknown car " + car + "!", []
+            elif mileage is None:
+                yield line_number, car, "Enter mileage as a number!", []
+            else:
+                yield line_number, car, None, car_data.set_mileage(car, mileage)
+            rows_in_batch += 1
+            if rows_in_batch == rows_per_batch:
+                car_data.end_batch()
+                car_data.begin_batch()
+                rows_in_batch = 0
+    finally:
+        car_data.end_batch()
+
+
+#
+# Adds/updates the cars and items in the import file and stores the data
+#
+def do_import(car_data, args):
+    error_count = print_errors(args.input, fleetio.import_file(car_data, args.input))
+    cm.store_car_maintenance_data(car_data, args.file)
+    return 1 if error_count else 0
+
+
+#
+# Applies the odometer readings in the file, prints the items that became due and stores the data
+#
+def do_odometer(car_data, args):
+    error_count = 0
+    for line_number, car, error, newly_due in apply_odometer_rows(car_data, fleetio.read_rows(args.input)):
+        if error is not None:
+            print("%s:%d: %s" % (args.input, line_number, error), file=sys.stderr)
+            error_count += 1
+        for item in newly_due:
+            print(car + "\t" + item + "\tnow due")
+    cm.store_car_maintenance_data(car_data, args.file)
+    return 1 if error_count else 0
+
+
+#
+# Lists the items needing maintenance, one car and item per line (tab separated or CSV), found
+# by worker processes with --workers (for very large fleets)
+#
+def do_due(car_data, args):
+    writer = csv.writer(sys.stdout, lineterminator='\n') if args.csv else None
+    if writer is not None:
+        writer.writerow(['car', 'item', 'mileage', 'due_date'])
+    if args.workers is not None:
+        import parallelfleet
+        items_due = parallelfleet.get_items_due(car_data, args.workers)
+    else:
+        items_due = car_data.get_items_needing_maintenance()
+    for car, items in items_due.items():
+        for item in items:
+            due_date = cm.date_to_text(car_data.get_item_due_date(car, item))
+            if writer is not None:
+                writer.writerow([car, item, cm.number_to_text(car_data.get_mileage(car)), due_date])
+            else:
+                print(car + "\t" + item)
+    return 0
+
+
+#
+# Writes the report to the output file (or stdout) a car at a time
+#
+def do_report(car_data, args):
+    output = sys.stdout if args.output in (None, '-') else open(args.output, 'w', encoding='utf-8')
+    try:
+        for text, done in report_kinds[args.kind](car_data):
+            output.write(text)
+        output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+#
+# Writes every car and item to the export file
+#
+def do_export(car_data, args):
+    row_count = fleetio.export_file(car_data, args.output)
+    print("Exported %d rows to %s" % (row_count, args.output), file=sys.stderr)
+    return 0
+
+
+#
+# Prints the (line number, error message) of each rejected row on stderr, returns the number of rows rejected
+#
+def print_errors(file_name, errors):
+    error_count = 0
+    for line_number, error in errors:
+        print("%s:%d: %s" % (file_name, line_number, error), file=sys.stderr)
+        error_count += 1
+    return error_count
+
+
+#
+# Returns the argument parser for the command line
+#
+def get_parser():
+    parser = argparse.ArgumentParser(prog='carmaintcli', description="Batch operations on the car maintenance data")
+    parser.add_argument('--file', default=cm.storage_file_name,
+                        help="data file (default " + cm.storage_file_name + ", the extension picks the storage)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import', help="add/update cars and items from a CSV or JSON lines file")
+    command.add_argument('input')
+    command.set_defaults(function=do_import)
+
+    command = commands.add_parser('odometer', help="apply odometer readings (car, mileage) from a CSV or JSON lines file")
+    command.add_argument('input')
+    command.set_defaults(function=do_odometer)
+
+    command = commands.add_parser('due', help="list the items needing maintenance")
+    command.add_argument('--csv', action='store_true', help="write CSV with the mileage and due date")
+    command.add_argument('--workers', type=int, help="evaluate the items in this many worker processes")
+    command.set_defaults(function=do_due)
+
+    command = commands.add_parser('report', help="write a maintenance report")
+    command.add_argument('kind', choices=sorted(report_kinds))
+    command.add_argument('-o', '--output', help="output file (default stdout)")
+    command.set_defaults(function=do_report)
+
+    command = commands.add_parser('export', help="write every car and item to a CSV or JSON lines file")
+    command.add_argument('output')
+    command.set_defaults(function=do_export)
+    return parser
+
+
+#
+# Runs the command line, returns the exit status
+#
+def main(args):
+    args = get_parser().parse_args(args)
+    try:
+        with locking.DataFileLock(args.file):
+            car_data = load_car_data(args.file, missing_ok=args.function is do_import)
+            try:
+                return args.function(car_data, args)
+            finally:
+                storage.close_attached(car_data)
+    except OSError as error:
+        print("carmaintcli: " + str(error), file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
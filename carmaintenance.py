@@ -8,6 +8,7 @@ DESCRIPTION
 
 CLASS
     UserSelections -- object to store the current car and item selected by the user
+    LazyCars       -- cars dictionary reading each car from the storage the first time it is used
     MaintenanceItem-- object to store frequency of maintenance in miles and months, and the
                       mileage and date when maintenance was last performed
     CarToMaintain  -- object to store the car name and mileage and the MaintenanceItem 
@@ -26,8 +27,12 @@ FUNCTION
     __init__                             -- Store the frequeency (based on time and mileage) for maintenance
                                             and store the last time maintenance performed (time and mileagae)
     __repr__                             -- Method to format the printing of the contents of the object
+    __getstate__                         -- returns the values to pickle
+    __setstate__                         -- restores pickled values, migrating values pickled as strings
                             -- CarToMaintain methods
     __init__                             -- Store the car name, mileage and list of maintenance items
+    __getstate__                         -- returns the values to pickle
+    __setstate__                         -- restores pickled values, migrating a mileage pickled as a string
     __iter__                             -- yield the next item in the list of maintenance items
     __repr__                             -- Method to format the printing of the contents of the object
     add_maintenance_item                 -- Add MaintainItem object for selected car
@@ -36,10 +41,33 @@ FUNCTION
     get_maintenance_item_freq_time
     get_maintenance_item_last_mileage
     get_maintenance_item_last_date
+                           -- LazyCars methods
+    __init__                          -- store the car names with no car read yet
+    __getitem__                       -- return the car, reading it from the storage the first time
+    __setitem__, __delitem__          -- replace/delete a car keeping the count of unread cars
+    get, values, items, __repr__      -- read the cars from the storage as they are reached
                            -- CarMaintenance methods
     __init__                          -- create the car list
     __iter__                          -- yield the next car (CarToMaintain object) in the car list
     __repr__                          -- Method to format the printing of the contents of the object
+    __getstate__                      -- store only the car list when pickling
+    __setstate__                      -- restore the car list and reset the fleet status when unpickling
+    add_listener                      -- add a listener called after each change (e.g. a storage backend)
+    remove_listener                   -- remove a listener
+    begin_batch, end_batch            -- group changes into a batch the listeners can commit together
+    notify                            -- call the listeners after a change
+    reset_status                      -- clear the fleet status and the cached maintenance needed status
+    invalidate_status                 -- drop the cached status for a car or one of its items
+    check_status_date                 -- update the cached status when the date changes
+    get_due_dates                     -- returns the DueDateQueue of the dates items become due
+    get_next_due_date                 -- returns the earliest date any item in the fleet becomes due
+    check_due_dates                   -- flips the cached status of the items whose due date has passed
+    count_status                      -- adds to the status cache hit/miss counters
+    get_cached_car_status             -- returns the status of the cars in the status cache and the other cars
+    get_cached_item_status            -- returns the status of the car's items in the status cache and the others
+    get_status_cache_stats            -- returns the status cache hit/miss counters and sizes
+    get_mileage_index                 -- returns the car's item names sorted by due mileage
+    update_mileage_index              -- moves an added/updated/deleted item in the due mileage index
     add_car                           -- Add CarToMaintain object corresponding to
                                          newly selected car name
     del_car                           -- Delete CarToMaintain object for selected car
@@ -49,6 +77,16 @@ FUNCTION
     is_new_item                       -- Check to see if item specified is new or a
                                          duplicate item for the selected car
     does_item_need_maintenance        -- Check to see if selected car needs maintenance
+    compute_item_need                 -- Check to see if selected item needs maintenance without the cache
+    is_item_due_by_date               -- Check to see if selected item needs maintenance based on time
+    get_item_due_date                 -- returns the date selected item needs maintenance based on time
+    get_fleet_status                  -- returns the FleetStatus columns, built when first needed and kept
+                                         in step with every car/item change
+    get_cars_needing_maintenance      -- returns the cars needing maintenance for the whole fleet
+    get_items_needing_maintenance     -- returns the items needing maintenance for the whole fleet
+    get_snapshot                      -- returns the data for readers walking every car (see concurrentfleet)
+    restore_cars                      -- replaces the cars with those of another CarMaintenance object
+                                         through the methods changing the data
     add_car_items                     -- Add MaintenanceItem object for selected car
     del_car_items                     -- Delete MaintenanceItem object for selected car
     get_car_list                      -- Getter to return list of all cars
@@ -58,25 +96,44 @@ FUNCTION
     get_item_freq_time
     get_item_last_mileage
     get_item_last_date
-    set_mileage
+    set_mileage                       -- (returns the items that became due with the new mileage)
                            -- Additional Functions
     add_months_to_date                -- returns a new date by adding a specified number of months to a
                                          specified date
-    store_car_maint_data              -- store the data to disc
-    retrieve_car_maint_data           -- retrieve the data from disc
+    text_to_number                    -- converts user entered text to a mileage/frequency (int or None)
+    text_to_date                      -- converts user entered mm/dd/yyyy text to a date (or None)
+    number_to_text                    -- converts a mileage/frequency to text for display
+    date_to_text                      -- converts a date to mm/dd/yyyy text for display
+    migrate_number                    -- converts a mileage/frequency pickled as a string to an int
+    migrate_date                      -- converts a date pickled as a string to a date
+    store_car_maint_data              -- store the data to disc (storage backend picked by file extension)
+    retrieve_car_maint_data           -- retrieve the data from disc (storage backend picked by file extension)
+    __getattr__                       -- retrieves car_data from disc the first time it is used
 
 DATA
+    self.listeners                 -- objects called after each change to the data
+    self.fleet_status              -- FleetStatus columns for the whole fleet (None until needed)
+    self.item_status               -- cached maintenance needed status, car name -> item name -> bool
+    self.car_status                -- cached maintenance needed status, car name -> bool
+    self.status_date               -- date the cached status was computed on
+    self.status_hits/status_misses -- status cache hit and miss counters
+    self.mileage_index             -- per car due mileage index, car name -> (due mileages, item names)
+    self.due_dates                 -- DueDateQueue for the whole fleet (None until needed)
     selections                     -- stores the car and item selected by the user
     filename                       -- used to store and retieve car maintenance data
-    car_data                       -- contains the CarMaintenance data object
+    car_data                       -- contains the CarMaintenance data object (retrieved when first used)
     
 """
 
-import pickle
-from datetime import datetime
+from bisect import bisect_left
+from calendar import monthrange
+from datetime import datetime, date
+from functools import lru_cache
+from threading import RLock
 
-storage_file_name = 'CarMaintenance.dat'              # File name where data is stored
-backup_and_restore_file_name = 'CarMaintenance.bak'   # File name where backup data is stored
+storage_file_name = 'CarMaintenance.dat'              # File name where data is stored (.db for SQLite, .pkl autosaved pickle)
+backup_and_restore_file_name = 'CarMaintenance.bak'   # File name where backup data is stored (older backups)
+backup_directory_name = 'CarMaintenance.backups'      # Directory where backup snapshots are stored
 
 
 #
@@ -109,9 +166,11 @@ class UserSelections:
 #
 # MaintenanceItem object stores the initial mileage and date, the frequency
 # of maintenance in miles and time(months), the mileage and date for the
-# last time this maintenance was performed
+# last time this maintenance was performed.  Mileages and frequencies are
+# ints and the date is a datetime.date, None means the value was not entered.
 #
 class MaintenanceItem:
+    __slots__ = ('freq_miles', 'freq_time', 'last_mileage', 'last_date')
 
     # initializes the object contents
     def __init__ (self, freq_miles, freq_time, last_mileage, last_date):
@@ -122,22 +181,44 @@ class MaintenanceItem:
 
     # provides method for printing object to standard out
     def __repr__ (self):
-        return_string = str(self.freq_miles) + ' ' + str(self.freq_time) + ' ' + \
-                        str(self.last_mileage) + ' ' + str(self.last_date)
+        return_string = number_to_text(self.freq_miles) + ' ' + number_to_text(self.freq_time) + ' ' + \
+                        number_to_text(self.last_mileage) + ' ' + date_to_text(self.last_date)
         return return_string
 
+    # provides the values to pickle
+    def __getstate__(self):
+        return self.freq_miles, self.freq_time, self.last_mileage, self.last_date
+
+    # restores the pickled values, migrating objects pickled with the values stored as strings
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            state = (migrate_number(state['freq_miles']), migrate_number(state['freq_time']),
+                     migrate_number(state['last_mileage']), migrate_date(state['last_date']))
+        self.freq_miles, self.freq_time, self.last_mileage, self.last_date = state
+
 
 #
 # CarToMaintain object stores the maintenance item objects associated with a car
 #
 class CarToMaintain:
+    __slots__ = ('car_name', 'mileage', 'items')
 
-    # initialize the car description and mileage when object created
+    # initialize the car description and mileage (int) when object created
     def __init__(self, car_name, mileage):
         self.car_name = car_name
         self.mileage = mileage
         self.items = {}
 
+    # provides the values to pickle
+    def __getstate__(self):
+        return self.car_name, self.mileage, self.items
+
+    # restores the pickled values, migrating objects pickled with the mileage stored as a string
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            state = (state['car_name'], migrate_number(state['mileage']), state['items'])
+        self.car_name, self.mileage, self.items = state
+
     # method for iterating over the maintenance items
     def __iter__ (self):
         for item in self.items:
@@ -173,6 +254,61 @@ class CarToMaintain:
         return self.items[item_name].last_date
 
 
+#
+# LazyCars is the cars dictionary used when the cars are read from a storage with a car name
+# index (SQLite).  Only the car names are read up front, each CarToMaintain object is read
+# from the storage the first time the car is looked up.
+#
+class LazyCars(dict):
+
+    # store the car names (in order) with no CarToMaintain object read yet, cars are read with
+    # the load lock held (concurrentfleet shares its fleet lock, which also guards the storage)
+    def __init__(self, car_names, storage):
+        super().__init__((car_name, None) for car_name in car_names)
+        self.storage = storage
+        self.unloaded = len(self)
+        self.load_lock = RLock()
+
+    # method to return the car, reading it from the storage the first time
+    def __getitem__(self, car_name):
+        car = super().__getitem__(car_name)
+        if car is None:
+            with self.load_lock:
+                car = super().__getitem__(car_name)
+                if car is None:
+                    car = self.storage.load_car(car_name)
+                    super().__setitem__(car_name, car)
+                    self.unloaded -= 1
+        return car
+
+    # method to replace a car, an unread car no longer needs to be read
+    def __setitem__(self, car_name, car):
+        if super().get(car_name, False) is None:
+            self.unloaded -= 1
+        super().__setitem__(car_name, car)
+
+    # method to delete a car
+    def __delitem__(self, car_name):
+        if super().__getitem__(car_name) is None:
+            self.unloaded -= 1
+        super().__delitem__(car_name)
+
+    # methods returning cars read them from the storage as they are reached
+    def get(self, car_name, default=None):
+        if car_name in self:
+            return self[car_name]
+        return default
+
+    def values(self):
+        return [self[car_name] for car_name in self]
+
+    def items(self):
+        return [(car_name, self[car_name]) for car_name in self]
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
 #
 # Car Maintenance object stores the cars and the list of items for each car being maintained
 #
@@ -181,6 +317,8 @@ class CarMaintenance:
     # initialize the cars dictionary
     def __init__(self):
         self.cars = {}
+        self.listeners = []
+        self.reset_status()
 
     # method to iterate over the cars dictionary
     def __iter__(self):
@@ -194,29 +332,208 @@ class CarMaintenance:
         else:
             return str(self.cars)
 
+    # method to pickle only the cars dictionary, the fleet status and status cache are rebuilt when needed
+    def __getstate__(self):
+        return {'cars': dict(self.cars.items())}
+
+    # method to unpickle the cars dictionary
+    def __setstate__(self, state):
+        self.cars = state['cars']
+        self.listeners = []
+        self.reset_status()
+
+    # method to add a listener called after each change (see storage.Storage for the listener methods)
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    # method to remove a listener
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    # methods to group changes into a batch, listeners may commit the changes of a batch together
+    def begin_batch(self):
+        self.notify('begin_batch')
+
+    def end_batch(self):
+        self.notify('end_batch')
+
+    # method to call the listener method with the same name as the method that changed the data
+    def notify(self, method_name, *args):
+        for listener in self.listeners:
+            getattr(listener, method_name)(*args)
+
+    # method to clear the fleet status and the cached maintenance needed status
+    def reset_status(self):
+        self.fleet_status = None
+        self.item_status = {}
+        self.car_status = {}
+        self.status_date = date.today()
+        self.status_hits = 0
+        self.status_misses = 0
+        self.mileage_index = {}
+        self.due_dates = None
+
+    # method to drop the cached status for an item (or all items when None) of a car
+    def invalidate_status(self, car_name, item_name=None):
+        self.car_status.pop(car_name, None)
+        if item_name is None:
+            self.item_status.pop(car_name, None)
+        elif car_name in self.item_status:
+            self.item_status[car_name].pop(item_name, None)
+
+    # method to update the cached status once the date changes, time based checks may now be due
+    def check_status_date(self):
+        today = date.today()
+        if today != self.status_date:
+            self.check_due_dates(today)
+            self.status_date = today
+
+    # method to return the queue of the dates items become due, built the first time it is needed
+    def get_due_dates(self):
+        if self.due_dates is None:
+            import duedates
+            self.due_dates = duedates.DueDateQueue()
+            for car_name, car in self.cars.items():
+                for item_name in car.items:
+                    self.due_dates.set_due_date(car_name, item_name, self.get_item_due_date(car_name, item_name))
+        return self.due_dates
+
+    # method to return the earliest date any item in the fleet becomes due (None if no dated items)
+    def get_next_due_date(self):
+        return self.get_due_dates().next_due_date()
+
+    # method to flip the cached status of the items whose due date has passed and return those items,
+    # only the items at the front of the due date queue are looked at
+    def check_due_dates(self, today=None):
+        if today is None:
+            today = date.today()
+        due_items = self.get_due_dates().pop_due(today)
+        for car_name, item_name in due_items:
+            if item_name in self.item_status.get(car_name, {}):
+                self.item_status[car_name][item_name] = True
+            if car_name in self.car_status:
+                self.car_status[car_name] = True
+        return due_items
+
+    # method to add to the status cache hit and miss counters
+    def count_status(self, hits, misses):
+        self.status_hits += hits
+        self.status_misses += misses
+
+    # method to return the cached status of the cars - ([(car name, needs maintenance)] for the cars
+    # in the status cache, [names of the other cars])
+    def get_cached_car_status(self, car_names):
+        self.check_status_date()
+        car_status = self.car_status
+        cached = []
+        missing = []
+        for car_name in car_names:
+            need = car_status.get(car_name)
+            if need is None:
+                missing.append(car_name)
+            else:
+                cached.append((car_name, need))
+        self.count_status(len(cached), 0)
+        return cached, missing
+
+    # method to return the cached status of the car's items - ([(item name, needs maintenance)] for
+    # the items in the status cache, [names of the other items])
+    def get_cached_item_status(self, car_name, item_names):
+        self.check_status_date()
+        car_item_status = self.item_status.get(car_name, {})
+        cached = []
+        missing = []
+        for item_name in item_names:
+            need = car_item_status.get(item_name)
+            if need is None:
+                missing.append(item_name)
+            else:
+                cached.append((item_name, need))
+        self.count_status(len(cached), 0)
+        return cached, missing
+
+    # method to return the status cache counters
+    def get_status_cache_stats(self):
+        return {'hits': self.status_hits, 'misses': self.status_misses,
+                'cars': len(self.car_status), 'items': sum(len(items) for items in self.item_status.values())}
+
+    # method to return the car's due mileage index - sorted due mileages and the matching item names
+    def get_mileage_index(self, car_name):
+        index = self.mileage_index.get(car_name)
+        if index is None:
+            entries = []
+            for item_name, item in self.cars[car_name].items.items():
+                if item.freq_miles:
+                    entries.append(((item.last_mileage or 0) + item.freq_miles, item_name))
+            entries.sort()
+            index = ([due_mileage for due_mileage, item_name in entries],
+                     [item_name for due_mileage, item_name in entries])
+            self.mileage_index[car_name] = index
+        return index
+
+    # method to add/remove an item in the car's due mileage index (if the index has been built)
+    def update_mileage_index(self, car_name, item_name, old_item, new_item):
+        index = self.mileage_index.get(car_name)
+        if index is None:
+            return
+        due_mileages, item_names = index
+        if old_item is not None and old_item.freq_miles:
+            position = bisect_left(due_mileages, (old_item.last_mileage or 0) + old_item.freq_miles)
+            while item_names[position] != item_name:
+                position += 1
+            del due_mileages[position]
+            del item_names[position]
+        if new_item is not None and new_item.freq_miles:
+            due_mileage = (new_item.last_mileage or 0) + new_item.freq_miles
+            position = bisect_left(due_mileages, due_mileage)
+            due_mileages.insert(position, due_mileage)
+            item_names.insert(position, item_name)
+
     # method to add a new car to maintenance object
     def add_car(self, car_name, mileage):
         new_car = CarToMaintain(car_name, mileage)
         self.cars[car_name] = new_car
+        if self.fleet_status is not None:
+            self.fleet_status.add_car(car_name, mileage)
+        self.invalidate_status(car_name)
+        self.mileage_index.pop(car_name, None)
+        if self.due_dates is not None:
+            self.due_dates.remove_car(car_name)
+        self.notify('add_car', car_name, mileage)
 
     # method to delete a selected car
     def del_car(self, car_name):
         del self.cars[car_name]
+        if self.fleet_status is not None:
+            self.fleet_status.del_car(car_name)
+        self.invalidate_status(car_name)
+        self.mileage_index.pop(car_name, None)
+        if self.due_dates is not None:
+            self.due_dates.remove_car(car_name)
+        self.notify('del_car', car_name)
     
     # method to verify car is an original and not a duplicate entry
     def is_new_car(self, car_name):
-        if car_name == "" or self.cars.get(car_name):
+        if car_name == "" or car_name in self.cars:
             return False  # Not a new car - already exists
         else:
             return True  # Yes it is a new car
 
-    # method to determine if car needs maintenance
+    # method to determine if car needs maintenance (cached until the car or its items change)
     def does_car_need_maintenance(self, car_name):
+        self.check_status_date()
+        need = self.car_status.get(car_name)
+        if need is not None:
+            self.count_status(1, 0)
+            return need
+        self.count_status(0, 1)
+
         need = False
         item_list = self.get_items_list(car_name)
         for item in item_list:
             if self.does_item_need_maintenance(car_name, item):
                 need = True
+        self.car_status[car_name] = need
         return need
 
     # method to verify item is an original and not a duplicate entry
@@ -226,51 +543,131 @@ class CarMaintenance:
         else:
             return True  # Yes it is a new item
 
-    # method to determine if item needs maintenance for selected car
+    # method to determine if item needs maintenance for selected car (cached until the car or item changes)
     def does_item_need_maintenance(self, car_name, item_name):
+        self.check_status_date()
+        car_item_status = self.item_status.setdefault(car_name, {})
+        need = car_item_status.get(item_name)
+        if need is not None:
+            self.count_status(1, 0)
+            return need
+        self.count_status(0, 1)
+        need = self.compute_item_need(car_name, item_name)
+        car_item_status[item_name] = need
+        return need
+
+    # method to evaluate if item needs maintenance for selected car without using the cache
+    def compute_item_need(self, car_name, item_name):
         need = False
-        mileage = self.get_mileage(car_name)
-        item_last_mileage = self.get_item_last_mileage(car_name, item_name)
-        item_freq_miles = self.get_item_freq_miles(car_name, item_name)
-        if mileage == "": mileage = "0"
-        if item_last_mileage == "": item_last_mileage = "0"
-        if item_freq_miles == "": item_freq_miles = "0"
-
-        # check based on mileage
-        if item_last_mileage == "0":
-            if item_freq_miles != "0" and int(mileage) > int(item_freq_miles):
-                need = True
-        elif  item_freq_miles != "0":
-            change_mileage = int(item_last_mileage) + int(item_freq_miles)
-            if int(mileage) > change_mileage:
+        car = self.cars[car_name]
+        item = car.items[item_name]
+
+        # check based on mileage (a frequency of 0 or None means no mileage check)
+        if item.freq_miles:
+            change_mileage = (item.last_mileage or 0) + item.freq_miles
+            if (car.mileage or 0) > change_mileage:
                 need = True
 
         # check based on date
-        time_freq = self.get_item_freq_time(car_name, item_name)
-        item_last_date = self.get_item_last_date(car_name, item_name)
-        date = datetime.now()
-        if item_last_date != "" and time_freq != "":
-            item_last_datetime = datetime.strptime(item_last_date, '%m/%d/%Y')
-            change_date = add_months_to_date(item_last_datetime, int(time_freq))
-            if date > change_date:
-                need = True
+        if self.is_item_due_by_date(car_name, item_name):
+            need = True
 
         return need
 
+    # method to determine if item needs maintenance based on the time since it was last performed
+    def is_item_due_by_date(self, car_name, item_name):
+        change_date = self.get_item_due_date(car_name, item_name)
+        if change_date is not None and date.today() >= change_date:
+            return True
+        return False
+
+    # method to return the date the item needs maintenance based on time (None if no time based check)
+    def get_item_due_date(self, car_name, item_name):
+        item = self.cars[car_name].items[item_name]
+        if item.last_date is not None and item.freq_time is not None:
+            return add_months_to_date(item.last_date, item.freq_time)
+        return None
+
+    # method to return the fleet status columns, built the first time they are needed (the car and
+    # item changes then update their rows)
+    def get_fleet_status(self):
+        if self.fleet_status is None:
+            import fleetstatus
+            self.fleet_status = fleetstatus.FleetStatus(self)
+        return self.fleet_status
+
+    # method to return the list of cars needing maintenance (in car list order), while cars are
+    # still unread from the storage the storage answers so they do not all have to be read
+    def get_cars_needing_maintenance(self):
+        if isinstance(self.cars, LazyCars) and self.cars.unloaded:
+            return self.cars.storage.get_cars_due()
+        return self.get_fleet_status().get_cars_due()
+
+    # method to return a dictionary of car name -> items needing maintenance (in car list order)
+    def get_items_needing_maintenance(self):
+        if isinstance(self.cars, LazyCars) and self.cars.unloaded:
+            return self.cars.storage.get_items_due()
+        return self.get_fleet_status().get_items_due()
+
+    # method to return the data for a reader walking every car (e.g. a report) - the object itself,
+    # it is only changed by the thread using it (concurrentfleet returns a consistent copy instead).
+    # before_copy is called first (concurrentfleet calls it while no car can change)
+    def get_snapshot(self, before_copy=None):
+        if before_copy is not None:
+            before_copy()
+        return self
+
+    # method to replace the cars with the cars of another CarMaintenance object (e.g. a backup) in
+    # one batch through the methods changing the data, so the listeners (the storage, autosave
+    # and backups) see each change - cars the same in both are left alone
+    def restore_cars(self, car_data):
+        self.begin_batch()
+        try:
+            for car_name in self.get_car_list():
+                if car_name not in car_data.cars:
+                    self.del_car(car_name)
+            for car_name, car in car_data.cars.items():
+                current_car = self.cars.get(car_name)
+                if current_car is not None and current_car.mileage == car.mileage and \
+                        [(item_name, item.__getstate__()) for item_name, item in current_car.items.items()] == \
+                        [(item_name, item.__getstate__()) for item_name, item in car.items.items()]:
+                    continue
+                self.add_car(car_name, car.mileage)
+                for item_name, item in car.items.items():
+                    self.add_car_items(car_name, item_name, item.freq_miles, item.freq_time,
+                                       item.last_mileage, item.last_date)
+        finally:
+            self.end_batch()
+
     # method to add maintenance item for a selected car
     def add_car_items(self, car_name, item_name, freq_miles, freq_time, last_mileage, last_date):
-        self.cars[car_name].add_maintenance_item(item_name, freq_miles, freq_time, last_mileage, last_date)
+        car = self.cars[car_name]
+        old_item = car.items.get(item_name)
+        car.add_maintenance_item(item_name, freq_miles, freq_time, last_mileage, last_date)
+        if self.fleet_status is not None:
+            self.fleet_status.set_item(car_name, item_name, car.items[item_name])
+        self.invalidate_status(car_name, item_name)
+        self.update_mileage_index(car_name, item_name, old_item, car.items[item_name])
+        if self.due_dates is not None:
+            self.due_dates.set_due_date(car_name, item_name, self.get_item_due_date(car_name, item_name))
+        self.notify('add_car_items', car_name, item_name, freq_miles, freq_time, last_mileage, last_date)
 
     # method to delete maintenance item for a selected car
     def del_car_items(self, car_name, item_name):
-        self.cars[car_name].del_maintenance_item(item_name)
+        car = self.cars[car_name]
+        old_item = car.items.get(item_name)
+        car.del_maintenance_item(item_name)
+        if self.fleet_status is not None:
+            self.fleet_status.del_item(car_name, item_name)
+        self.invalidate_status(car_name, item_name)
+        self.update_mileage_index(car_name, item_name, old_item, None)
+        if self.due_dates is not None:
+            self.due_dates.remove_item(car_name, item_name)
+        self.notify('del_car_items', car_name, item_name)
 
     # method to return a list of all the cars being maintained
     def get_car_list(self):
-        car_list = []
-        for car in self.cars:
-            car_list.append(car)
-        return car_list
+        return list(self.cars)
 
     # method to return a list of items being maintained for the selected car
     def get_items_list(self, car):
@@ -297,60 +694,132 @@ class CarMaintenance:
         return self.cars[car_name].get_maintenance_item_last_date(item_name)
 
     # Setters
+
+    # sets the car's mileage and returns the items that became due because of it - only the
+    # items whose due mileage falls between the old and new mileage are looked at
     def set_mileage(self, car_name, mileage):
-        self.cars[car_name].mileage = mileage
+        car = self.cars[car_name]
+        old_mileage = car.mileage or 0
+        new_mileage = mileage or 0
+        car.mileage = mileage
+        if self.fleet_status is not None:
+            self.fleet_status.set_mileage(car_name, mileage)
+        self.notify('set_mileage', car_name, mileage)
+
+        # an item is due once the mileage is past its due mileage
+        due_mileages, item_names = self.get_mileage_index(car_name)
+        low, high = sorted((old_mileage, new_mileage))
+        crossed = item_names[bisect_left(due_mileages, low):bisect_left(due_mileages, high)]
+        for item_name in crossed:
+            self.invalidate_status(car_name, item_name)
+
+        newly_due = []
+        if new_mileage > old_mileage:
+            for item_name in crossed:
+                if not self.is_item_due_by_date(car_name, item_name):
+                    newly_due.append(item_name)
+        return newly_due
 
 
 #
-# Returns a new date after adding a specified number of months to a specified date
+# Returns a new date after adding a specified number of months to a specified date,
+# the day is clamped to the end of the month when the new month is shorter
+# (e.g. 01/31 + 1 month -> 02/28).  Results are memoized since the same
+# (last date, frequency) pairs are checked over and over.
 #
+@lru_cache(maxsize=4096)
 def add_months_to_date(date, num_months):
-    import datetime
-    one_day = datetime.timedelta(days=1)
-    current_day = date.day
-    one_month_later = date
-    current_month = date.month
-    while num_months > 0:
-        num_months -= 1
-        one_month_later += one_day
-        while one_month_later.month == current_month:
-            one_month_later += one_day
-        current_month = one_month_later.month
-        while one_month_later.day < current_day:
-            one_month_later += one_day
-            if one_month_later.month != current_month:
-                one_month_later -= one_day
-                break
-    return one_month_later
-
-
-#
-# Stores car maintenance data to disc
-#
-def store_car_maintenance_data(car_data_to_store, file_name):
+    if num_months <= 0:
+        return date
+    month_index = date.month - 1 + num_months
+    year = date.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(date.day, monthrange(year, month)[1])
+    return date.replace(year=year, month=month, day=day)
+
+
+#
+# Converts text entered by the user into a mileage/frequency, blank text means not entered (None)
+#
+def text_to_number(text):
+    if text == "":
+        return None
+    return int(text)
+
+
+#
+# Converts text entered by the user as mm/dd/yyyy into a date, blank text means not entered (None)
+#
+def text_to_date(text):
+    if text == "":
+        return None
+    return datetime.strptime(text, '%m/%d/%Y').date()
+
+
+#
+# Converts a mileage/frequency into text for display, None is displayed as blank
+#
+def number_to_text(number):
+    if number is None:
+        return ""
+    return str(number)
+
+
+#
+# Converts a date into mm/dd/yyyy text for display, None is displayed as blank
+#
+def date_to_text(date_value):
+    if date_value is None:
+        return ""
+    return date_value.strftime('%m/%d/%Y')
+
+
+#
+# Converts a mileage/frequency pickled as a string by earlier versions into an int or None
+#
+def migrate_number(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return int(value) if value.isdigit() else None
+    return value
+
+
+#
+# Converts a date pickled as a mm/dd/yyyy string by earlier versions into a date or None
+#
+def migrate_date(value):
+    if isinstance(value, str):
+        try:
+            return text_to_date(value.strip())
+        except ValueError:
+            return None
+    return value
+
+
+#
+# Stores car maintenance data to disc, file_format ('pickle', 'journal', 'sqlite', 'binary')
+# picks the storage backend, otherwise it is picked by the file name extension
+#
+def store_car_maintenance_data(car_data_to_store, file_name, file_format=None):
+    import storage
     try:
-        file = open(file_name, 'wb')
+        storage.store(car_data_to_store, file_name, file_format)
     except OSError:
         print("Error opening file "+file_name)
         print("Unable to store data to file")
-    else:
-        pickle.dump(car_data_to_store, file)
-        file.close()
 
 
 #
-# Retrieves car maintenance data from disc
+# Retrieves car maintenance data from disc, file_format picks the storage backend as for storing
 #
-def retrieve_car_maintenance_data(file_name):
+def retrieve_car_maintenance_data(file_name, file_format=None):
+    import storage
     stored_car_data = CarMaintenance()
     try:
-        file = open(file_name, 'rb')
+        stored_car_data = storage.retrieve(file_name, file_format)
     except OSError:
         print("Error opening file " + file_name)
         print("Unable to retrieve data from file (file may not exist yet)")
-    else:
-        stored_car_data = pickle.load(file)
-        file.close()
 
     return stored_car_data
 
@@ -361,6 +830,11 @@ def retrieve_car_maintenance_data(file_name):
 selections = UserSelections()
 
 #
-# Retrieve the stored car maintenance data
+# The stored car maintenance data (car_data) is retrieved the first time it is used
 #
-car_data = retrieve_car_maintenance_data(storage_file_name)
+def __getattr__(name):
+    global car_data
+    if name == 'car_data':
+        car_data = retrieve_car_maintenance_data(storage_file_name)
+        return car_data
+    raise AttributeError("module " + __name__ + " has no attribute " + name)
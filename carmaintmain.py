@@ -6,6 +6,19 @@ DESCRIPTION
     This module contains the class that initializes the car maintenance user
     interface
 
+    Only the modules the main view needs are imported when the application starts: the
+    window is painted with a loading message first, PIL is imported and the view images
+    decoded on a background thread, and the modules of the other views (and of the
+    backups and autosave) are imported the first time they are used.  Run with
+    --startup-report to print the time taken by each startup phase and exit, the
+    startup benchmark (python benchmarks.py startup) also reports the import times.
+
+    The data file is locked while the application runs (see locking.DataFileLock), the
+    application does not start while another process is using the data file.  Run with
+    --api-port PORT to serve the HTTP/JSON API (see apiserver) from the application on a
+    daemon thread: the server shares the application's data and the reader/writer lock the
+    views hold while they change it, so the API can be used while the application runs.
+
 CLASS
     CarMaintenanceGUI              -- object to support the car maintenance user interface
 
@@ -14,6 +27,13 @@ FUNCTION
                                       object, and initializes the widgets in the view
                                       allowing the user to monitor their car maintenance
     do_exit                        -- exit the application
+    start_autosave                 -- saves the data file (the snapshot of the journaled .dat file)
+                                      a short time after each change
+    start_backups                  -- tracks the cars changed between backups
+    start_api_server               -- serves the data to the API clients on a daemon thread
+    schedule_due_date_check        -- schedules the check for items becoming due at the next midnight
+    do_due_date_check              -- flips the status of items that became due by date and reschedules
+    activate_view                  -- shows a view, building it the first time and refreshing it after
     activate_add_car_window        -- activates AddCarFrame object view
     activate_items_window          -- activates ItemsFrame object view
     activate_add_items_window      -- activates AddItemsFrame object view
@@ -21,96 +41,270 @@ FUNCTION
     activate_perform_maint_window  -- activates PerformMaintFrame object view
     activate_maint_info_window     -- activates MaintInfoFrame object view
     activate_main_window           -- activates MainFrame object view
+                                   -- Additional Functions
+    mark_startup                   -- records the time a startup phase finished
+    print_startup_report           -- prints the time taken by each startup phase
+    main                           -- starts the application
 
 DATA
+    startup_start                  -- time the application started (perf_counter seconds)
+    startup_phases                 -- (phase, seconds since the start) of each startup phase finished
+    data_file_lock                 -- lock held on the data file while the application runs, so
+                                      the API server, odometer ingestion service and command line
+                                      cannot use the data file at the same time
     my_gui                         -- contains the CarMaintenanceGUI object
     self.tk                        -- contains tkinter to allow creating window elements
                                       (Frames, Labels, Buttons, Entries)
     self.car_data                  -- contains the CarMaintenance data object
+    self.views                     -- views built so far, view class -> view object (kept hidden when not shown)
+    self.view                      -- view object shown
+    self.frame                     -- Frame of the view shown
+    self.autosaver                 -- AutoSaver of the data file (None for SQLite)
+    self.backups                   -- BackupStore keeping the backup snapshots
+    self.status_worker             -- StatusWorker finding the maintenance needed status for the views
+                                      (cm.car_data is a ConcurrentCarMaintenance it can use)
+    self.data_lock                 -- ReadWriteLock held for writing while the views change the data,
+                                      shared with the API server
+    self.api_server                -- ApiServer serving the data (None unless --api-port is given)
 """
 
+from time import perf_counter
+startup_start = perf_counter()
+
 import atexit
+import sys
+from datetime import datetime, time, timedelta
+import assets
 import carmaintenance as cm
-import mainframe as mf
-import addcarframe as acf
-import itemsframe as itf
-import additemsframe as aif
-import updatemileageframe as umf
-import performmaintframe as pf
-import maintinfoframe as mif
+import concurrentfleet
+import locking
+import statusworker
 from tkinter import *
 
+startup_phases = []
+data_file_lock = locking.DataFileLock(cm.storage_file_name)
+
 
 #
 # Provide data/methods for managing views
 #
 class CarMaintenanceGui:
 
-    # initialize the view contents and store data in object
-    def __init__(self):
+    # initialize the view contents and store data in object, serving the API on api_port if given
+    def __init__(self, api_port=None):
+        mark_startup('imports')
+
+        # Import PIL and decode the view images while the window and the data are being set up
+        assets.preload(background=True)
+
         self.tk = Tk()
         self.tk.geometry("300x620")
         self.tk.title("Car Maintenance")
         self.tk.background = "#ddd"
 
+        # Paint the window straight away, the data and the main view are loaded after
+        loading_label = Label(self.tk, text="Loading...", bg=self.tk.background, font=('Helvetica', 12))
+        loading_label.pack(expand=TRUE)
+        self.tk.update()
+        mark_startup('window painted')
+
+        # Find the maintenance needed status for the views off the user interface thread, the
+        # status worker and report threads use the data alongside this thread (the user's
+        # selections stay with this thread)
+        self.status_worker = statusworker.StatusWorker(self.tk)
+        cm.car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(cm.car_data)
+        self.data_lock = locking.ReadWriteLock()
+        self.api_server = None
+
         # Initialize the view for the main view
-        self.frame  = mf.MainFrame(self, self.tk).frame
+        self.views = {}
+        self.view = None
+        self.frame = None
+        loading_label.destroy()
+        self.activate_main_window()
+        mark_startup('main view built')
+
+        # Save the data in the background as it changes
+        self.start_autosave()
+
+        # Track the cars changed between backups
+        self.start_backups()
+        mark_startup('autosave and backups')
+
+        # Time based maintenance can only become due when the date changes
+        self.schedule_due_date_check()
 
-    # exits the application saving any unsaved data
+        # Serve the data to the API clients alongside the views (the application runs without
+        # the API if the port cannot be used)
+        if api_port is not None:
+            try:
+                self.start_api_server(api_port)
+            except OSError as error:
+                print("carmaintmain: unable to serve the API on port %d: %s" % (api_port, error),
+                      file=sys.stderr)
+
+    # exits the application saving any unsaved data (the autosave writes the last snapshot, the
+    # journal or SQLite then commits what is left) once the API server has stopped
     def do_exit(self):
-        cm.store_car_maintenance_data(cm.car_data, cm.storage_file_name)
+        self.status_worker.close()
+        if self.api_server is not None:
+            self.api_server.shutdown()
+            self.api_server.server_close()
+        with self.data_lock.write_locked():
+            if self.autosaver is not None:
+                self.autosaver.close()
+            if self.autosaver is None or self.autosaver.journal is not None:
+                cm.store_car_maintenance_data(cm.car_data, cm.storage_file_name)
         self.tk.quit()
 
-    # activates the AddCarFrame view
+    # saves the data a short time after each change, through a temporary file and rename - for
+    # the default .dat file the snapshot the journal is replayed over (SQLite commits each
+    # change and is not autosaved), see autosave
+    def start_autosave(self):
+        import autosave
+        self.autosaver = autosave.start_autosave(cm.car_data, cm.storage_file_name)
+
+    # tracks the cars changed so a backup only stores the cars changed since the last backup
+    def start_backups(self):
+        import backupstore
+        self.backups = backupstore.BackupStore(cm.backup_directory_name)
+        self.backups.attach(cm.car_data)
+
+    # serves cm.car_data to the API clients on a daemon thread (see apiserver) - the server takes
+    # the data lock for reading while it answers a request and for writing while it changes the
+    # data, as the views do, so it runs in this process instead of locking out the data file
+    def start_api_server(self, port):
+        import apiserver
+        self.api_server = apiserver.start_server(cm.car_data, port=port, lock=self.data_lock)
+
+    # schedules the due date check to run just after the next midnight
+    def schedule_due_date_check(self):
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), time())
+        self.tk.after(int((midnight - now).total_seconds() * 1000) + 1000, self.do_due_date_check)
+
+    # flips the cached status of items whose due date passed (without rechecking every item)
+    def do_due_date_check(self):
+        with self.data_lock.write_locked():
+            cm.car_data.check_due_dates()
+        self.schedule_due_date_check()
+
+    # shows the view of the view class, each view is built the first time it is shown and kept
+    # hidden in between, so showing it again only refreshes the data it displays (a view with
+    # work in progress is told when it is hidden)
+    def activate_view(self, view_class):
+        if self.view is not None:
+            if hasattr(self.view, 'hide'):
+                self.view.hide()
+            self.view.frame.pack_forget()
+        view = self.views.get(view_class)
+        if view is None:
+            view = view_class(self, self.tk)
+            self.views[view_class] = view
+        else:
+            view.refresh()
+            view.frame.pack(fill=BOTH, expand=TRUE)
+        self.view = view
+        self.frame = view.frame
+
+    # activates the AddCarFrame view (the view modules are imported when first shown)
     def activate_add_car_window(self):
-        self.frame.destroy()
-        self.frame = acf.AddCarFrame(self,self.tk).frame
+        import addcarframe as acf
+        self.activate_view(acf.AddCarFrame)
 
     # activates the ItemsFrame view
     def activate_items_window(self):
-        self.frame.destroy()
-        self.frame = itf.ItemsFrame(self, self.tk).frame
+        import itemsframe as itf
+        self.activate_view(itf.ItemsFrame)
 
     # activates the AddItemsFrame view
     def activate_add_items_window(self):
-        self.frame.destroy()
-        self.frame = aif.AddItemsFrame(self, self.tk).frame
+        import additemsframe as aif
+        self.activate_view(aif.AddItemsFrame)
 
     # activates the UpdateMileageFrame view
     def activate_update_mileage_window(self):
-        self.frame.destroy()
-        self.frame = umf.UpdateMileageFrame(self, self.tk).frame
+        import updatemileageframe as umf
+        self.activate_view(umf.UpdateMileageFrame)
 
     # activates the PerformMaintFrame view
     def activate_perform_maint_window(self):
-        self.frame.destroy()
-        self.frame = pf.PerformMaintFrame(self, self.tk).frame
+        import performmaintframe as pf
+        self.activate_view(pf.PerformMaintFrame)
 
     # activate the MaintInfoFrame view
     def activate_maint_info_window(self):
-        self.frame.destroy()
-        self.frame = mif.MaintInfoFrame(self, self.tk).frame
+        import maintinfoframe as mif
+        self.activate_view(mif.MaintInfoFrame)
 
     # activates the MainFrame view
     def activate_main_window(self):
-        self.frame.destroy()
-        self.frame = mf.MainFrame(self, self.tk).frame
+        import mainframe as mf
+        self.activate_view(mf.MainFrame)
 
 
 #
-# Main
+# Records the time the startup phase finished
+#
+def mark_startup(phase):
+    startup_phases.append((phase, perf_counter() - startup_start))
+
+
+#
+# Prints the time taken by each startup phase and since the start
 #
+def print_startup_report():
+    print("%-24s %10s %10s" % ("startup phase", "phase", "total"))
+    previous = 0.0
+    for phase, seconds in startup_phases:
+        print("%-24s %7.1f ms %7.1f ms" % (phase, (seconds - previous) * 1e3, seconds * 1e3))
+        previous = seconds
+
 
 #
-# Activate and display the main window
+# Activates and displays the main window, with --startup-report prints the startup report once
+# the main view is shown and exits without running the application, with --api-port PORT serves
+# the API on the port while the application runs
 #
-my_gui = CarMaintenanceGui()
-my_gui.frame.mainloop()
+def main(args):
+    global my_gui
+    api_port = None
+    if '--api-port' in args:
+        try:
+            api_port = int(args[args.index('--api-port') + 1])
+        except (IndexError, ValueError):
+            print("carmaintmain: --api-port needs a port number", file=sys.stderr)
+            return 2
+    try:
+        data_file_lock.acquire()
+    except OSError as error:
+        print("carmaintmain: " + str(error), file=sys.stderr)
+        return 1
+    my_gui = CarMaintenanceGui(api_port)
+    if '--startup-report' in args:
+        my_gui.tk.update()
+        mark_startup('main view shown')
+        assets.wait_for_preload()
+        mark_startup('images preloaded')
+        print_startup_report()
+        my_gui.status_worker.close()
+        my_gui.tk.destroy()
+        return 0
+    my_gui.frame.mainloop()
+
+    #
+    # Register the exit handler
+    #
+    atexit.register(my_gui.do_exit)
+    return 0
+
 
 #
-# Register the exit handler
+# Main
 #
-atexit.register(my_gui.do_exit)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
 
 
 
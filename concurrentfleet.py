@@ -0,0 +1,283 @@
+"""
+Name
+    concurrentfleet
+
+DESCRIPTION
+    This module contains the thread-safe variant of the CarMaintenance object, for data
+    changed by several threads at once (e.g. odometer updates arriving from background
+    workers).
+
+    Each car is guarded by one of stripe_count locks picked by the car name (lock striping),
+    every method reading or changing a car holds the car's lock, so two updates to different
+    cars do not wait for each other and a reader never sees a car's items half changed.  The
+    structures shared by the whole fleet (the FleetStatus columns, the due date queue and the
+    listeners, e.g. the storage) are guarded by a fleet lock held only while they are used.
+    Work on the whole fleet at once (building the FleetStatus or the due date queue, the date
+    change check and snapshots) holds every car lock, taken in stripe order.
+
+    get_snapshot returns a consistent copy of the whole fleet as a plain CarMaintenance object
+    for reports and other readers walking every car.  The copy shares the MaintenanceItem
+    objects, which are replaced (never changed) when an item changes, so only the cars and
+    their item dictionaries are copied.
+
+    The status cache counters are added to under their own lock, and cars still unread from
+    the storage (SQLite) are read with the fleet lock held, as are the storage's queries, so
+    the storage connection is never used by two threads at once.  The user's selections
+    (carmaintenance.selections) are not part of the data and stay with the user interface
+    thread.  get_cached_car_status (the status of a whole car list, see statusworker) takes no
+    car lock, each car's status is a single read of the status cache.
+
+CLASS
+    ConcurrentCarMaintenance -- CarMaintenance object guarded by car and fleet locks
+    Synchronized             -- calls the methods of an object with a lock held
+
+FUNCTION
+                            -- ConcurrentCarMaintenance methods
+    __init__              -- creates the car data and its locks
+    from_car_data         -- returns a ConcurrentCarMaintenance taking over a CarMaintenance object
+    init_locks            -- creates the car, fleet and counter locks
+    __getstate__          -- returns the values to pickle from a snapshot
+    __setstate__          -- restores the pickled values and creates the locks
+    car_locked            -- context manager holding the lock of a car
+    fleet_locked          -- context manager holding the lock of every car
+    notify                -- calls the listeners with the fleet lock held
+    check_status_date     -- updates the cached status once the date changes, holding every car lock
+    check_due_dates       -- flips the status of the items that became due, holding every car lock
+    count_status          -- adds to the status cache counters with the counter lock held
+    get_due_dates         -- returns the due date queue, built holding every car lock
+    get_fleet_status      -- returns the FleetStatus columns, built holding every car lock
+    get_cars_needing_maintenance, get_items_needing_maintenance
+                          -- query the storage with the fleet lock held while cars are unread
+    get_snapshot          -- returns a consistent copy of the whole fleet
+    (car methods)         -- the CarMaintenance methods for a car, called with the car's lock held
+                            -- Synchronized methods
+    __init__              -- stores the object and the lock
+    __getattr__           -- returns the object's attribute, methods are called with the lock held
+    __len__               -- returns the object's length with the lock held
+                            -- Additional Functions
+    locked_car_method     -- returns a CarMaintenance method called with the car's lock held
+
+DATA
+    stripe_count          -- number of car locks
+    self.car_locks        -- car locks, a car uses car_locks[hash(car name) % stripe_count]
+    self.fleet_lock       -- lock guarding the FleetStatus, the due date queue, the listeners and
+                             the storage reading unread cars
+    self.stats_lock       -- lock guarding the status cache hit and miss counters
+    self.local            -- per thread number of car locks held through car_locked/fleet_locked
+"""
+
+import threading
+from contextlib import contextmanager
+from datetime import date
+import carmaintenance as cm
+
+stripe_count = 64
+
+
+#
+# Returns the CarMaintenance method (taking the car name first) called with the car's lock held,
+# as car_locked does (written out, the status checks call several of these methods per item)
+#
+def locked_car_method(method):
+    def locked(self, car_name, *args):
+        local = self.local
+        depth = getattr(local, 'depth', 0)
+        if depth == 0:
+            self.check_status_date()
+        with self.car_locks[hash(car_name) % stripe_count]:
+            local.depth = depth + 1
+            try:
+                return method(self, car_name, *args)
+            finally:
+                local.depth = depth
+    locked.__name__ = method.__name__
+    return locked
+
+
+#
+# Calls the methods of an object with a lock held
+#
+class Synchronized:
+
+    # stores the object and the lock
+    def __init__(self, target, lock):
+        self.target = target
+        self.lock = lock
+
+    # returns the object's attribute, a method is called with the lock held
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if not callable(attribute):
+            return attribute
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return attribute(*args, **kwargs)
+        return locked
+
+    # returns the object's length with the lock held
+    def __len__(self):
+        with self.lock:
+            return len(self.target)
+
+
+#
+# CarMaintenance object guarded by striped car locks and a fleet lock
+#
+class ConcurrentCarMaintenance(cm.CarMaintenance):
+
+    # creates the car data and its locks
+    def __init__(self):
+        self.init_locks()
+        super().__init__()
+
+    # returns a ConcurrentCarMaintenance taking over the cars, listeners and status of the
+    # CarMaintenance object (e.g. as retrieved from the storage), which must not be used after
+    @classmethod
+    def from_car_data(cls, car_data):
+        concurrent_data = cls.__new__(cls)
+        concurrent_data.init_locks()
+        concurrent_data.__dict__.update(car_data.__dict__)
+        concurrent_data.fleet_status = None
+        concurrent_data.due_dates = None
+        if isinstance(concurrent_data.cars, cm.LazyCars):
+            concurrent_data.cars.load_lock = concurrent_data.fleet_lock
+        return concurrent_data
+
+    # creates the car, fleet and counter locks
+    def init_locks(self):
+        self.car_locks = [threading.RLock() for stripe in range(stripe_count)]
+        self.fleet_lock = threading.RLock()
+        self.stats_lock = threading.Lock()
+        self.local = threading.local()
+
+    # pickles a consistent copy of the cars
+    def __getstate__(self):
+        return self.get_snapshot().__getstate__()
+
+    # restores the pickled cars and creates the locks
+    def __setstate__(self, state):
+        self.init_locks()
+        super().__setstate__(state)
+
+    # holds the car's lock, the date change check is made first (it needs every car lock)
+    @contextmanager
+    def car_locked(self, car_name):
+        depth = getattr(self.local, 'depth', 0)
+        if depth == 0:
+            self.check_status_date()
+        with self.car_locks[hash(car_name) % stripe_count]:
+            self.local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self.local.depth = depth
+
+    # holds every car lock (taken in stripe order so two threads cannot wait on each other)
+    @contextmanager
+    def fleet_locked(self):
+        depth = getattr(self.local, 'depth', 0)
+        for lock in self.car_locks:
+            lock.acquire()
+        self.local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self.local.depth = depth
+            for lock in reversed(self.car_locks):
+                lock.release()
+
+    # calls the listeners one change at a time
+    def notify(self, method_name, *args):
+        with self.fleet_lock:
+            super().notify(method_name, *args)
+
+    # updates the cached status once the date changes - skipped while this thread holds a car
+    # lock (the next call without one makes the update)
+    def check_status_date(self):
+        if date.today() != self.status_date and not getattr(self.local, 'depth', 0):
+            with self.fleet_locked():
+                super().check_status_date()
+
+    # flips the cached status of the items whose due date has passed
+    def check_due_dates(self, today=None):
+        with self.fleet_locked():
+            return super().check_due_dates(today)
+
+    # adds to the status cache counters (the cars being checked may use different car locks)
+    def count_status(self, hits, misses):
+        with self.stats_lock:
+            self.status_hits += hits
+            self.status_misses += misses
+
+    # returns the due date queue (its methods are called with the fleet lock held)
+    def get_due_dates(self):
+        due_dates = self.due_dates
+        if not isinstance(due_dates, Synchronized):
+            with self.fleet_locked():
+                if not isinstance(self.due_dates, Synchronized):
+                    self.due_dates = Synchronized(super().get_due_dates(), self.fleet_lock)
+                due_dates = self.due_dates
+        return due_dates
+
+    # returns the FleetStatus columns (its methods are called with the fleet lock held)
+    def get_fleet_status(self):
+        fleet_status = self.fleet_status
+        if fleet_status is None:
+            import fleetstatus
+            with self.fleet_locked():
+                if self.fleet_status is None:
+                    self.fleet_status = Synchronized(fleetstatus.FleetStatus(self), self.fleet_lock)
+                fleet_status = self.fleet_status
+        return fleet_status
+
+    # returns the cars needing maintenance, while cars are unread the storage answers with the
+    # fleet lock held (the listener calls writing to the storage hold the same lock)
+    def get_cars_needing_maintenance(self):
+        if isinstance(self.cars, cm.LazyCars) and self.cars.unloaded:
+            with self.fleet_lock:
+                return self.cars.storage.get_cars_due()
+        return self.get_fleet_status().get_cars_due()
+
+    # returns car name -> items needing maintenance, answered by the storage as above
+    def get_items_needing_maintenance(self):
+        if isinstance(self.cars, cm.LazyCars) and self.cars.unloaded:
+            with self.fleet_lock:
+                return self.cars.storage.get_items_due()
+        return self.get_fleet_status().get_items_due()
+
+    # returns a consistent copy of the whole fleet as a plain CarMaintenance object, before_copy
+    # is called first with every car lock and the fleet lock held, so no change is being made or
+    # handed to the listeners (e.g. the autosave moving the journal aside)
+    def get_snapshot(self, before_copy=None):
+        snapshot = cm.CarMaintenance()
+        with self.fleet_locked():
+            if before_copy is not None:
+                with self.fleet_lock:
+                    before_copy()
+            for car_name, car in self.cars.items():
+                car_copy = cm.CarToMaintain(car_name, car.mileage)
+                car_copy.items = dict(car.items)
+                snapshot.cars[car_name] = car_copy
+        return snapshot
+
+    # the CarMaintenance methods for a car are called with the car's lock held
+    add_car = locked_car_method(cm.CarMaintenance.add_car)
+    del_car = locked_car_method(cm.CarMaintenance.del_car)
+    set_mileage = locked_car_method(cm.CarMaintenance.set_mileage)
+    add_car_items = locked_car_method(cm.CarMaintenance.add_car_items)
+    del_car_items = locked_car_method(cm.CarMaintenance.del_car_items)
+    does_car_need_maintenance = locked_car_method(cm.CarMaintenance.does_car_need_maintenance)
+    does_item_need_maintenance = locked_car_method(cm.CarMaintenance.does_item_need_maintenance)
+    compute_item_need = locked_car_method(cm.CarMaintenance.compute_item_need)
+    is_item_due_by_date = locked_car_method(cm.CarMaintenance.is_item_due_by_date)
+    get_item_due_date = locked_car_method(cm.CarMaintenance.get_item_due_date)
+    is_new_item = locked_car_method(cm.CarMaintenance.is_new_item)
+    get_items_list = locked_car_method(cm.CarMaintenance.get_items_list)
+    get_mileage_index = locked_car_method(cm.CarMaintenance.get_mileage_index)
+    get_mileage = locked_car_method(cm.CarMaintenance.get_mileage)
+    get_item_freq_miles = locked_car_method(cm.CarMaintenance.get_item_freq_miles)
+    get_item_freq_time = locked_car_method(cm.CarMaintenance.get_item_freq_time)
+    get_item_last_mileage = locked_car_method(cm.CarMaintenance.get_item_last_mileage)
+    get_item_last_date = locked_car_method(cm.CarMaintenance.get_item_last_date)
+    get_cached_item_status = locked_car_method(cm.CarMaintenance.get_cached_item_status)
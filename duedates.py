@@ -0,0 +1,113 @@
+"""
+Name
+    duedates
+
+DESCRIPTION
+    This module contains the priority queue of the dates when maintenance items become due
+    based on time.  The queue is a min-heap ordered by due date covering every item in the
+    fleet, so finding the next due date or the items that became due since the last check
+    does not require looking at every item.  Items that are updated or deleted leave their
+    old heap entry behind, the entry is skipped when it reaches the top of the heap.
+
+CLASS
+    DueDateQueue          -- object to store the due dates of the maintenance items in a heap
+
+FUNCTION
+                            -- DueDateQueue methods
+    __init__              -- create the empty heap
+    __len__               -- returns the number of items in the queue
+    set_due_date          -- add/move an item in the queue (None removes it)
+    remove_item           -- remove an item from the queue
+    remove_car            -- remove all of a car's items from the queue
+    next_due_date         -- returns the earliest due date in the queue
+    pop_due               -- removes and returns the items due on or before a date
+    discard_stale         -- removes the entries left behind by updated/deleted items from the top of the heap
+    rebuild               -- rebuilds the heap when most of its entries have been left behind
+
+DATA
+    self.heap             -- heap entries of (due date ordinal, sequence number, car name, item name)
+    self.entries          -- current entry for each item, car name -> item name -> (ordinal, sequence number)
+    self.count            -- number of items in the queue
+    self.sequence         -- sequence number given to the next heap entry
+"""
+
+from datetime import date
+import heapq
+
+
+#
+# Min-heap of the dates maintenance items become due
+#
+class DueDateQueue:
+
+    # create the empty heap
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.count = 0
+        self.sequence = 0
+
+    # returns the number of items in the queue
+    def __len__(self):
+        return self.count
+
+    # add the item to the queue or move it to its new due date, a due date of None removes the item
+    def set_due_date(self, car_name, item_name, due_date):
+        self.remove_item(car_name, item_name)
+        if due_date is None:
+            return
+        entry = (due_date.toordinal(), self.sequence)
+        self.sequence += 1
+        self.entries.setdefault(car_name, {})[item_name] = entry
+        self.count += 1
+        heapq.heappush(self.heap, entry + (car_name, item_name))
+        self.rebuild()
+
+    # remove the item from the queue (its heap entry is skipped later)
+    def remove_item(self, car_name, item_name):
+        car_entries = self.entries.get(car_name)
+        if car_entries is not None and car_entries.pop(item_name, None) is not None:
+            self.count -= 1
+            if not car_entries:
+                del self.entries[car_name]
+
+    # remove all of the car's items from the queue
+    def remove_car(self, car_name):
+        car_entries = self.entries.pop(car_name, None)
+        if car_entries is not None:
+            self.count -= len(car_entries)
+
+    # returns the earliest due date in the queue (None if the queue is empty)
+    def next_due_date(self):
+        self.discard_stale()
+        if not self.heap:
+            return None
+        return date.fromordinal(self.heap[0][0])
+
+    # removes and returns the (car name, item name) of the items due on or before the date
+    def pop_due(self, on_date):
+        due_items = []
+        on_ordinal = on_date.toordinal()
+        self.discard_stale()
+        while self.heap and self.heap[0][0] <= on_ordinal:
+            ordinal, sequence, car_name, item_name = heapq.heappop(self.heap)
+            self.remove_item(car_name, item_name)
+            due_items.append((car_name, item_name))
+            self.discard_stale()
+        return due_items
+
+    # removes the entries of updated or deleted items from the top of the heap
+    def discard_stale(self):
+        while self.heap:
+            ordinal, sequence, car_name, item_name = self.heap[0]
+            if self.entries.get(car_name, {}).get(item_name) == (ordinal, sequence):
+                break
+            heapq.heappop(self.heap)
+
+    # rebuilds the heap from the current entries once most of the heap entries are stale
+    def rebuild(self):
+        if len(self.heap) > 2 * self.count + 64:
+            self.heap = [entry + (car_name, item_name)
+                         for car_name, car_entries in self.entries.items()
+                         for item_name, entry in car_entries.items()]
+            heapq.heapify(self.heap)
@@ -0,0 +1,255 @@
+"""
+Name
+    fleetio
+
+DESCRIPTION
+    This module contains the bulk import and export of cars, maintenance items and the last
+    maintenance performed, as CSV or JSON lines files.  Each row has the columns
+
+        record, car, mileage, item, freq_miles, freq_time, last_mileage, last_date
+
+    record is 'car' (add the car or update its mileage), 'item' (add/update the item with all
+    of its values) or 'service' (update when the item's maintenance was last performed).  When
+    the record column is missing or blank it is 'car' for rows without an item, 'service' for
+    rows of an existing item without frequencies and 'item' otherwise.  Dates are mm/dd/yyyy.
+
+    Rows are read, validated (with the same rules as the views, see validation) and added a
+    batch at a time and exported one car at a time, so memory use does not grow with the file
+    size.  The number and date columns of a batch are validated together and the batch's
+    changes are committed to the storage together (see CarMaintenance.begin_batch).
+
+CLASS
+    None
+
+FUNCTION
+    get_file_format       -- returns 'csv' or 'jsonl' for a file name
+    read_rows             -- generates (line number, row) for each row in a file
+    get_row_values        -- returns the text of each column of a row
+    parse_row_values      -- returns the (value, error) of each number and date column of a row
+    parse_columns         -- returns the parse_row_values of each row of a batch, a column at a time
+    import_row            -- validates a row and applies it to the CarMaintenance object
+    import_rows           -- applies rows in batches, generating (line number, error) for rejected rows
+    import_file           -- applies the rows of a file, generating (line number, error) for rejected rows
+    export_rows           -- generates a row for each car and item
+    export_file           -- writes the rows for every car and item to a file, returns the row count
+
+DATA
+    columns               -- column names in the order they are written
+    number_columns        -- columns holding mileages or numbers of months
+    date_columns          -- columns holding dates
+    batch_size            -- number of rows committed together when importing
+"""
+
+import csv
+import itertools
+import json
+import os
+import carmaintenance as cm
+import validation as v
+
+columns = ['record', 'car', 'mileage', 'item', 'freq_miles', 'freq_time', 'last_mileage', 'last_date']
+number_columns = ['mileage', 'freq_miles', 'freq_time', 'last_mileage']
+date_columns = ['last_date']
+batch_size = 1000
+
+
+#
+# Returns the file format for the file name ('jsonl' for .jsonl/.json files, 'csv' otherwise)
+#
+def get_file_format(file_name):
+    if os.path.splitext(file_name)[1].lower() in ('.jsonl', '.json'):
+        return 'jsonl'
+    return 'csv'
+
+
+#
+# Generates (line number, row) for each row of a CSV or JSON lines file, a row that cannot
+# be read is generated as (line number, error message)
+#
+def read_rows(file_name, file_format=None):
+    if file_format is None:
+        file_format = get_file_format(file_name)
+    with open(file_name, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(file, 1):
+                if line.strip() == "":
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield line_number, "Row is not valid JSON"
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, "Row is not a JSON object"
+                    continue
+                yield line_number, row
+
+
+#
+# Returns the text of each column of the row, a missing column is blank
+#
+def get_row_values(row):
+    values = {}
+    for column in columns:
+        value = row.get(column)
+        values[column] = "" if value is None else str(value).strip()
+    return values
+
+
+#
+# Returns the (value, error) of each number and date column of the row's values (see validation)
+#
+def parse_row_values(values):
+    parsed = {}
+    for column in number_columns:
+        parsed[column] = v.parse_number(values[column])
+    for column in date_columns:
+        parsed[column] = v.parse_date(values[column])
+    return parsed
+
+
+#
+# Returns the parse_row_values of each of the rows' values, validating each column of the batch at once
+#
+def parse_columns(rows_values):
+    parsed_rows = [{} for values in rows_values]
+    for column in number_columns + date_columns:
+        parse = v.parse_dates if column in date_columns else v.parse_numbers
+        column_values, errors = parse([values[column] for values in rows_values])
+        for index, value in enumerate(column_values):
+            parsed_rows[index][column] = (value, errors.get(index))
+    return parsed_rows
+
+
+#
+# Validates the row and applies it to the CarMaintenance object, returns the error message
+# if the row was rejected (None if applied), parsed is the row's parse_row_values if known
+#
+def import_row(car_data, row, parsed=None):
+    values = get_row_values(row)
+    if parsed is None:
+        parsed = parse_row_values(values)
+    car = values['car'].replace(' ', '_')
+    item = values['item'].replace(' ', '_')
+    mileage, mileage_error = parsed['mileage']
+    record = values['record'].lower()
+
+    if car == "":
+        return "Enter a car name!"
+    if record == "":
+        if item == "":
+            record = 'car'
+        elif values['freq_miles'] == "" and values['freq_time'] == "" and \
+                car in car_data.cars and not car_data.is_new_item(car, item):
+            record = 'service'
+        else:
+            record = 'item'
+    if record not in ('car', 'item', 'service'):
+        return "Unknown record type " + record + "!"
+
+    # cars need a valid mileage, items and services can give one to update the car's mileage
+    if mileage is None and (record == 'car' or mileage_error is not None):
+        return "Enter mileage as a number!"
+    if record == 'car':
+        if car_data.is_new_car(car):
+            car_data.add_car(car, mileage)
+        else:
+            car_data.set_mileage(car, mileage)
+        return None
+
+    if item == "":
+        return "Please enter maintenance item!"
+    if car not in car_data.cars:
+        return "Unknown car " + car + "!"
+    for column in ('freq_miles', 'last_mileage'):
+        if parsed[column][1] is not None:
+            return "Enter mileages as a number!"
+    if parsed['freq_time'][1] is not None:
+        return "Enter number of months as a number!"
+    if parsed['last_date'][1] is not None:
+        return "Enter valid date as mm/dd/yyyy!"
+
+    if record == 'service':
+        if car_data.is_new_item(car, item):
+            return "Unknown maintenance item " + item + "!"
+        freq_miles = car_data.get_item_freq_miles(car, item)
+        freq_time = car_data.get_item_freq_time(car, item)
+    else:
+        freq_miles = parsed['freq_miles'][0]
+        freq_time = parsed['freq_time'][0]
+    if mileage is not None:
+        car_data.set_mileage(car, mileage)
+    car_data.add_car_items(car, item, freq_miles, freq_time, parsed['last_mileage'][0], parsed['last_date'][0])
+    return None
+
+
+#
+# Applies the (line number, row) pairs to the CarMaintenance object batch_size rows at a time,
+# validating the columns of each batch together and committing each batch, and generates
+# (line number, error message) for each row rejected
+#
+def import_rows(car_data, numbered_rows, rows_per_batch=None):
+    if rows_per_batch is None:
+        rows_per_batch = batch_size
+    numbered_rows = iter(numbered_rows)
+    while True:
+        batch = list(itertools.islice(numbered_rows, rows_per_batch))
+        if not batch:
+            return
+        rows = [row for line_number, row in batch if not isinstance(row, str)]
+        parsed_rows = iter(parse_columns([get_row_values(row) for row in rows]))
+        car_data.begin_batch()
+        try:
+            for line_number, row in batch:
+                error = row if isinstance(row, str) else import_row(car_data, row, next(parsed_rows))
+                if error is not None:
+                    yield line_number, error
+        finally:
+            car_data.end_batch()
+
+
+#
+# Applies the rows of a CSV or JSON lines file to the CarMaintenance object and generates
+# (line number, error message) for each row rejected
+#
+def import_file(car_data, file_name, file_format=None, rows_per_batch=None):
+    return import_rows(car_data, read_rows(file_name, file_format), rows_per_batch)
+
+
+#
+# Generates a 'car' row for each car followed by an 'item' row for each of its items
+#
+def export_rows(car_data):
+    for car in car_data.get_car_list():
+        yield {'record': 'car', 'car': car, 'mileage': cm.number_to_text(car_data.get_mileage(car)),
+               'item': "", 'freq_miles': "", 'freq_time': "", 'last_mileage': "", 'last_date': ""}
+        for item in car_data.get_items_list(car):
+            yield {'record': 'item', 'car': car, 'mileage': "", 'item': item,
+                   'freq_miles': cm.number_to_text(car_data.get_item_freq_miles(car, item)),
+                   'freq_time': cm.number_to_text(car_data.get_item_freq_time(car, item)),
+                   'last_mileage': cm.number_to_text(car_data.get_item_last_mileage(car, item)),
+                   'last_date': cm.date_to_text(car_data.get_item_last_date(car, item))}
+
+
+#
+# Writes a row for every car and item to a CSV or JSON lines file, returns the number of rows written
+#
+def export_file(car_data, file_name, file_format=None):
+    if file_format is None:
+        file_format = get_file_format(file_name)
+    row_count = 0
+    with open(file_name, 'w', newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+        for row in export_rows(car_data):
+            if file_format == 'csv':
+                writer.writerow(row)
+            else:
+                file.write(json.dumps(row) + '\n')
+            row_count += 1
+    return row_count
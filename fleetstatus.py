@@ -0,0 +1,338 @@
+"""
+Name
+    fleetstatus
+
+DESCRIPTION
+    This module contains the columnar store used to answer "which cars and items need
+    maintenance" for the whole fleet in one pass.  The maintenance data is copied out of
+    the CarMaintenance object into one column per field (NumPy arrays when NumPy is
+    installed, plain lists otherwise) so the check does not walk the car and item
+    dictionaries or recompute the due date for every item.
+
+    The columns are kept in step with the CarMaintenance object as it changes: a new car or
+    item is appended as a new row, a changed item is updated in its row and a deleted car or
+    item leaves a tombstone (a row that is never due) until the tombstones outnumber the live
+    rows and the columns are compacted.  A car's rows are in the same order as its items, and
+    the cars in the same order as the car list, so the results are in car list order.  The
+    rows of each car are next to each other when the columns are built or compacted, the
+    item name -> row dictionary of a car is made from its rows the first time it is changed.
+
+CLASS
+    FleetStatus           -- object to store the fleet's maintenance data in columns and
+                             evaluate the maintenance needed for every item at once
+
+FUNCTION
+                            -- FleetStatus methods
+    __init__              -- build the columns from a CarMaintenance object
+    append_car            -- add a row for a car to the car columns
+    append_item           -- add a row for a car's item to the item columns
+    get_item_positions    -- returns the item name -> row dictionary of a car
+    delete_row            -- leave a tombstone in an item row
+    add_car               -- add a car (or empty a replaced car) in the columns
+    del_car               -- delete a car and its items from the columns
+    set_item              -- add an item to the columns or update its row
+    del_item              -- delete an item from the columns
+    compact               -- drop the tombstones from the columns, putting each car's rows together
+    set_mileage           -- update the current mileage column for a car
+    items_due             -- returns the due flag for every item in the fleet
+    get_cars_due          -- returns the names of the cars needing maintenance
+    get_items_due         -- returns the items needing maintenance for every car
+                            -- Additional Functions
+    get_item_values       -- returns the column values for a MaintenanceItem
+    get_due_dates         -- returns the due date column for the last date and frequency columns
+    grow                  -- returns a NumPy column with room for more rows
+
+DATA
+    np                    -- the numpy module or None if numpy is not installed
+    no_due_date           -- day ordinal used for items without a date based check
+    epoch                 -- day ordinal of the NumPy datetime64 epoch (1970-01-01)
+    item_columns          -- names of the item columns, in get_item_values order after car_index
+    self.car_names        -- car name for each car index (None once the car is deleted)
+    self.car_positions    -- car index for each car name
+    self.item_positions   -- item row for each item name, car name -> item name -> row (only the
+                             cars changed since the columns were built or compacted)
+    self.row_bounds       -- first row of each car index (and the row after the last car) when
+                             the columns were built or compacted
+    self.car_count        -- number of car rows in use (deleted cars included)
+    self.item_count       -- number of item rows in use (tombstones included)
+    self.deleted_cars     -- number of deleted car rows
+    self.deleted_items    -- number of tombstones in the item rows
+    self.car_mileage      -- current mileage for each car index
+    self.car_index        -- car index for each item (-1 for a tombstone)
+    self.item_names       -- item name for each item
+    self.freq_miles       -- frequency of maintenance in miles for each item (0 if not set)
+    self.freq_time        -- frequency of maintenance in months for each item (-1 if not set)
+    self.last_mileage     -- mileage when maintenance was last performed (0 if not set)
+    self.last_date        -- day ordinal when maintenance was last performed (0 if not set)
+    self.due_date         -- day ordinal when maintenance is needed based on time
+"""
+
+from datetime import date
+from itertools import accumulate
+import carmaintenance as cm
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+no_due_date = date.max.toordinal() + 1
+epoch = date(1970, 1, 1).toordinal()
+item_columns = ('car_index', 'freq_miles', 'freq_time', 'last_mileage', 'last_date', 'due_date')
+
+
+#
+# Columnar copy of the fleet's maintenance data
+#
+class FleetStatus:
+
+    # build the columns from the cars stored in car_data
+    def __init__(self, car_data):
+        cars = list(car_data.cars.items())
+        self.car_names = [car_name for car_name, car in cars]
+        self.car_positions = {car_name: car_index for car_index, car_name in enumerate(self.car_names)}
+        self.item_names = [item_name for car_name, car in cars for item_name in car.items]
+        self.item_positions = {}
+        self.row_bounds = [0] + list(accumulate(len(car.items) for car_name, car in cars))
+        self.car_count = len(cars)
+        self.item_count = len(self.item_names)
+        self.deleted_cars = 0
+        self.deleted_items = 0
+
+        items = [item for car_name, car in cars for item in car.items.values()]
+        if np is not None:
+            # one column at a time, the due dates are worked out for the whole column at once
+            self.car_mileage = np.fromiter((car.mileage or 0 for car_name, car in cars), np.int64, len(cars))
+            self.car_index = np.repeat(np.arange(len(cars), dtype=np.int64), [len(car.items) for car_name, car in cars])
+            self.freq_miles = np.fromiter((item.freq_miles or 0 for item in items), np.int64, len(items))
+            self.last_mileage = np.fromiter((item.last_mileage or 0 for item in items), np.int64, len(items))
+            freq_time = np.fromiter((item.freq_time if item.freq_time is not None else -1 for item in items),
+                                    np.int64, len(items))
+            last_date = np.fromiter((item.last_date.toordinal() if item.last_date is not None else 0
+                                     for item in items), np.int64, len(items))
+            dated = (freq_time >= 0) & (last_date > 0)
+            self.freq_time = np.where(dated, freq_time, -1)
+            self.last_date = np.where(dated, last_date, 0)
+            self.due_date = get_due_dates(self.last_date, self.freq_time)
+        else:
+            self.car_mileage = [car.mileage or 0 for car_name, car in cars]
+            self.car_index = [car_index for car_index, (car_name, car) in enumerate(cars) for item in car.items]
+            self.freq_miles, self.freq_time, self.last_mileage, self.last_date, self.due_date = \
+                (list(column) for column in zip(*[get_item_values(item) for item in items])) if items else \
+                ([], [], [], [], [])
+
+    # add a row for the car to the car columns
+    def append_car(self, car_name, mileage):
+        if np is not None:
+            if self.car_count == len(self.car_mileage):
+                self.car_mileage = grow(self.car_mileage)
+            self.car_mileage[self.car_count] = mileage or 0
+        else:
+            self.car_mileage.append(mileage or 0)
+        self.car_positions[car_name] = self.car_count
+        self.car_names.append(car_name)
+        self.item_positions[car_name] = {}
+        self.car_count += 1
+
+    # add a row for the car's item to the item columns
+    def append_item(self, car_name, item_name, item):
+        values = (self.car_positions[car_name],) + get_item_values(item)
+        if np is not None and self.item_count == len(self.car_index):
+            for column in item_columns:
+                setattr(self, column, grow(getattr(self, column)))
+        for column, value in zip(item_columns, values):
+            if np is not None:
+                getattr(self, column)[self.item_count] = value
+            else:
+                getattr(self, column).append(value)
+        self.get_item_positions(car_name)[item_name] = self.item_count
+        self.item_names.append(item_name)
+        self.item_count += 1
+
+    # returns the car's item name -> row dictionary, made from the car's rows the first time
+    def get_item_positions(self, car_name):
+        positions = self.item_positions.get(car_name)
+        if positions is None:
+            car_index = self.car_positions[car_name]
+            first_row, end_row = self.row_bounds[car_index], self.row_bounds[car_index + 1]
+            positions = dict(zip(self.item_names[first_row:end_row], range(first_row, end_row)))
+            self.item_positions[car_name] = positions
+        return positions
+
+    # leave a tombstone in the item row - no car, no mileage check and no due date
+    def delete_row(self, row):
+        self.car_index[row] = -1
+        self.freq_miles[row] = 0
+        self.due_date[row] = no_due_date
+        self.item_names[row] = None
+        self.deleted_items += 1
+
+    # add a car, a car replacing one with the same name keeps its place and has no items
+    def add_car(self, car_name, mileage):
+        if car_name not in self.car_positions:
+            self.append_car(car_name, mileage)
+            return
+        for row in self.get_item_positions(car_name).values():
+            self.delete_row(row)
+        self.item_positions[car_name] = {}
+        self.set_mileage(car_name, mileage)
+        self.compact()
+
+    # delete the car and its items
+    def del_car(self, car_name):
+        for row in self.get_item_positions(car_name).values():
+            self.delete_row(row)
+        del self.item_positions[car_name]
+        self.car_names[self.car_positions.pop(car_name)] = None
+        self.deleted_cars += 1
+        self.compact()
+
+    # add the car's item (appended after the car's other items) or update its row in place
+    def set_item(self, car_name, item_name, item):
+        row = self.get_item_positions(car_name).get(item_name)
+        if row is None:
+            self.append_item(car_name, item_name, item)
+            return
+        for column, value in zip(item_columns[1:], get_item_values(item)):
+            getattr(self, column)[row] = value
+
+    # delete the car's item
+    def del_item(self, car_name, item_name):
+        self.delete_row(self.get_item_positions(car_name).pop(item_name))
+        self.compact()
+
+    # drop the tombstones once they outnumber the live rows, the live rows are put in car order
+    # (a car's rows keep their order) so each car's rows are next to each other again
+    def compact(self):
+        if self.deleted_items * 2 <= self.item_count and self.deleted_cars * 2 <= self.car_count:
+            return
+        live_cars = [car_index for car_index in range(self.car_count) if self.car_names[car_index] is not None]
+        new_car_index = [-1] * self.car_count
+        for new_index, car_index in enumerate(live_cars):
+            new_car_index[car_index] = new_index
+
+        if np is not None:
+            car_index = self.car_index[:self.item_count]
+            live_items = np.flatnonzero(car_index >= 0)
+            live_items = live_items[np.argsort(car_index[live_items], kind='stable')]
+            self.car_mileage = self.car_mileage[live_cars]
+            self.car_index = np.array(new_car_index, dtype=np.int64)[car_index[live_items]]
+            for column in item_columns[1:]:
+                setattr(self, column, getattr(self, column)[live_items])
+            live_items = live_items.tolist()
+            car_counts = np.bincount(self.car_index, minlength=len(live_cars)).tolist()
+        else:
+            live_items = sorted((row for row in range(self.item_count) if self.car_index[row] >= 0),
+                                key=self.car_index.__getitem__)
+            self.car_mileage = [self.car_mileage[car_index] for car_index in live_cars]
+            self.car_index = [new_car_index[self.car_index[row]] for row in live_items]
+            for column in item_columns[1:]:
+                values = getattr(self, column)
+                setattr(self, column, [values[row] for row in live_items])
+            car_counts = [0] * len(live_cars)
+            for car_index in self.car_index:
+                car_counts[car_index] += 1
+
+        self.car_names = [self.car_names[car_index] for car_index in live_cars]
+        self.car_positions = {car_name: car_index for car_index, car_name in enumerate(self.car_names)}
+        self.item_names = [self.item_names[row] for row in live_items]
+        self.item_positions = {}
+        self.row_bounds = [0] + list(accumulate(car_counts))
+        self.car_count = len(self.car_names)
+        self.item_count = len(self.item_names)
+        self.deleted_cars = 0
+        self.deleted_items = 0
+
+    # update the current mileage for the car, the item columns do not change
+    def set_mileage(self, car_name, mileage):
+        self.car_mileage[self.car_positions[car_name]] = mileage or 0
+
+    # returns the due flag for every item row (same rules as CarMaintenance.does_item_need_maintenance),
+    # a tombstone is never due
+    def items_due(self, today=None):
+        if today is None:
+            today = date.today()
+        today = today.toordinal()
+
+        if np is not None:
+            count = self.item_count
+            mileage = self.car_mileage[self.car_index[:count]]
+            freq_miles = self.freq_miles[:count]
+            due = (freq_miles != 0) & (mileage > self.last_mileage[:count] + freq_miles)
+            due |= self.due_date[:count] <= today
+            return due
+
+        due = []
+        for index in range(self.item_count):
+            mileage = self.car_mileage[self.car_index[index]]
+            freq_miles = self.freq_miles[index]
+            due.append((freq_miles != 0 and mileage > self.last_mileage[index] + freq_miles)
+                       or self.due_date[index] <= today)
+        return due
+
+    # returns the names of the cars needing maintenance in car list order
+    def get_cars_due(self, today=None):
+        due = self.items_due(today)
+        if np is not None:
+            car_indexes = np.unique(self.car_index[:self.item_count][due]).tolist()
+        else:
+            car_indexes = sorted(set(self.car_index[index] for index, need in enumerate(due) if need))
+        return [self.car_names[car_index] for car_index in car_indexes]
+
+    # returns a dictionary of car name -> list of items needing maintenance in car list order
+    # (an item added to a car is in a later row than the car's other items but not the later cars')
+    def get_items_due(self, today=None):
+        due = self.items_due(today)
+        if np is not None:
+            due_indexes = np.flatnonzero(due)
+            car_indexes = self.car_index[due_indexes]
+            order = np.argsort(car_indexes, kind='stable')
+            due_indexes = due_indexes[order].tolist()
+            car_indexes = car_indexes[order].tolist()
+        else:
+            due_indexes = sorted((index for index, need in enumerate(due) if need), key=self.car_index.__getitem__)
+            car_indexes = [self.car_index[index] for index in due_indexes]
+
+        items_due = {}
+        for index, car_index in zip(due_indexes, car_indexes):
+            car = self.car_names[car_index]
+            items_due.setdefault(car, []).append(self.item_names[index])
+        return items_due
+
+
+#
+# Returns the column values of a MaintenanceItem - (frequency in miles, frequency in months,
+# last mileage, last date, due date), the due date computed once here rather than on every check
+#
+def get_item_values(item):
+    if item.last_date is not None and item.freq_time is not None:
+        change_date = cm.add_months_to_date(item.last_date, item.freq_time)
+        return (item.freq_miles or 0, item.freq_time, item.last_mileage or 0, item.last_date.toordinal(),
+                change_date.toordinal())
+    return item.freq_miles or 0, -1, item.last_mileage or 0, 0, no_due_date
+
+
+#
+# Returns the due date column (day ordinals) for the last date and frequency in months columns,
+# the same dates as add_months_to_date worked out for the whole column at once with NumPy month
+# arithmetic: the day is clamped to the length of the new month
+#
+def get_due_dates(last_date, freq_time):
+    dated = freq_time >= 0
+    days = np.where(dated, last_date - epoch, 0).astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    day_of_month = (days - months.astype('datetime64[D]')).astype(np.int64)
+    new_months = months + np.maximum(freq_time, 0).astype('timedelta64[M]')
+    month_start = new_months.astype('datetime64[D]')
+    month_length = ((new_months + np.timedelta64(1, 'M')).astype('datetime64[D]') - month_start).astype(np.int64)
+    due_date = month_start.astype(np.int64) + np.minimum(day_of_month, month_length - 1) + epoch
+    return np.where(dated, due_date, no_due_date)
+
+
+#
+# Returns a copy of the NumPy column with room for twice as many rows (the new rows are unused)
+#
+def grow(column):
+    new_column = np.zeros(max(2 * len(column), 16), dtype=column.dtype)
+    new_column[:len(column)] = column
+    return new_column
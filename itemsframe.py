@@ -15,10 +15,13 @@ FUNCTION
                              object, and initializes the widgets in the window
                              allowing the user to add/delete/update items for the
                              selected car in the maintenance list
+    refresh               -- shows the selected car's items with the selection mode reset, when the view is shown again
     set_option_background -- set the background color to highlight user selecting DELETE option
     do_update_mileage     -- activates the UpdateMileage view to allow user to update the current mileage
     build_items_list      -- stores the items for the selected car in the scroll list visible to the user
                              to allow for item selection
+    show_item_status      -- colors the items as the status worker finds their status
+    hide                  -- stops finding the status of the items when another view is shown
     do_cancel             -- returns control to the MainFrame view
     do_add_items          -- activates AddItemsFrame view to allow user to add new items
     do_del_items          -- deletes selected item from selected car's maintenance items list
@@ -31,13 +34,16 @@ DATA
     self.master           -- contains the calling class to allow calling its methods
     self.tk               -- contains tkinter to allow creating window elements
                              (Labels, Buttons, Entries)
+    self.item_index       -- row of each item in the scroll list, item name -> row
+    self.status_request   -- id of the status worker request for the items' status
     cm.car_data           -- contains the CarMaintenance data object
     cm.selections         -- contains the user selected car name and item name
 """
 
 import carmaintenance as cm
 from tkinter import *
-from PIL import ImageTk, Image
+import assets
+import statusworker
 
 
 #
@@ -49,20 +55,17 @@ class ItemsFrame:
     def __init__(self, master, tk):
         self.master = master
         self.tk = tk
+        self.status_request = None
 
         self.frame = Frame(self.tk, bg=self.tk.background)
         self.frame.pack(fill=BOTH, expand=TRUE)
 
         # Create and insert phone background image
-        load_file = "phone-background.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-background.png")
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=0, y=0, relwidth=1, relheight=1, anchor=NW)
-        load_file = "phone-hdr.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-hdr.png")
         self.img_hdr_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_hdr_panel.image = photo
         self.img_hdr_panel.place(x=20, y=80, anchor=NW)
@@ -74,10 +77,7 @@ class ItemsFrame:
         self.cancel_button.place(x=10, y=95, anchor=NW)
 
         # Create and insert car image
-        load_file = "car.png"
-        img = Image.open(load_file)
-        img = img.resize((25,25),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("car.png", (25, 25))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=150, y=115, anchor=CENTER)
@@ -96,10 +96,7 @@ class ItemsFrame:
         self.update_mileage_button.place(x=150, y=205, anchor=CENTER)
 
         # Create and insert wrench image
-        load_file = "wrench.png"
-        img = Image.open(load_file)
-        img = img.resize((30,30),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("wrench.png", (30, 30))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=70, y=245, anchor=CENTER)
@@ -137,7 +134,13 @@ class ItemsFrame:
                                  font=("Helvetica", 10), bg=self.tk.background)
         self.add_button.place(x=15, y=530, anchor=SW)
 
-        # inserts the car names into the ListBox
+        # inserts the item names into the ListBox
+        self.refresh()
+
+    # shows the selected car's items in update mode (called each time the view is shown)
+    def refresh(self):
+        self.dropVar.set(self.dropOptions[0])
+        self.set_option_background(self.dropOptions[0])
         self.build_items_list()
 
     # Highlight the background color if delete mode selected
@@ -162,17 +165,31 @@ class ItemsFrame:
         self.items_list_nodes.delete(0, self.items_list_nodes.size())
         car = cm.selections.get_car_selected()
         items_list = cm.car_data.get_items_list(car)
-        item_index=0
+        self.item_index = {}
         for item in items_list:
             item_text_entry = item.replace('_', ' ')
             self.items_list_nodes.insert(END, item_text_entry)
-
-            # color the item's background yellow if the maintenance is needed
-            if cm.car_data.does_item_need_maintenance(car, item):
-                self.items_list_nodes.itemconfig(item_index, {'bg': 'yellow'})
+            self.item_index[item] = len(self.item_index)
+            self.items_list_nodes.itemconfig(self.item_index[item], {'bg': statusworker.unknown_color})
+
+        # the items are colored as the status worker finds their status
+        self.hide()
+        self.status_request = self.master.status_worker.request_items(cm.car_data, car, items_list,
+                                                                      self.show_item_status)
+
+    # colors the item's background yellow if the maintenance is needed
+    def show_item_status(self, statuses):
+        for item, need in statuses:
+            if need:
+                self.items_list_nodes.itemconfig(self.item_index[item], {'bg': 'yellow'})
             else:
-                self.items_list_nodes.itemconfig(item_index, {'bg': 'white'})
-            item_index = item_index + 1
+                self.items_list_nodes.itemconfig(self.item_index[item], {'bg': 'white'})
+
+    # stops finding the status of the items (called when another view is shown)
+    def hide(self):
+        if self.status_request is not None:
+            self.master.status_worker.cancel(self.status_request)
+            self.status_request = None
 
     # activates the MainFrame view
     def do_cancel(self):
@@ -187,7 +204,8 @@ class ItemsFrame:
     def do_del_items(self):
         car = cm.selections.get_car_selected()
         item = cm.selections.get_item_selected()
-        cm.car_data.del_car_items(car, item)
+        with self.master.data_lock.write_locked():
+            cm.car_data.del_car_items(car, item)
 
     # Display Maintenance Item option selected - selection activates the PerformMaintFrame view
     # Delete Selected Item option selected - selection deletes the selected item from the car's maintenance list
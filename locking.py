@@ -0,0 +1,163 @@
+"""
+Name
+    locking
+
+DESCRIPTION
+    This module contains the reader/writer lock guarding the car maintenance data when it is
+    used from several threads (e.g. by the API server).  Any number of readers can hold the
+    lock together while a writer holds it alone.  A waiting writer stops new readers from
+    taking the lock, so a steady stream of readers cannot keep a writer waiting forever.
+
+    It also contains the lock file held by the process using a data file.  Only one process
+    may use a data file at a time (the application, the API server, the odometer ingestion
+    service and the command line all append to and compact the same journal), a second
+    process is refused.  The operating system releases the lock if the process stops.  The
+    threads of one process share the data instead (e.g. the application serving the API
+    with --api-port shares its data and a ReadWriteLock with the server's threads).
+
+CLASS
+    ReadWriteLock         -- lock shared by readers and held alone by a writer
+    DataFileLock          -- lock file held by the process using a data file
+
+FUNCTION
+                            -- ReadWriteLock methods
+    __init__              -- creates the lock with no readers or writer
+    acquire_read          -- waits until no writer holds or waits for the lock and adds a reader
+    release_read          -- removes a reader
+    acquire_write         -- waits until no reader or writer holds the lock and takes it
+    release_write         -- releases the lock taken by the writer
+    read_locked           -- context manager holding the lock for reading
+    write_locked          -- context manager holding the lock for writing
+                            -- DataFileLock methods
+    __init__              -- stores the data file and lock file names
+    acquire               -- takes the lock, raises OSError if another process holds it
+    release               -- releases the lock
+    __enter__, __exit__   -- hold the lock in a with statement
+
+DATA
+    self.condition        -- condition the readers and writers wait on
+    self.readers          -- number of readers holding the lock
+    self.writer           -- True while a writer holds the lock
+    self.writers_waiting  -- number of writers waiting for the lock
+    self.data_file_name   -- data file the lock is for
+    self.file_name        -- lock file next to the data file (the data file name with .lock)
+    self.file             -- open lock file while the lock is held
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+#
+# Lock shared by readers and held alone by a writer, waiting writers go before new readers
+#
+class ReadWriteLock:
+
+    # creates the lock with no readers or writer
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = False
+        self.writers_waiting = 0
+
+    # waits until no writer holds or is waiting for the lock and adds a reader
+    def acquire_read(self):
+        with self.condition:
+            while self.writer or self.writers_waiting:
+                self.condition.wait()
+            self.readers += 1
+
+    # removes a reader, waking the writers when it was the last one
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    # waits until no reader or writer holds the lock and takes it
+    def acquire_write(self):
+        with self.condition:
+            self.writers_waiting += 1
+            try:
+                while self.writer or self.readers:
+                    self.condition.wait()
+            finally:
+                self.writers_waiting -= 1
+            self.writer = True
+
+    # releases the lock taken by the writer, waking the readers and writers waiting
+    def release_write(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+    # holds the lock for reading in a with statement
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    # holds the lock for writing in a with statement
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+#
+# Lock file next to a data file, held by the process using the data file so no other process
+# uses it at the same time (the .dat, .journal and .db files of a data file share the lock)
+#
+class DataFileLock:
+
+    # stores the data file and lock file names, the lock is taken by acquire
+    def __init__(self, data_file_name):
+        self.data_file_name = data_file_name
+        self.file_name = os.path.splitext(os.path.abspath(data_file_name))[0] + '.lock'
+        self.file = None
+
+    # takes the lock without waiting, raises OSError if another process holds it
+    def acquire(self):
+        file = open(self.file_name, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            file.close()
+            raise OSError("data file " + self.data_file_name + " is in use by another process")
+        self.file = file
+
+    # releases the lock (the lock file is left for the next process)
+    def release(self):
+        if self.file is not None:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.file.close()
+            self.file = None
+
+    # holds the lock in a with statement
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
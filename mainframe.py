@@ -13,11 +13,16 @@ FUNCTION
     __init__              -- stores master, and tk in the MainFrame window
                              object, and initializes the widgets in the window
                              allowing the user to perform car maintenance
+    refresh               -- shows the current car list with the selection mode reset, when the view is shown again
     do_backup             -- backup the maintenance data
     do_restore            -- restore the maintenance data
     set_option_background -- set the background color to highlight user selecting DELETE option
-    build_car_list        -- stores the car name for the selected car in the scroll list visible to the
-                             user to allow for car selection
+    build_car_list        -- stores the car names for the scroll list visible to the user to allow for
+                             car selection (only the visible rows are shown)
+    get_car_text          -- returns the text shown for a car in the scroll list
+    get_car_color         -- returns the background color of a car in the scroll list
+    show_car_status       -- stores the status found for a batch of cars and recolors the visible rows
+    hide                  -- stops finding the status of the cars when another view is shown
     display_items         -- clears the MainFrame view and activates the ItemsFrame view
     display_add_car       -- clears the MainFrame view and activates the AddCarFrame view
     display_info          -- clears the MainFrame view and activates the MaintInfoFrame view
@@ -30,13 +35,18 @@ DATA
     self.master           -- contains the calling class to allow calling its methods
     self.tk               -- contains tkinter to allow creating window elements
                              (Labels, Buttons, Entries)
+    self.car_list         -- names of the cars in the scroll list
+    self.car_status       -- status found for the cars so far, car name -> needs maintenance
+    self.status_request   -- id of the status worker request for the cars' status
     cm.car_data           -- contains the CarMaintenance data object
     cm.selections         -- contains the user selected car name and item name
 """
 
 import carmaintenance as cm
 from tkinter import *
-from PIL import ImageTk, Image
+import assets
+import statusworker
+import virtuallist as vl
 
 
 #
@@ -54,15 +64,11 @@ class MainFrame(Frame):
         self.frame.pack(fill=BOTH, expand=TRUE)
 
         # Create and insert phone background image
-        load_file = "phone-background.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-background.png")
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=0, y=0, relwidth=1, relheight=1, anchor=NW)
-        load_file = "phone-hdr.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-hdr.png")
         self.img_hdr_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_hdr_panel.image = photo
         self.img_hdr_panel.place(x=20, y=80, anchor=NW)
@@ -84,10 +90,7 @@ class MainFrame(Frame):
         self.restore_button.place(x=220, y=100, anchor=NW)
 
         # Create and insert car image
-        load_file = "car.png"
-        img = Image.open(load_file)
-        img = img.resize((30,30),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("car.png", (30, 30))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=120, y=160, anchor=CENTER)
@@ -98,15 +101,17 @@ class MainFrame(Frame):
         self.car_device_label = Label(self.frame, text="on my device", font=("Helvetica", 10), bg=self.tk.background)
         self.car_device_label.place(x=150, y=190, anchor=CENTER)
 
-        # Create list box to show all the cars stored
-        self.scrollbar = Scrollbar(self.frame, orient="vertical")
-        self.list_nodes = Listbox(self.frame, exportselection=0, yscrollcommand=self.scrollbar.set,
-                                  font=("Helvetica", 12))
+        # Create list box to show all the cars stored (only the visible rows are inserted)
+        self.car_list = []
+        self.car_status = {}
+        self.status_request = None
+        self.list_nodes = vl.VirtualListbox(self.frame, self.get_car_text, self.get_car_color,
+                                            font=("Helvetica", 12))
+        self.scrollbar = self.list_nodes.scrollbar
         self.list_nodes.place(x=10, y=220, anchor=NW)
         self.list_nodes.config(width=29)
         self.list_nodes.bind("<<ListboxSelect>>", self.on_car_select)
         self.scrollbar.place(x=270, y=140, height=200, anchor=NW)
-        self.scrollbar.config(command=self.list_nodes.yview)
 
         # Create label and drop down menu to select between displaying maintenance info or deleting cars in list box
         self.selection_mode_label = Label(self.frame, text="Selection Mode:", font=("Helvetica", 10), bg=self.tk.background)
@@ -133,23 +138,36 @@ class MainFrame(Frame):
         self.info_button.place(x=285, y=530, anchor=SE)
 
         # inserts the car names into the ListBox
+        self.refresh()
+
+    # shows the current car list in display mode (called each time the view is shown)
+    def refresh(self):
+        self.dropVar.set(self.dropOptions[0])
+        self.set_option_background(self.dropOptions[0])
         self.build_car_list()
 
-    # backup the car data
+    # backup the car data as a new snapshot (only the cars changed since the last backup are written)
     def do_backup(self):
         try:
-            cm.store_car_maintenance_data(cm.car_data, cm.backup_and_restore_file_name)
+            self.master.backups.backup(cm.car_data)
         except OSError:
-            print("Error backing up file to "+cm.backup_and_restore_file_name)
+            print("Error backing up to "+cm.backup_directory_name)
         else:
             self.master.activate_main_window()
 
-    # restore the car data from backup file
+    # restore the car data from the newest backup snapshot (only the cars changed since are
+    # restored), or from the backup file made by older versions if there are no snapshots - both
+    # change the data in place, so the storage, autosave and backups record the restored cars
     def do_restore(self):
+        import storage
         try:
-            cm.car_data = cm.retrieve_car_maintenance_data(cm.backup_and_restore_file_name)
+            with self.master.data_lock.write_locked():
+                if self.master.backups.latest_snapshot() is not None:
+                    self.master.backups.restore(car_data=cm.car_data)
+                else:
+                    cm.car_data.restore_cars(storage.retrieve(cm.backup_and_restore_file_name))
         except OSError:
-            print("Error restoring from backup file "+cm.backup_and_restore_file_name)
+            print("Error restoring from backup "+cm.backup_directory_name)
         else:
             self.master.activate_main_window()
 
@@ -164,22 +182,39 @@ class MainFrame(Frame):
             self.selection_mode_button.config(background=self.original_option_background_color)
             self.info_button.config(text="View All", background=self.original_option_background_color)
 
-    # stores the car names for the selected cars in the visible scroll list
+    # stores the car names for the scroll list, only the visible rows are shown and colored - the
+    # cars are shown straight away and colored as the status worker finds their status
     def build_car_list(self):
-        self.list_nodes.delete(0, self.list_nodes.size())
-        car_list = cm.car_data.get_car_list()
-        car_index=0
-        if car_list is not None:
-            for car in car_list:
-                car_text_entry = car.replace('_', ' ')
-                self.list_nodes.insert(END, car_text_entry)
-
-                # set the background color to yellow if the car has items needed maintenance
-                if cm.car_data.does_car_need_maintenance(car):
-                    self.list_nodes.itemconfig(car_index, {'bg': 'yellow'})
-                else:
-                    self.list_nodes.itemconfig(car_index, {'bg': 'white'})
-                car_index = car_index+1
+        self.hide()
+        self.car_list = cm.car_data.get_car_list()
+        self.car_status = {}
+        self.status_request = self.master.status_worker.request_cars(cm.car_data, self.car_list,
+                                                                     self.show_car_status)
+        self.list_nodes.set_row_count(len(self.car_list))
+
+    # stores the status found for a batch of cars and recolors the visible rows
+    def show_car_status(self, statuses):
+        self.car_status.update(statuses)
+        self.list_nodes.recolor()
+
+    # stops finding the status of the cars (called when another view is shown)
+    def hide(self):
+        if self.status_request is not None:
+            self.master.status_worker.cancel(self.status_request)
+            self.status_request = None
+
+    # returns the text shown for the car in the scroll list
+    def get_car_text(self, car_index):
+        return self.car_list[car_index].replace('_', ' ')
+
+    # returns the background color of the car in the scroll list - yellow if the car has items needing maintenance
+    def get_car_color(self, car_index):
+        need = self.car_status.get(self.car_list[car_index])
+        if need is None:
+            return statusworker.unknown_color
+        if need:
+            return 'yellow'
+        return 'white'
 
     # activates the ItemsFrame view
     def display_items(self):
@@ -201,8 +236,7 @@ class MainFrame(Frame):
 
         # verify actual car selected
         if curselection:
-            car_text_entry = self.list_nodes.get(curselection[0])
-            car = car_text_entry.replace(' ', '_')
+            car = self.car_list[curselection[0]]
             cm.selections.set_car_selected(car)
 
             # if in display mode cactivate the ItemsFrame view
@@ -212,7 +246,8 @@ class MainFrame(Frame):
             # else in delete mode - delete the car from the list, reactivate MainFrame view
             else:
                 car = cm.selections.get_car_selected()
-                cm.car_data.del_car(car)
+                with self.master.data_lock.write_locked():
+                    cm.car_data.del_car(car)
                 cm.selections.set_car_selected("")
 
                 # reset the mode back to display mode to prevent accidental deletes
@@ -16,6 +16,11 @@ FUNCTION
                                      allowing the user to update the mileage and date when
                                      maintenance was performed on an item for the
                                      selected car in the maintenance list
+    refresh                       -- shows the maintenance needed each time the view is shown
+    hide                          -- stops the report being shown when another view is shown
+    start_report                  -- starts generating a report on a worker thread
+    poll_report                   -- inserts the report text generated so far (repeats using after())
+    cancel_report                 -- stops the report being generated and shown
     show_recent_maint             -- displays the recent maintenance for all items stored for all cars
     do_cancel                     -- returns control to the Main Frame object
     show_maint_needed             -- displays any needed maintenance for all items stored for all cars
@@ -25,14 +30,25 @@ DATA
     self.master           -- contains the calling class to allow calling its methods
     self.tk               -- contains tkinter to allow creating window elements
                              (Labels, Buttons, Entries)
+    self.report_queue     -- chunks of the report being shown, put there by the worker thread
+    self.report_cancel    -- event stopping the worker thread of the report being shown
+    self.poll_id          -- after() id of the next check for report text
+    poll_interval         -- milliseconds between checks for more report text
+    chunks_per_poll       -- most report chunks inserted by one check
     cm.car_data           -- contains the CarMaintenance data object
     cm.selections         -- contains the user selected car name and item name
 """
 
+import queue
+import threading
 import carmaintenance as cm
+import reports
 from tkinter import *
 import tkinter.scrolledtext as scrolledtext
-from PIL import ImageTk, Image
+import assets
+
+poll_interval = 20     # milliseconds between checks for more report text
+chunks_per_poll = 4    # most report chunks inserted by one check
 
 
 #
@@ -51,16 +67,12 @@ class MaintInfoFrame(Frame):
         self.frame.pack(fill=BOTH, expand=TRUE)
 
         # Create and insert phone background image
-        load_file = "phone-background.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-background.png")
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=0, y=0, relwidth=1, relheight=1, anchor=NW)
 
-        load_file = "phone-hdr.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-hdr.png")
         self.img_hdr_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_hdr_panel.image = photo
         self.img_hdr_panel.place(x=20, y=80, anchor=NW)
@@ -77,10 +89,7 @@ class MaintInfoFrame(Frame):
         self.info_label.place(x=155, y=150, anchor=CENTER)
 
         # Create and insert wrench image
-        load_file = "wrench.png"
-        img = Image.open(load_file)
-        img = img.resize((30,30),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("wrench.png", (30, 30))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=35, y=150, anchor=CENTER)
@@ -89,6 +98,13 @@ class MaintInfoFrame(Frame):
         self.text_box = scrolledtext.ScrolledText(self.frame, width=37, height=20, font=("Helvetica", 10))
         self.text_box.place(x=9, y=170, anchor=NW)
 
+        # Create label showing the progress of the report being shown
+        self.progress_label = Label(self.frame, text="", font=("Helvetica", 9), bg=self.tk.background)
+        self.progress_label.place(x=150, y=497, anchor=CENTER)
+        self.report_queue = None
+        self.report_cancel = None
+        self.poll_id = None
+
         # Create show recent maintenance button to view recent maintenance performed
         self.recent_maint_button = Button(self.frame, text="Recent Maintenance Performed",
                                           command=self.show_recent_maint,
@@ -96,47 +112,63 @@ class MaintInfoFrame(Frame):
         self.recent_maint_button.config(borderwidth=2, width=24)
         self.recent_maint_button.place(x=150, y=520, anchor=CENTER)
 
+        self.refresh()
+
+    # shows the maintenance needed (called each time the view is shown)
+    def refresh(self):
         self.show_maint_needed()
 
-    # display all recent maintenance performed
-    def show_recent_maint(self):
-        msg_text = "Previous Maintenance\n\n"
-        for car in cm.car_data.get_car_list():
-            msg_text += car + '\n'
-            item_list = cm.car_data.get_items_list(car)
-            if item_list == []:
-                msg_text += ' '*5+"No items listed\n"
-            else:
-                for item in item_list:
-                    last_miles = cm.car_data.get_item_last_mileage(car, item)
-                    last_date = cm.car_data.get_item_last_date(car, item)
-                    msg_text += ' '*5 + item + '\n'
-                    msg_text += ' '*10 + 'Mileage: ' + str(last_miles) + '\n'
-                    msg_text += ' '*10 + 'Date: ' + str(last_date) + '\n'
-            msg_text += '\n'
+    # stops the report being shown (called when another view is shown)
+    def hide(self):
+        self.cancel_report()
 
+    # clears the text box and starts generating the report on a worker thread, its text is
+    # inserted in chunks as it arrives (see poll_report)
+    def start_report(self, report):
+        self.cancel_report()
         self.text_box.delete('1.0', END)
-        self.text_box.insert(INSERT, msg_text)
+        self.report_queue = queue.Queue(maxsize=8)
+        self.report_cancel = threading.Event()
+        threading.Thread(target=reports.write_chunks, args=(report(cm.car_data), self.report_queue, self.report_cancel),
+                         name='report', daemon=True).start()
+        self.progress_label.config(text="Loading...")
+        self.poll_id = self.tk.after(0, self.poll_report)
+
+    # inserts the report text generated so far and checks again until the report is complete
+    def poll_report(self):
+        self.poll_id = None
+        for chunk_number in range(chunks_per_poll):
+            try:
+                chunk = self.report_queue.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is None:
+                self.progress_label.config(text="")
+                return
+            text, done = chunk
+            self.text_box.insert(END, text)
+            self.progress_label.config(text="Loading... %d%%" % (done * 100))
+        self.poll_id = self.tk.after(poll_interval, self.poll_report)
+
+    # stops the worker thread and the checks for more text of the report being shown
+    def cancel_report(self):
+        if self.report_cancel is not None:
+            self.report_cancel.set()
+            self.report_cancel = None
+        if self.poll_id is not None:
+            self.tk.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.progress_label.config(text="")
+
+    # display all recent maintenance performed
+    def show_recent_maint(self):
+        self.start_report(reports.recent_maint_report)
 
     # activates the MainFrame view
     def do_cancel(self):
+        self.cancel_report()
         self.master.activate_main_window()
 
     # display maintenance needed for each car in Car Maintenance list
     def show_maint_needed(self):
-        cars_need_maint = False
-        self.text_box.delete('1.0', END)
-
-        # display all maintenance needed for all cars
-        msg_text = "Maintenance needed for:\n\n"
-        for car in cm.car_data.get_car_list():
-            if cm.car_data.does_car_need_maintenance(car):
-                cars_need_maint = True
-                msg_text += car +"\n"
-                for item in cm.car_data.get_items_list(car):
-                    if cm.car_data.does_item_need_maintenance(car, item):
-                        msg_text += " "*5+item+"\n"
-                msg_text += "\n"
-        if not cars_need_maint:
-            msg_text = "No cars need maintenance at this time!"
-        self.text_box.insert(INSERT, msg_text)
+        self.start_report(reports.maint_needed_report)
@@ -0,0 +1,474 @@
+"""
+Name
+    odometeringest
+
+DESCRIPTION
+    This module contains the asyncio service taking in the odometer readings the vehicles
+    report, from a local socket, a named pipe (FIFO) or a file being appended to
+
+        python odometeringest.py [--file FILE] [--tcp HOST:PORT] [--unix PATH] [--fifo PATH]
+                                 [--tail PATH [--from-start]] [--window SECONDS] [--metrics SECONDS]
+
+    Each reading is a line "car,mileage" (or "car mileage", or a JSON object {"car", "mileage"}).
+    The readings are put on a bounded queue and coalesced per car to the highest mileage read,
+    and once every window the latest reading of each car is applied with set_mileage in one
+    batch (committed to the storage together), so a car sending ten readings a minute is
+    updated once per window.  Readings that are not higher than the car's mileage (late or
+    repeated readings) are dropped.  The items that became due are passed to the on_due
+    function, printed as "car<TAB>item<TAB>now due" from the command line.  From the command
+    line the data file is locked while the service runs (see locking.DataFileLock), it does not
+    start while another process is using the data file.
+
+    The batches are applied on a worker thread while the readings keep being coalesced, the
+    car maintenance data is only used from that thread (use a ConcurrentCarMaintenance when
+    other threads use the data too - from the command line the data is a
+    ConcurrentCarMaintenance, as the autosave thread takes a consistent copy of it with
+    get_snapshot while the batches change it, and writes the data file from the copy).
+
+    Backpressure: once max_pending cars are waiting for the next batch the readings are no
+    longer taken off the queue, and once the queue is full the sources stop reading, so a
+    socket sender is held back by TCP flow control and a pipe writer blocks.  get_metrics
+    returns the counters and queue depths.
+
+CLASS
+    OdometerIngest        -- coalesces the odometer readings from the sources and applies them in
+                             batches
+
+FUNCTION
+                            -- OdometerIngest methods
+    __init__              -- creates the service for the car maintenance data
+    put_line              -- parses a line read from a source and queues the reading
+    put                   -- queues a reading, waiting while the queue is full
+    coalesce              -- task taking the readings off the queue and keeping the highest per car
+    add_reading           -- keeps the reading if it is the highest of the car waiting for the batch
+    flush_loop            -- task applying the readings waiting once every window
+    flush                 -- applies the readings waiting for the batch
+    apply_batch           -- applies a batch of readings to the data (on the worker thread)
+    read_stream           -- reads the lines of a stream until it ends
+    handle_connection     -- reads the readings sent on a socket connection
+    read_fifo             -- reads the readings written to a named pipe
+    tail_file             -- reads the readings appended to a file
+    start                 -- starts the coalescing, the batches and the sources
+    close                 -- stops the sources and applies the readings still waiting
+    serve                 -- runs the service until stopped
+    stop                  -- stops serve() from any thread
+    get_metrics           -- returns the counters and queue depths
+                            -- Additional Functions
+    parse_reading         -- returns (car, mileage, error) for a line
+    start_service         -- runs a service on a background thread
+    main                  -- runs the service from the command line
+
+DATA
+    window                -- default number of seconds the readings are coalesced for before a batch
+    queue_size            -- default number of readings the queue holds before the sources wait
+    max_pending           -- default number of cars waiting for a batch before the queue is no
+                             longer read
+    line_limit            -- longest line read from a socket or pipe
+    poll_interval         -- seconds between the checks of a tailed file for new lines
+    self.pending          -- car name -> highest mileage read, waiting for the next batch
+    self.counts           -- counters returned by get_metrics (changed only on the event loop
+                             thread)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import carmaintenance as cm
+import locking
+import validation as v
+
+window = 1.0
+queue_size = 10000
+max_pending = 100000
+line_limit = 4096
+poll_interval = 0.25
+
+
+#
+# Returns (car, mileage, None) for a reading line "car,mileage", "car mileage" or a JSON object
+# {"car", "mileage"}, or (None, None, error message) when the line is not a valid reading
+#
+def parse_reading(line):
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            row = json.loads(line)
+        except ValueError:
+            return None, None, "Reading is not valid JSON"
+        if not isinstance(row, dict):
+            return None, None, "Reading is not a JSON object"
+        car, mileage = row.get('car'), row.get('mileage')
+    else:
+        car, separator, mileage = line.rpartition(',' if ',' in line else ' ')
+
+    car = str(car or "").strip().replace(' ', '_')
+    mileage, error = v.parse_number(str("" if mileage is None else mileage).strip())
+    if car == "":
+        return None, None, "Enter a car name!"
+    if mileage is None:
+        return None, None, "Enter mileage as a number!"
+    return car, mileage, None
+
+
+#
+# Coalesces the odometer readings from the sources per car and applies them in batches
+#
+class OdometerIngest:
+
+    # creates the service for the car maintenance data, on_due(car, mileage, items) is called for
+    # the items that became due and on_error(line, error) for the rejected readings
+    def __init__(self, car_data, on_due=None, on_error=None, window=window, queue_size=queue_size,
+                 max_pending=max_pending):
+        self.car_data = car_data
+        self.on_due = on_due
+        self.on_error = on_error
+        self.window = window
+        self.queue_size = queue_size
+        self.max_pending = max_pending
+        self.pending = {}
+        self.servers = []
+        self.sources = []
+        self.tasks = []
+        self.closing = False
+        self.loop = None
+        self.stop_event = None
+        self.counts = {'received': 0, 'rejected': 0, 'coalesced': 0, 'stale': 0, 'unknown': 0,
+                       'applied': 0, 'batches': 0, 'due_events': 0, 'connections': 0,
+                       'queue_waits': 0, 'queue_wait_seconds': 0.0, 'pending_waits': 0,
+                       'max_queue_depth': 0, 'max_pending': 0, 'last_batch_cars': 0,
+                       'last_batch_ms': 0.0, 'max_batch_ms': 0.0}
+
+    # parses a line read from a source and queues the reading (rejected lines go to on_error)
+    async def put_line(self, line):
+        self.counts['received'] += 1
+        car, mileage, error = parse_reading(line)
+        if error is not None:
+            self.counts['rejected'] += 1
+            if self.on_error is not None:
+                self.on_error(line.strip(), error)
+            return
+        await self.put(car, mileage)
+
+    # queues a reading, waiting while the queue is full (the backpressure on the sources)
+    async def put(self, car, mileage):
+        if self.queue.full():
+            self.counts['queue_waits'] += 1
+            start = time.perf_counter()
+            await self.queue.put((car, mileage))
+            self.counts['queue_wait_seconds'] += time.perf_counter() - start
+        else:
+            self.queue.put_nowait((car, mileage))
+        self.counts['max_queue_depth'] = max(self.counts['max_queue_depth'], self.queue.qsize())
+
+    # task taking the readings off the queue, waiting while max_pending cars wait for the batch
+    async def coalesce(self):
+        while True:
+            if len(self.pending) >= self.max_pending:
+                self.counts['pending_waits'] += 1
+                self.flush_now.set()
+                async with self.batch_taken:
+                    await self.batch_taken.wait_for(lambda: len(self.pending) < self.max_pending)
+            car, mileage = await self.queue.get()
+            self.add_reading(car, mileage)
+
+    # keeps the reading if it is the highest of the car waiting for the batch
+    def add_reading(self, car, mileage):
+        pending_mileage = self.pending.get(car)
+        if pending_mileage is None:
+            self.pending[car] = mileage
+            self.counts['max_pending'] = max(self.counts['max_pending'], len(self.pending))
+        else:
+            self.counts['coalesced'] += 1
+            if mileage > pending_mileage:
+                self.pending[car] = mileage
+
+    # task applying the readings waiting once every window (or straight away when max_pending
+    # cars are waiting), until the service is closed
+    async def flush_loop(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.flush_now.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_now.clear()
+            await self.flush()
+
+    # applies the readings waiting for the batch on the worker thread, then adds the batch's counts
+    # (only this thread changes the counters) and passes the items that became due to on_due
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        async with self.batch_taken:
+            self.batch_taken.notify_all()
+        start = time.perf_counter()
+        due_events, batch_counts = await asyncio.to_thread(self.apply_batch, batch)
+        batch_ms = (time.perf_counter() - start) * 1e3
+        for name, count in batch_counts.items():
+            self.counts[name] += count
+        self.counts['batches'] += 1
+        self.counts['last_batch_cars'] = len(batch)
+        self.counts['last_batch_ms'] = batch_ms
+        self.counts['max_batch_ms'] = max(self.counts['max_batch_ms'], batch_ms)
+        self.counts['due_events'] += len(due_events)
+        if self.on_due is not None:
+            for car, mileage, items in due_events:
+                self.on_due(car, mileage, items)
+
+    # applies the batch of car name -> mileage readings in one storage batch (on the worker
+    # thread), returns ([(car, mileage, items that became due)], {'unknown', 'stale', 'applied':
+    # number of readings})
+    def apply_batch(self, batch):
+        car_data = self.car_data
+        due_events = []
+        counts = {'unknown': 0, 'stale': 0, 'applied': 0}
+        car_data.begin_batch()
+        try:
+            for car, mileage in batch.items():
+                if car not in car_data.cars:
+                    counts['unknown'] += 1
+                elif mileage <= (car_data.get_mileage(car) or 0):
+                    counts['stale'] += 1
+                else:
+                    newly_due = car_data.set_mileage(car, mileage)
+                    counts['applied'] += 1
+                    if newly_due:
+                        due_events.append((car, mileage, newly_due))
+        finally:
+            car_data.end_batch()
+        return due_events, counts
+
+    # reads the lines of the stream until it ends, a line that is too long is rejected
+    async def read_stream(self, reader):
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                self.counts['received'] += 1
+                self.counts['rejected'] += 1
+                if self.on_error is not None:
+                    self.on_error("", "Reading is longer than %d bytes" % line_limit)
+                continue
+            if not line:
+                return
+            await self.put_line(line.decode('utf-8', 'replace'))
+
+    # reads the readings sent on a socket connection until the sender closes it
+    async def handle_connection(self, reader, writer):
+        self.counts['connections'] += 1
+        try:
+            await self.read_stream(reader)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # reads the readings written to the named pipe (created if it does not exist) - it is opened
+    # for reading and writing so it stays open while no writer has it open
+    async def read_fifo(self, path):
+        if not os.path.exists(path):
+            os.mkfifo(path)
+        pipe = os.fdopen(os.open(path, os.O_RDWR | os.O_NONBLOCK), 'rb', buffering=0)
+        reader = asyncio.StreamReader(limit=line_limit)
+        transport, protocol = await asyncio.get_running_loop().connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        try:
+            await self.read_stream(reader)
+        finally:
+            transport.close()
+
+    # reads the readings appended to the file (from its end unless from_start), the file is read
+    # again from the start when it is replaced or truncated (e.g. rotated)
+    async def tail_file(self, path, from_start=False):
+        file = None
+        partial = b""
+        try:
+            while True:
+                if file is None:
+                    try:
+                        file = open(path, 'rb')
+                    except FileNotFoundError:
+                        await asyncio.sleep(poll_interval)
+                        continue
+                    if not from_start:
+                        file.seek(0, os.SEEK_END)
+                    from_start = True
+                line = file.readline(line_limit)
+                if line.endswith(b'\n') or len(partial) + len(line) >= line_limit:
+                    await self.put_line((partial + line).decode('utf-8', 'replace'))
+                    partial = b""
+                    continue
+                partial += line
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:
+                    status = None
+                if status is None or status.st_ino != os.fstat(file.fileno()).st_ino or \
+                        status.st_size < file.tell():
+                    file.close()
+                    file = None
+                    partial = b""
+                else:
+                    await asyncio.sleep(poll_interval)
+        finally:
+            if file is not None:
+                file.close()
+
+    # starts the coalescing, the batches and the sources - tcp is (host, port) (port 0 picks a free
+    # port, see self.servers), unix, fifo and tail are paths
+    async def start(self, tcp=None, unix=None, fifo=None, tail=None, from_start=False):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.queue_size)
+        self.flush_now = asyncio.Event()
+        self.batch_taken = asyncio.Condition()
+        self.tasks = [asyncio.create_task(self.coalesce()), asyncio.create_task(self.flush_loop())]
+        if tcp is not None:
+            server = await asyncio.start_server(self.handle_connection, tcp[0], tcp[1],
+                                                limit=line_limit)
+            self.servers.append(server)
+        if unix is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, unix, limit=line_limit)
+            self.servers.append(server)
+        if fifo is not None:
+            self.sources.append(asyncio.create_task(self.read_fifo(fifo)))
+        if tail is not None:
+            self.sources.append(asyncio.create_task(self.tail_file(tail, from_start)))
+
+    # stops the sources, then applies the readings still queued or waiting for the batch
+    async def close(self):
+        for server in self.servers:
+            server.close()
+        for source in self.sources:
+            source.cancel()
+        await asyncio.gather(*self.sources, return_exceptions=True)
+        self.closing = True
+        self.flush_now.set()
+        await self.tasks[1]
+        self.tasks[0].cancel()
+        await asyncio.gather(self.tasks[0], return_exceptions=True)
+        while not self.queue.empty():
+            self.add_reading(*self.queue.get_nowait())
+        await self.flush()
+
+    # runs the service with the sources until stop() is called, then closes it, started (a
+    # threading.Event) is set once the sources are started
+    async def serve(self, started=None, metrics_interval=None, **sources):
+        self.stop_event = asyncio.Event()
+        await self.start(**sources)
+        if started is not None:
+            started.set()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), metrics_interval)
+                except asyncio.TimeoutError:
+                    print(json.dumps(self.get_metrics()), file=sys.stderr)
+        finally:
+            await self.close()
+
+    # stops serve(), may be called from any thread
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.stop_event.set)
+
+    # returns the counters (readings received, rejected, coalesced into a later reading, stale,
+    # for unknown cars and applied, batches, queue waits) and the current queue depths
+    def get_metrics(self):
+        metrics = dict(self.counts)
+        metrics['queue_depth'] = self.queue.qsize() if self.loop is not None else 0
+        metrics['pending'] = len(self.pending)
+        return metrics
+
+
+#
+# Runs the service for the car maintenance data on a background thread with the sources (see
+# OdometerIngest.start) and returns it once the sources are started, stop it with stop() and
+# wait for the thread (service.thread) to finish
+#
+def start_service(car_data, on_due=None, on_error=None, window=window, **sources):
+    service = OdometerIngest(car_data, on_due, on_error, window)
+    started = threading.Event()
+    service.thread = threading.Thread(target=asyncio.run, args=(service.serve(started, **sources),),
+                                      name='odometer-ingest', daemon=True)
+    service.thread.start()
+    started.wait()
+    return service
+
+
+#
+# Runs the service for the data file until interrupted, then stores the data, returns 1 if
+# another process is using the data file
+#
+def main(args):
+    import signal
+    import autosave
+    import concurrentfleet
+    import storage
+    parser = argparse.ArgumentParser(prog='odometeringest',
+                                     description="Odometer reading ingestion service")
+    parser.add_argument('--file', default=cm.storage_file_name,
+                        help="data file (default " + cm.storage_file_name + ")")
+    parser.add_argument('--tcp', help="HOST:PORT to accept readings on")
+    parser.add_argument('--unix', help="unix socket path to accept readings on")
+    parser.add_argument('--fifo', help="named pipe to read readings from (created if needed)")
+    parser.add_argument('--tail', help="file to read readings appended to")
+    parser.add_argument('--from-start', action='store_true',
+                        help="read the tailed file from its start")
+    parser.add_argument('--window', type=float, default=window,
+                        help="seconds readings are coalesced for (default %g)" % window)
+    parser.add_argument('--metrics', type=float, help="print the metrics on stderr every SECONDS")
+    args = parser.parse_args(args)
+
+    sources = {'unix': args.unix, 'fifo': args.fifo, 'tail': args.tail,
+               'from_start': args.from_start}
+    if args.tcp is not None:
+        host, separator, port = args.tcp.rpartition(':')
+        sources['tcp'] = (host or '127.0.0.1', int(port))
+    if not any((args.tcp, args.unix, args.fifo, args.tail)):
+        parser.error("give at least one of --tcp, --unix, --fifo or --tail")
+
+    data_file_lock = locking.DataFileLock(args.file)
+    try:
+        data_file_lock.acquire()
+    except OSError as error:
+        print("odometeringest: " + str(error), file=sys.stderr)
+        return 1
+    car_data = cm.retrieve_car_maintenance_data(args.file)
+    car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(car_data)
+    autosaver = autosave.start_autosave(car_data, args.file)
+
+    def print_due(car, mileage, items):
+        for item in items:
+            print(car + "\t" + item + "\tnow due", flush=True)
+
+    def print_error(line, error):
+        print("odometeringest: %s: %s" % (error, line), file=sys.stderr)
+
+    service = OdometerIngest(car_data, print_due, print_error, args.window)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, service.stop)
+        await service.serve(metrics_interval=args.metrics, **sources)
+
+    try:
+        asyncio.run(run())
+    finally:
+        if autosaver is not None:
+            autosaver.close()
+        else:
+            cm.store_car_maintenance_data(car_data, args.file)
+        storage.close_attached(car_data)
+        data_file_lock.release()
+        if args.unix is not None and os.path.exists(args.unix):
+            os.remove(args.unix)
+    print(json.dumps(service.get_metrics()), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,193 @@
+"""
+Name
+    odometerload
+
+DESCRIPTION
+    This module contains the synthetic load generator for the odometer ingestion service (see
+    odometeringest).  Each sender is a thread writing "car,mileage" readings for its share of
+    the cars to a socket, a named pipe or a file, at the given rate, a car's mileage going up
+    with each of its readings and about one reading in fifty repeating an earlier mileage (a
+    late reading).  The readings are written a chunk of lines at a time, each chunk smaller
+    than an atomic pipe write, so the senders' lines are never mixed.
+
+        python odometerload.py [--tcp HOST:PORT | --unix PATH | --fifo PATH | --append PATH]
+                               [--cars N] [--readings N] [--senders N] [--rate N]
+
+    Without a target a service is started in this process for a generated fleet (the service
+    then competes with the senders for the interpreter).  Once it has taken in every reading
+    it is stopped and the mileage of every car is checked to be the highest reading sent.
+
+CLASS
+    None
+
+FUNCTION
+    generate_readings     -- returns a sender's reading lines and the highest mileage of each car
+    open_target           -- returns the function writing to a target and the function closing it
+    run_sender            -- writes a sender's readings at its rate
+    run_load              -- runs the senders, returns the readings sent, elapsed seconds and highest mileages
+    run_local_load        -- runs the senders against a service in this process and returns its metrics
+    main                  -- runs the load generator from the command line
+
+DATA
+    chunk_lines           -- number of reading lines written at a time
+"""
+
+import argparse
+import json
+import random
+import socket
+import sys
+import threading
+import time
+
+chunk_lines = 100
+
+
+#
+# Returns the reading lines (bytes) of the sender for its cars and the highest mileage sent for
+# each car, {car: mileage}
+#
+def generate_readings(car_names, reading_count, seed):
+    choose = random.Random(seed)
+    mileages = {car: 10000 + choose.randrange(100000) for car in car_names}
+    lines = []
+    for reading in range(reading_count):
+        car = choose.choice(car_names)
+        mileage = mileages[car]
+        if choose.random() < 0.02:
+            mileage -= choose.randrange(1, 50)
+        else:
+            mileages[car] += choose.randrange(1, 50)
+            mileage = mileages[car]
+        lines.append(("%s,%d\n" % (car, mileage)).encode('utf-8'))
+    return lines, mileages
+
+
+#
+# Returns (write function, close function) for the target, kind is 'tcp' (target is (host, port)),
+# 'unix', 'fifo' or 'append' (target is a path)
+#
+def open_target(kind, target):
+    if kind in ('tcp', 'unix'):
+        if kind == 'tcp':
+            connection = socket.create_connection(target)
+        else:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.connect(target)
+        return connection.sendall, connection.close
+    output = open(target, 'ab' if kind == 'append' else 'wb', buffering=0)
+    return output.write, output.close
+
+
+#
+# Writes the sender's lines to the target a chunk at a time, sleeping to keep to the rate (lines
+# per second, None for as fast as the target takes them)
+#
+def run_sender(kind, target, lines, rate, errors):
+    try:
+        write, close = open_target(kind, target)
+    except OSError as error:
+        errors.append(str(error))
+        return
+    start = time.perf_counter()
+    try:
+        for first in range(0, len(lines), chunk_lines):
+            write(b"".join(lines[first:first + chunk_lines]))
+            if rate:
+                delay = start + (first + chunk_lines) / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    except OSError as error:
+        errors.append(str(error))
+    finally:
+        close()
+
+
+#
+# Runs the senders, each with its share of the cars and readings and of the rate, returns
+# (readings sent, elapsed seconds, highest mileage of each car, errors)
+#
+def run_load(kind, target, car_names, readings=100000, senders=4, rate=None):
+    highest = {}
+    threads = []
+    errors = []
+    sent = 0
+    for sender in range(senders):
+        lines, mileages = generate_readings(car_names[sender::senders], readings // senders, sender)
+        highest.update(mileages)
+        sent += len(lines)
+        threads.append(threading.Thread(target=run_sender, args=(kind, target, lines,
+                                                                  rate / senders if rate else None, errors)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sent, time.perf_counter() - start, highest, errors
+
+
+#
+# Runs the senders against a service started in this process (on a TCP socket) for a generated
+# fleet, stops the service once it has taken in every reading, returns (service metrics, seconds
+# until every reading was applied, readings sent, cars whose mileage is not their highest reading)
+#
+def run_local_load(cars=1000, readings=100000, senders=4, rate=None, window=0.1):
+    import benchmarks
+    import odometeringest
+
+    car_data = benchmarks.make_fleet(cars, 5)
+    service = odometeringest.start_service(car_data, window=window, tcp=('127.0.0.1', 0))
+    address = service.servers[0].sockets[0].getsockname()[:2]
+    car_names = car_data.get_car_list()
+    start = time.perf_counter()
+    sent, elapsed, highest, errors = run_load('tcp', address, car_names, readings, senders, rate)
+    while service.get_metrics()['received'] < sent and not errors:
+        time.sleep(0.01)
+    service.stop()
+    service.thread.join()
+    elapsed = time.perf_counter() - start
+    wrong = [car for car in car_names if car in highest and car_data.get_mileage(car) < highest[car]]
+    return service.get_metrics(), elapsed, sent, wrong + errors
+
+
+#
+# Runs the load generator from the command line
+#
+def main(args):
+    parser = argparse.ArgumentParser(prog='odometerload', description="Load generator for the odometer ingestion service")
+    targets = parser.add_mutually_exclusive_group()
+    targets.add_argument('--tcp', help="HOST:PORT of the service")
+    targets.add_argument('--unix', help="unix socket path of the service")
+    targets.add_argument('--fifo', help="named pipe read by the service")
+    targets.add_argument('--append', help="file tailed by the service")
+    parser.add_argument('--cars', type=int, default=1000, help="number of cars car0, car1, ... (default 1000)")
+    parser.add_argument('--readings', type=int, default=100000, help="total number of readings (default 100000)")
+    parser.add_argument('--senders', type=int, default=4, help="number of sender threads (default 4)")
+    parser.add_argument('--rate', type=float, help="total readings per second (default as fast as possible)")
+    args = parser.parse_args(args)
+
+    if not any((args.tcp, args.unix, args.fifo, args.append)):
+        metrics, elapsed, sent, wrong = run_local_load(args.cars, args.readings, args.senders, args.rate)
+        print("odometer load: %d readings for %d cars applied in %.2f s, %.0f readings/s" % (
+            sent, args.cars, elapsed, sent / elapsed))
+        print(json.dumps(metrics))
+        for car in wrong[:5]:
+            print("    mileage is not the highest reading: " + car)
+        return 1 if wrong else 0
+
+    if args.tcp is not None:
+        host, separator, port = args.tcp.rpartition(':')
+        kind, target = 'tcp', (host or '127.0.0.1', int(port))
+    else:
+        kind, target = [(kind, path) for kind, path in (('unix', args.unix), ('fifo', args.fifo),
+                                                         ('append', args.append)) if path][0]
+    car_names = ["car%d" % car for car in range(args.cars)]
+    sent, elapsed, highest, errors = run_load(kind, target, car_names, args.readings, args.senders, args.rate)
+    print("odometer load: %d readings sent in %.2f s, %.0f readings/s" % (sent, elapsed, sent / elapsed))
+    for error in errors[:5]:
+        print("    " + error)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
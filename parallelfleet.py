@@ -0,0 +1,328 @@
+"""
+Name
+    parallelfleet
+
+DESCRIPTION
+    This module contains the multi-process evaluation of the maintenance needed status for
+    very large fleets (millions of items), where working out every item on one core takes
+    too long.  The cars are split into shards of consecutive cars, several per worker so the
+    workers finish together, and a ProcessPoolExecutor evaluates the shards with the same
+    rules as CarMaintenance.does_item_need_maintenance.  Each worker returns only the items
+    due, the car positions and the item names joined in one string (quicker to send back than
+    a list for every car), and the shards are merged back in car list order.
+
+    Little more than the shard bounds is sent with each shard:
+
+        fork          -- where processes can be started by fork (Linux) and no other thread
+                         is running, the workers inherit the cars from this process (shared
+                         copy-on-write) and read their shard straight from the car and item
+                         objects
+        shared_memory -- otherwise the cars are packed into integer columns in a shared
+                         memory block that every worker maps (see init_packed_fleet), so the
+                         object graph is never pickled.  The block is packed a shard at a
+                         time and each shard is sent (with the names of its items) as soon as
+                         it is packed, so the workers evaluate the first shards while the
+                         rest are packed.  The workers are started by a fork server where
+                         there is one, as forking a process with other threads running can
+                         leave a lock held in the worker by a thread that is not there
+
+    With fork the whole evaluation runs in the workers; with shared_memory the packing in
+    this process is overlapped with the evaluation but still limits the speed up.  Either
+    way the speed up is bounded by the CPUs available to the process (worker_count).  With
+    one worker, or fleets smaller than min_parallel_cars, the items are evaluated in this
+    process, and SQLite data whose cars are not all read yet is answered by the storage with
+    one query.
+
+        items_due = parallelfleet.get_items_due(car_data, workers=4)
+
+CLASS
+    None
+
+FUNCTION
+    get_shard_bounds      -- returns the (start, stop) car positions of each shard
+    get_car_items_due     -- returns the names of the car's items needing maintenance
+    evaluate_local_cars   -- returns the due items of the cars, evaluated in this process
+    evaluate_shared_cars  -- worker: returns the due items of a shard of the inherited cars
+    pack_results          -- returns a worker's due items packed to be sent back quickly
+    unpack_results        -- returns the (car position, [item names]) of a worker's packed due items
+    create_fleet_block    -- creates the shared memory block for a packed fleet
+    pack_shard            -- packs a shard of the cars into the integer columns of the block
+    read_columns          -- returns the columns of a packed fleet in a shared memory buffer
+    init_packed_fleet     -- worker initializer: maps the packed fleet's shared memory block
+    evaluate_packed_cars  -- worker: returns the due items of a shard of the packed fleet
+    get_items_due         -- returns car name -> items needing maintenance using worker processes
+
+DATA
+    worker_count          -- default number of worker processes (one per CPU available to the
+                             process)
+    shards_per_worker     -- number of shards given to each worker
+    min_parallel_cars     -- fleets with fewer cars are evaluated in this process
+    column_count          -- number of item columns in a packed fleet
+    item_separator        -- separator of the item names in a worker's packed due items
+    car_separator         -- separator of the cars in a worker's packed due items
+    shared_cars           -- cars of the fleet being evaluated, inherited by forked workers
+    packed_fleet          -- worker: (block, car count, item count) of the packed fleet
+"""
+
+import gc
+import multiprocessing
+import os
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from multiprocessing import shared_memory
+import carmaintenance as cm
+
+try:
+    worker_count = len(os.sched_getaffinity(0))
+except AttributeError:
+    worker_count = os.cpu_count() or 1
+shards_per_worker = 4
+min_parallel_cars = 2000
+column_count = 5
+item_separator = '\x1f'
+car_separator = '\x1e'
+shared_cars = None
+packed_fleet = None
+
+
+#
+# Returns the (start, stop) car positions of the shards splitting car_count cars into about
+# shard_count shards of consecutive cars
+#
+def get_shard_bounds(car_count, shard_count):
+    shard_count = max(1, min(shard_count, car_count))
+    return [(car_count * shard // shard_count, car_count * (shard + 1) // shard_count)
+            for shard in range(shard_count)]
+
+
+#
+# Returns the names of the car's items needing maintenance (same rules as compute_item_need)
+#
+def get_car_items_due(car, today):
+    mileage = car.mileage or 0
+    items_due = []
+    for item_name, item in car.items.items():
+        if item.freq_miles and mileage > (item.last_mileage or 0) + item.freq_miles:
+            items_due.append(item_name)
+        elif item.last_date is not None and item.freq_time is not None and \
+                cm.add_months_to_date(item.last_date, item.freq_time) <= today:
+            items_due.append(item_name)
+    return items_due
+
+
+#
+# Returns [(car position, [item names])] for the cars needing maintenance among the cars
+#
+def evaluate_local_cars(cars, today, start=0, stop=None):
+    results = []
+    for position in range(start, len(cars) if stop is None else stop):
+        items_due = get_car_items_due(cars[position], today)
+        if items_due:
+            results.append((position, items_due))
+    return results
+
+
+#
+# Worker: returns [(car position, [item names])] for the cars needing maintenance in the shard
+# of the cars inherited from the process that forked the worker
+#
+def evaluate_shared_cars(start, stop, today):
+    return pack_results(evaluate_local_cars(shared_cars, today, start, stop))
+
+
+#
+# Returns a worker's results in a form that is quick to pickle - the car positions and the item
+# names all joined in one string (or the lists of item names when a name holds a separator)
+#
+def pack_results(results):
+    positions = [position for position, items_due in results]
+    text = car_separator.join(item_separator.join(items_due) for position, items_due in results)
+    item_count = sum(len(items_due) for position, items_due in results)
+    if text.count(item_separator) != item_count - len(results) or \
+            text.count(car_separator) != max(0, len(results) - 1):
+        return positions, [items_due for position, items_due in results]
+    return positions, text
+
+
+#
+# Returns the (car position, [item names]) results of a worker from its packed results
+#
+def unpack_results(packed):
+    positions, items_due = packed
+    if isinstance(items_due, str):
+        items_due = [text.split(item_separator) for text in items_due.split(car_separator)] if positions else []
+    return zip(positions, items_due)
+
+
+#
+# Creates the shared memory block of 64-bit integers for a packed fleet of car_count cars with
+# item_count items.  The block holds the car mileages, the position of each car's first item (car
+# count + 1 values) and the item columns - freq miles (0 if not set), last mileage (0 if not
+# set), freq time (-1 if not set), last date ordinal (0 if not set) and the index of the item
+# name in the names of its shard's items.  The caller closes and unlinks the block.
+#
+def create_fleet_block(car_count, item_count):
+    size = 8 * (2 * car_count + 1 + column_count * item_count)
+    return shared_memory.SharedMemory(create=True, size=size)
+
+
+#
+# Packs the cars from start to stop (whose first item is at position first_item) into the
+# block of the packed fleet, returns (the position of the next shard's first item, the names of
+# the shard's items)
+#
+def pack_shard(block, car_count, item_count, cars, start, stop, first_item):
+    car_mileage = array('q')
+    car_first_item = array('q', [first_item])
+    columns = [array('q') for column in range(column_count)]
+    freq_miles, last_mileage, freq_time, last_date, name_index = columns
+    name_indexes = {}
+    for position in range(start, stop):
+        car = cars[position]
+        car_mileage.append(car.mileage or 0)
+        for item_name, item in car.items.items():
+            freq_miles.append(item.freq_miles or 0)
+            last_mileage.append(item.last_mileage or 0)
+            freq_time.append(-1 if item.freq_time is None else item.freq_time)
+            last_date.append(item.last_date.toordinal() if item.last_date is not None else 0)
+            name_index.append(name_indexes.setdefault(item_name, len(name_indexes)))
+        car_first_item.append(first_item + len(freq_miles))
+
+    values, block_mileage, block_first_item, block_columns = read_columns(block.buf, car_count,
+                                                                          item_count)
+    try:
+        block_mileage[start:stop] = car_mileage
+        block_first_item[start:stop + 1] = car_first_item
+        for block_column, column in zip(block_columns, columns):
+            block_column[first_item:first_item + len(column)] = column
+    finally:
+        for view in [values, block_mileage, block_first_item] + block_columns:
+            view.release()
+    return first_item + len(freq_miles), list(name_indexes)
+
+
+#
+# Returns (car mileages, first items, item columns) as views of a packed fleet's buffer
+#
+def read_columns(buffer, car_count, item_count):
+    values = buffer[:8 * (2 * car_count + 1 + column_count * item_count)].cast('q')
+    car_mileage = values[:car_count]
+    first_item = values[car_count:2 * car_count + 1]
+    start = 2 * car_count + 1
+    columns = [values[start + column * item_count:start + (column + 1) * item_count]
+               for column in range(column_count)]
+    return values, car_mileage, first_item, columns
+
+
+#
+# Worker initializer: maps the shared memory block of the packed fleet once for the shards
+# evaluated by the worker (rather than with each shard)
+#
+def init_packed_fleet(block_name, car_count, item_count):
+    global packed_fleet
+    packed_fleet = (shared_memory.SharedMemory(name=block_name), car_count, item_count)
+
+
+#
+# Worker: returns [(car position, [item names])] for the cars needing maintenance in the shard
+# of the fleet packed in the shared memory block (see init_packed_fleet), item_names are the
+# names of the shard's items (see pack_shard)
+#
+def evaluate_packed_cars(start, stop, today, item_names):
+    block, car_count, item_count = packed_fleet
+    today = today.toordinal()
+    due_dates = {}
+    results = []
+    values, car_mileage, first_item, columns = read_columns(block.buf, car_count, item_count)
+    freq_miles, last_mileage, freq_time, last_date, name_index = columns
+    try:
+        for position in range(start, stop):
+            mileage = car_mileage[position]
+            items_due = []
+            for item in range(first_item[position], first_item[position + 1]):
+                if freq_miles[item] and mileage > last_mileage[item] + freq_miles[item]:
+                    items_due.append(item_names[name_index[item]])
+                elif last_date[item] and freq_time[item] >= 0:
+                    key = (last_date[item], freq_time[item])
+                    due_date = due_dates.get(key)
+                    if due_date is None:
+                        due_date = due_dates[key] = cm.add_months_to_date(date.fromordinal(key[0]),
+                                                                          key[1]).toordinal()
+                    if due_date <= today:
+                        items_due.append(item_names[name_index[item]])
+            if items_due:
+                results.append((position, items_due))
+    finally:
+        for view in [values, car_mileage, first_item] + columns:
+            view.release()
+    return pack_results(results)
+
+
+#
+# Returns a dictionary of car name -> items needing maintenance (in car list order, as
+# CarMaintenance.get_items_needing_maintenance) evaluated by the worker processes, method is
+# 'fork' or 'shared_memory' (by default fork where it is available and no other thread is running)
+#
+def get_items_due(car_data, workers=None, today=None, method=None):
+    global shared_cars
+    if workers is None:
+        workers = worker_count
+    if today is None:
+        if isinstance(car_data.cars, cm.LazyCars) and car_data.cars.unloaded:
+            return car_data.get_items_needing_maintenance()
+        today = date.today()
+    car_names = list(car_data.cars)
+    cars = [car_data.cars[car_name] for car_name in car_names]
+    if workers <= 1 or len(cars) < min_parallel_cars:
+        results = evaluate_local_cars(cars, today)
+        return {car_names[position]: car_items_due for position, car_items_due in results}
+    start_methods = multiprocessing.get_all_start_methods()
+    if method is None:
+        if 'fork' in start_methods and threading.active_count() == 1:
+            method = 'fork'
+        else:
+            method = 'shared_memory'
+
+    bounds = get_shard_bounds(len(cars), workers * shards_per_worker)
+    block = None
+    if method == 'fork':
+        # the workers are forked when the first shard is submitted and inherit the cars, frozen
+        # so the garbage collector in the workers does not write to (and copy) every page
+        shared_cars = cars
+        gc.freeze()
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        # the workers are not forked from this process, which may be running other threads
+        item_count = sum(len(car.items) for car in cars)
+        block = create_fleet_block(len(cars), item_count)
+        start_method = 'forkserver' if 'forkserver' in start_methods else None
+        context = multiprocessing.get_context(start_method)
+        executor = ProcessPoolExecutor(workers, mp_context=context, initializer=init_packed_fleet,
+                                       initargs=(block.name, len(cars), item_count))
+
+    items_due = {}
+    try:
+        with executor:
+            futures = []
+            first_item = 0
+            for start, stop in bounds:
+                if block is None:
+                    futures.append(executor.submit(evaluate_shared_cars, start, stop, today))
+                else:
+                    first_item, item_names = pack_shard(block, len(cars), item_count, cars,
+                                                        start, stop, first_item)
+                    futures.append(executor.submit(evaluate_packed_cars, start, stop, today,
+                                                   item_names))
+            for future in futures:
+                for position, car_items_due in unpack_results(future.result()):
+                    items_due[car_names[position]] = car_items_due
+    finally:
+        if shared_cars is not None:
+            shared_cars = None
+            gc.unfreeze()
+        if block is not None:
+            block.close()
+            block.unlink()
+    return items_due
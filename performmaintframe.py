@@ -16,6 +16,7 @@ FUNCTION
                                      allowing the user to update the mileage and date when
                                      maintenance was performed on an item for the
                                      selected car in the maintenance list
+    refresh                       -- shows the selected item and its last maintenance each time the view is shown
     do_add                        -- store the last performed maintenance information for the selected item
     do_update_item                -- clear the PerformMaint object and activate the AddItemsFrame object view
                                      to update the maintenance item's frequency data
@@ -34,7 +35,7 @@ import carmaintenance as cm
 import validation as v
 
 from tkinter import *
-from PIL import ImageTk, Image
+import assets
 
 
 #
@@ -51,15 +52,11 @@ class PerformMaintFrame:
         self.frame.pack(fill=BOTH, expand=TRUE)
 
         # Create and insert phone background image
-        load_file = "phone-background.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-background.png")
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=0, y=0, relwidth=1, relheight=1, anchor=NW)
-        load_file = "phone-hdr.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-hdr.png")
         self.img_hdr_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_hdr_panel.image = photo
         self.img_hdr_panel.place(x=20, y=80, anchor=NW)
@@ -71,10 +68,7 @@ class PerformMaintFrame:
         self.cancel_button.place(x=10, y=95, anchor=NW)
 
         # Create and insert car image
-        load_file = "car.png"
-        img = Image.open(load_file)
-        img = img.resize((40,40),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("car.png", (40, 40))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=150, y=120, anchor=CENTER)
@@ -84,10 +78,7 @@ class PerformMaintFrame:
         self.car_name_label.place(x=150, y=150, anchor=CENTER)
 
         # Create and insert wrench image
-        load_file = "wrench.png"
-        img = Image.open(load_file)
-        img = img.resize((30,30),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("wrench.png", (30, 30))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=150, y=200, anchor=CENTER)
@@ -131,6 +122,13 @@ class PerformMaintFrame:
                                                text="Save", font=("Helvetica", 12), bg=self.tk.background)
         self.add_maint_perform_button.place(x=15, y=530, anchor=SW)
 
+        self.refresh()
+
+    # shows the selected item and when its maintenance was last performed (called each time the view is shown)
+    def refresh(self):
+        self.last_maint_mileage_entry.delete(0, END)
+        self.last_maint_date_entry.delete(0, END)
+        self.info_label.config(text="")
         car = cm.selections.get_car_selected()
         car_text_entry = car.replace('_', ' ')
         self.car_name_label.config(text=car_text_entry)
@@ -138,19 +136,19 @@ class PerformMaintFrame:
         item_text_entry = item.replace('_', ' ')
         self.item_label.config(text=item_text_entry)
         last_maint_mileage = cm.car_data.get_item_last_mileage(car, item)
-        if last_maint_mileage != 0: self.last_maint_mileage_entry.insert(0, last_maint_mileage)
+        if last_maint_mileage is not None: self.last_maint_mileage_entry.insert(0, last_maint_mileage)
         last_maint_date = cm.car_data.get_item_last_date(car, item)
-        if last_maint_date != "": self.last_maint_date_entry.insert(0, last_maint_date)
+        if last_maint_date is not None: self.last_maint_date_entry.insert(0, cm.date_to_text(last_maint_date))
 
     # store the last performed maintenance information for the selected item
     def do_add(self):
         info_text = ""
-        last_maint_mileage = self.last_maint_mileage_entry.get()
+        last_maint_mileage, error = v.parse_number(self.last_maint_mileage_entry.get())
 
         # validate the mileage and date were entered properly
-        if not v.is_valid_number_or_blank(last_maint_mileage): info_text = "Enter mileages as a number!"
-        last_maint_date = self.last_maint_date_entry.get()
-        if not v.is_valid_date(last_maint_date): info_text = "Enter valid date as mm/dd/yyyy!"
+        if error is not None: info_text = "Enter mileages as a number!"
+        last_maint_date, error = v.parse_date(self.last_maint_date_entry.get())
+        if error is not None: info_text = "Enter valid date as mm/dd/yyyy!"
 
         # if the data was entered properly store the frequency data for the selected item
         if info_text != "":
@@ -158,9 +156,10 @@ class PerformMaintFrame:
         else:
             car = cm.selections.get_car_selected()
             item = cm.selections.get_item_selected()
-            freq_mileage = cm.car_data.get_item_freq_miles(car, item)
-            freq_time = cm.car_data.get_item_freq_time(car, item)
-            cm.car_data.add_car_items(car, item, freq_mileage, freq_time, last_maint_mileage, last_maint_date)
+            with self.master.data_lock.write_locked():
+                freq_mileage = cm.car_data.get_item_freq_miles(car, item)
+                freq_time = cm.car_data.get_item_freq_time(car, item)
+                cm.car_data.add_car_items(car, item, freq_mileage, freq_time, last_maint_mileage, last_maint_date)
             self.master.activate_items_window()
 
     # activates the AddItemsFrame view
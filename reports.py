@@ -0,0 +1,116 @@
+"""
+Name
+    reports
+
+DESCRIPTION
+    This module contains the maintenance reports shown by the MaintInfoFrame view.  Each
+    report is a generator of (text, fraction done) with one piece of text per car, so a
+    report can be shown while it is still being generated and never has to be held as one
+    string.  write_chunks runs a report (on a worker thread) and groups its text into
+    chunks on a queue, a small first chunk so the first screenful appears straight away.
+
+CLASS
+    None
+
+FUNCTION
+    maint_needed_report   -- generates the maintenance needed for every car
+    recent_maint_report   -- generates the maintenance last performed for every car and item
+    write_chunks          -- runs a report putting (text, fraction done) chunks on a queue
+    put_chunk             -- puts a chunk on the queue unless the report is cancelled
+
+DATA
+    first_chunk_size      -- number of cars in the first chunk of a report
+    chunk_size            -- number of cars in the chunks that follow
+"""
+
+import queue
+import carmaintenance as cm
+
+first_chunk_size = 25
+chunk_size = 250
+
+
+#
+# Generates the text of the maintenance needed for every car needing maintenance, checking one
+# car at a time (through the status cache) so the first cars are shown before the rest of the
+# fleet has been checked - a car not needing maintenance generates no text
+#
+def maint_needed_report(car_data):
+    car_list = car_data.get_car_list()
+    cars_need_maint = 0
+    for car_number, car in enumerate(car_list, 1):
+        items_need_maint = [item for item in car_data.get_items_list(car)
+                            if car_data.does_item_need_maintenance(car, item)]
+        if not items_need_maint:
+            yield "", car_number / len(car_list)
+            continue
+        lines = [car + "\n"]
+        if cars_need_maint == 0:
+            lines.insert(0, "Maintenance needed for:\n\n")
+        cars_need_maint += 1
+        for item in items_need_maint:
+            lines.append(" "*5 + item + "\n")
+        lines.append("\n")
+        yield "".join(lines), car_number / len(car_list)
+    if cars_need_maint == 0:
+        yield "No cars need maintenance at this time!", 1.0
+
+
+#
+# Generates the text of the maintenance last performed for every car and item (from a snapshot
+# of the data when it may be changed by other threads)
+#
+def recent_maint_report(car_data):
+    car_data = car_data.get_snapshot()
+    car_list = car_data.get_car_list()
+    yield "Previous Maintenance\n\n", 0.0
+    for car_number, car in enumerate(car_list, 1):
+        lines = [car + '\n']
+        item_list = car_data.get_items_list(car)
+        if item_list == []:
+            lines.append(' '*5 + "No items listed\n")
+        else:
+            for item in item_list:
+                last_miles = car_data.get_item_last_mileage(car, item)
+                last_date = car_data.get_item_last_date(car, item)
+                lines.append(' '*5 + item + '\n')
+                lines.append(' '*10 + 'Mileage: ' + cm.number_to_text(last_miles) + '\n')
+                lines.append(' '*10 + 'Date: ' + cm.date_to_text(last_date) + '\n')
+        lines.append('\n')
+        yield "".join(lines), car_number / len(car_list)
+
+
+#
+# Runs the report putting (text, fraction done) chunks on the queue followed by None when the
+# report is complete (or failed), stops as soon as the cancel event is set
+#
+def write_chunks(report, chunk_queue, cancel):
+    texts = []
+    size = first_chunk_size
+    try:
+        for text, done in report:
+            if cancel.is_set():
+                return
+            texts.append(text)
+            if len(texts) >= size:
+                if not put_chunk(chunk_queue, ("".join(texts), done), cancel):
+                    return
+                texts = []
+                size = chunk_size
+        put_chunk(chunk_queue, ("".join(texts), 1.0), cancel)
+    finally:
+        put_chunk(chunk_queue, None, cancel)
+
+
+#
+# Puts the chunk on the queue, waiting while the queue is full, returns False if the report was cancelled
+#
+def put_chunk(chunk_queue, chunk, cancel):
+    while not cancel.is_set():
+        try:
+            chunk_queue.put(chunk, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
@@ -0,0 +1,223 @@
+"""
+Name
+    statusworker
+
+DESCRIPTION
+    This module contains the worker threads finding the maintenance needed status for the
+    views, so the user interface thread never waits while a large fleet is checked.  A view
+    asks for the status of a list of cars (or of a car's items) and shows the rows straight
+    away in a neutral color.  The cars are split into batches checked by the worker threads,
+    whose results are put on a result queue that the user interface thread checks with
+    after() and hands to the view's callback to recolor the rows.
+
+    The status known without checking any items is handed to the callback first, on the next
+    idle call of the user interface thread: the whole fleet from the FleetStatus columns (or
+    the SQLite storage's query while cars are unread) once they are built, otherwise the cars
+    and items in the status cache.  Only the others are sent to the workers, which check them
+    with does_car_need_maintenance/does_item_need_maintenance and so fill the cache for the
+    next request - or, when more than fleet_status_cars cars are missing from the cache, build
+    the FleetStatus columns in one go (much quicker for a whole fleet), which then answer the
+    requests that follow.
+
+    The workers use the data while the user interface thread changes it, so the data must be
+    a ConcurrentCarMaintenance (the application's data is one): a change waits for the car's
+    lock while a worker checks the car, so no stale status is left in the cache.  The status
+    of a plain CarMaintenance is found on the calling thread instead.  A change while a
+    request is being worked on only affects the colors shown until the view is shown again
+    (which makes a new request).
+
+CLASS
+    StatusWorker          -- worker threads finding the maintenance needed status for the views
+
+FUNCTION
+                            -- StatusWorker methods
+    __init__              -- starts the worker threads
+    request_cars          -- asks for the status of a list of cars
+    request_items         -- asks for the status of a car's items
+    submit                -- hands over the known status and splits the rest into batches for the workers
+    cancel                -- drops a request, its results are no longer handed to its callback
+    run                   -- worker thread checking batches of cars or items
+    poll                  -- hands the results arrived to the callbacks (repeats using after())
+    close                 -- stops the worker threads
+                            -- Additional Functions
+    get_known_car_status  -- returns the status of the cars known without checking their items
+    get_known_item_status -- returns the status of the car's items known without checking them
+    get_car_status        -- returns the status of each car in a batch
+    get_fleet_car_status  -- returns the status of each car in a batch from the FleetStatus columns
+    get_item_status       -- returns the status of each item of a car in a batch
+
+DATA
+    worker_count          -- default number of worker threads
+    batch_size            -- number of cars or items checked together
+    fleet_status_cars     -- requests missing more cars from the status cache build the FleetStatus
+    poll_interval         -- milliseconds between checks of the result queue
+    unknown_color         -- background color of the rows whose status is not known yet
+    self.requests         -- queue of (request id, function, car data, batch) for the worker threads
+    self.results          -- queue of (request id, [(name, status)]) for the user interface thread
+    self.callbacks        -- callback of each request still being worked on, request id -> callback
+    self.outstanding      -- number of batches of each request not yet handed to its callback
+"""
+
+import itertools
+import queue
+import threading
+import carmaintenance as cm
+import concurrentfleet
+
+worker_count = 2
+batch_size = 200
+fleet_status_cars = 1000
+poll_interval = 20
+unknown_color = '#e8e8e8'
+
+
+#
+# Worker threads finding the maintenance needed status for the views
+#
+class StatusWorker:
+
+    # starts the worker threads, tk is used to check the result queue from the user interface thread
+    def __init__(self, tk, threads=None):
+        self.tk = tk
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.callbacks = {}
+        self.outstanding = {}
+        self.request_ids = itertools.count(1)
+        self.poll_id = None
+        self.workers = [threading.Thread(target=self.run, name='status-%d' % number, daemon=True)
+                        for number in range(worker_count if threads is None else threads)]
+        for worker in self.workers:
+            worker.start()
+
+    # asks for the status of the cars, callback([(car name, needs maintenance)]) is called on the
+    # user interface thread with the status already known, then as batches are checked (in order
+    # for a single worker), returns the request id
+    def request_cars(self, car_data, car_names, callback):
+        known, missing = get_known_car_status(car_data, car_names)
+        if len(missing) > fleet_status_cars:
+            return self.submit(get_fleet_car_status, car_data, known, missing, callback, len(missing))
+        return self.submit(get_car_status, car_data, known, missing, callback)
+
+    # asks for the status of the car's items, callback([(item name, needs maintenance)]) as for request_cars
+    def request_items(self, car_data, car_name, item_names, callback):
+        known, missing = get_known_item_status(car_data, car_name, item_names)
+        return self.submit(get_item_status, car_data, known, [(car_name, item_name) for item_name in missing],
+                           callback)
+
+    # queues the known status for the callback and splits the names left into batches of size
+    # for the worker threads (a plain CarMaintenance is checked here instead), then checks for results
+    def submit(self, function, car_data, known, names, callback, size=batch_size):
+        request_id = next(self.request_ids)
+        if names and not isinstance(car_data, concurrentfleet.ConcurrentCarMaintenance):
+            known, names = known + function(car_data, names), []
+        batches = [names[start:start + size] for start in range(0, len(names), size)]
+        if not known and not batches:
+            return request_id
+        self.callbacks[request_id] = callback
+        self.outstanding[request_id] = len(batches)
+        if known:
+            self.outstanding[request_id] += 1
+            self.results.put((request_id, known))
+        for batch in batches:
+            self.requests.put((request_id, function, car_data, batch))
+        if known:
+            # the known status is shown as soon as the view is built, without waiting for the poll interval
+            if self.poll_id is not None:
+                self.tk.after_cancel(self.poll_id)
+            self.poll_id = self.tk.after_idle(self.poll)
+        elif self.poll_id is None:
+            self.poll_id = self.tk.after(poll_interval, self.poll)
+        return request_id
+
+    # drops the request, batches not yet checked are skipped and results are no longer handed to the callback
+    def cancel(self, request_id):
+        self.callbacks.pop(request_id, None)
+        self.outstanding.pop(request_id, None)
+
+    # worker thread - checks the batches of cars or items of requests not cancelled
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            request_id, function, car_data, batch = request
+            if request_id not in self.callbacks:
+                continue
+            try:
+                self.results.put((request_id, function(car_data, batch)))
+            except (KeyError, RuntimeError):
+                # the cars or items changed while being checked, the view shows them again when refreshed
+                self.results.put((request_id, []))
+
+    # hands the results arrived to the callbacks of their requests and checks again while
+    # requests are still being worked on
+    def poll(self):
+        self.poll_id = None
+        while True:
+            try:
+                request_id, statuses = self.results.get_nowait()
+            except queue.Empty:
+                break
+            callback = self.callbacks.get(request_id)
+            if callback is None:
+                continue
+            self.outstanding[request_id] -= 1
+            if self.outstanding[request_id] == 0:
+                self.cancel(request_id)
+            callback(statuses)
+        if self.callbacks:
+            self.poll_id = self.tk.after(poll_interval, self.poll)
+
+    # stops the worker threads
+    def close(self):
+        self.callbacks.clear()
+        self.outstanding.clear()
+        for worker in self.workers:
+            self.requests.put(None)
+        if self.poll_id is not None:
+            self.tk.after_cancel(self.poll_id)
+            self.poll_id = None
+
+
+#
+# Returns ([(car name, needs maintenance)] known without checking the cars' items, [names of the
+# other cars]) - every car from the FleetStatus columns (or the storage while cars are unread)
+# once they are built, otherwise the cars in the status cache
+#
+def get_known_car_status(car_data, car_names):
+    if car_data.fleet_status is not None or (isinstance(car_data.cars, cm.LazyCars) and car_data.cars.unloaded):
+        cars_due = set(car_data.get_cars_needing_maintenance())
+        return [(car_name, car_name in cars_due) for car_name in car_names], []
+    return car_data.get_cached_car_status(car_names)
+
+
+#
+# Returns ([(item name, needs maintenance)] of the car's items in the status cache, [names of the
+# other items])
+#
+def get_known_item_status(car_data, car_name, item_names):
+    return car_data.get_cached_item_status(car_name, item_names)
+
+
+#
+# Returns the (car name, needs maintenance) of each car in the batch, filling the status cache
+#
+def get_car_status(car_data, car_names):
+    return [(car_name, car_data.does_car_need_maintenance(car_name)) for car_name in car_names]
+
+
+#
+# Returns the (car name, needs maintenance) of each car in the batch from the FleetStatus columns
+# (built holding every car lock if they are not built yet)
+#
+def get_fleet_car_status(car_data, car_names):
+    cars_due = set(car_data.get_cars_needing_maintenance())
+    return [(car_name, car_name in cars_due) for car_name in car_names]
+
+
+#
+# Returns the (item name, needs maintenance) of each (car name, item name) in the batch, filling the status cache
+#
+def get_item_status(car_data, car_items):
+    return [(item_name, car_data.does_item_need_maintenance(car_name, item_name)) for car_name, item_name in car_items]
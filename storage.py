@@ -0,0 +1,684 @@
+"""
+Name
+    storage
+
+DESCRIPTION
+    This module contains the storage backends used to store and retrieve the car maintenance
+    data.  The backend is picked from the file name extension:
+
+        .dat            -- the whole CarMaintenance object is pickled as a snapshot and each change
+                           made since is appended to a journal file next to it (CarMaintenance.journal)
+        .bak            -- the whole CarMaintenance object is pickled
+        .db, .sqlite    -- SQLite database with tables for the cars, items and maintenance history
+        .cmb            -- binary fleet file with fixed size records (see binaryfleet)
+
+    The backend can also be named with a file format ('pickle', 'journal', 'sqlite', 'binary').
+
+    A backend can also be attached to a CarMaintenance object as a listener.  The listener
+    methods have the same names and arguments as the CarMaintenance methods changing the data
+    (add_car, del_car, set_mileage, add_car_items, del_car_items) and are called after each
+    change, so the SQLite backend writes each change through as it happens and the journal
+    appends a record for it, storing the data then only needs to commit/flush.
+
+CLASS
+    Storage               -- base class for the storage backends
+    PickleStorage         -- stores the CarMaintenance object as a pickle
+    JournaledPickleStorage -- stores a pickle snapshot plus a journal of the changes made since
+    SQLiteStorage         -- stores the cars, items and maintenance history in SQLite tables
+    BinaryStorage         -- stores the cars and items in a binary fleet file
+
+FUNCTION
+                            -- Storage methods
+    __init__              -- store the file name
+    load                  -- returns the CarMaintenance object read from the file
+    save                  -- writes the whole CarMaintenance object to the file
+    flush                 -- writes any changes not yet written to the file
+    close                 -- releases the file
+    begin_batch, end_batch -- listener methods called around a batch of changes
+    add_car               -- listener methods called after the CarMaintenance data changes
+    del_car
+    set_mileage
+    add_car_items
+    del_car_items
+                            -- JournaledPickleStorage methods
+    load                  -- reads the snapshot and replays the journal over it
+    read                  -- returns the snapshot with the journal replayed over it, without attaching
+    save                  -- writes a new snapshot and empties the journal
+    flush                 -- flushes the journal to disc
+    close                 -- waits for any compaction to finish and closes the journal
+    append                -- appends a record for a change to the journal
+    begin_batch, end_batch -- hands the records of a batch of changes to the OS together
+    start_compaction      -- moves the journal aside and folds it into the snapshot on a background thread
+    compact               -- writes the snapshot with the moved journal replayed over it
+    start_snapshot        -- moves the journal aside before the autosave copies the data
+    end_snapshot          -- removes the moved journal once the autosave wrote the snapshot
+                            -- SQLiteStorage methods
+    connect               -- opens the database and creates the tables and indexes
+    load                  -- reads the car names (migrating the pickle file if no database exists yet)
+    load_car              -- reads a car's mileage and items when the car is first used
+    save                  -- replaces the contents of the database with the CarMaintenance object
+    flush                 -- commits the changes written through
+    commit_change         -- commits a change unless a batch of changes is being written
+    begin_batch, end_batch -- commits the changes of a batch together
+    get_items_due         -- returns the items needing maintenance using an SQL query
+    get_cars_due          -- returns the cars needing maintenance using an SQL query
+    get_history           -- returns the maintenance history recorded for a car's item
+                            -- BinaryStorage methods
+    load                  -- reads the binary fleet file
+    save                  -- writes the binary fleet file
+                            -- Additional Functions
+    get_storage_class     -- returns the storage backend class for a file name or file format
+    store                 -- stores the CarMaintenance object to a file
+    retrieve              -- retrieves the CarMaintenance object from a file
+    close_attached        -- closes the storages attached to a CarMaintenance object
+    migrate_pickle_to_sqlite -- copies a pickle file into a new SQLite database
+    write_file_atomically -- writes a file through a temporary file, fsync and rename
+    replay_journal        -- applies the changes recorded in a journal file to a CarMaintenance object
+    repair_journal        -- cuts a partly written last record off a journal file
+    date_to_ordinal       -- converts a date to a day ordinal for storing (None stays None)
+    ordinal_to_date       -- converts a stored day ordinal back to a date
+
+DATA
+    storage_classes       -- maps file name extensions to the storage backend classes
+    storage_formats       -- maps file format names to the storage backend classes
+    open_journals         -- the JournaledPickleStorage attached for each snapshot file
+    compact_threshold     -- journal size in bytes at which it is folded into the snapshot
+"""
+
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+from datetime import date
+import carmaintenance as cm
+
+
+#
+# Base class for the storage backends, the listener methods do nothing
+#
+class Storage:
+
+    # store the file name
+    def __init__(self, file_name):
+        self.file_name = file_name
+
+    # returns the CarMaintenance object read from the file
+    def load(self):
+        raise NotImplementedError
+
+    # writes the whole CarMaintenance object to the file
+    def save(self, car_data):
+        raise NotImplementedError
+
+    # writes any changes not yet written to the file
+    def flush(self):
+        pass
+
+    # releases the file
+    def close(self):
+        pass
+
+    # listener methods - called around a batch of changes (e.g. a bulk import)
+    def begin_batch(self):
+        pass
+
+    def end_batch(self):
+        pass
+
+    # listener methods - called after the CarMaintenance data changes
+    def add_car(self, car_name, mileage):
+        pass
+
+    def del_car(self, car_name):
+        pass
+
+    def set_mileage(self, car_name, mileage):
+        pass
+
+    def add_car_items(self, car_name, item_name, freq_miles, freq_time, last_mileage, last_date):
+        pass
+
+    def del_car_items(self, car_name, item_name):
+        pass
+
+
+#
+# Stores the whole CarMaintenance object as a pickle
+#
+class PickleStorage(Storage):
+
+    # returns the unpickled CarMaintenance object
+    def load(self):
+        with open(self.file_name, 'rb') as file:
+            return pickle.load(file)
+
+    # pickles the CarMaintenance object to the file (through a temporary file and rename)
+    def save(self, car_data):
+        write_file_atomically(self.file_name, pickle.dumps(car_data))
+
+
+#
+# Stores a pickle snapshot of the CarMaintenance object plus a journal with one record per
+# change made since, so storing only needs to flush the journal.  Once the journal grows
+# past compact_threshold it is moved aside and folded into a new snapshot on a background
+# thread, while new changes go to a new journal - unless an AutoSaver writes the snapshot
+# (see autosave), which moves the journal aside itself each time it saves.
+#
+class JournaledPickleStorage(PickleStorage):
+
+    # store the file names, the journal file is opened when the first change is appended
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        self.journal_file_name = os.path.splitext(file_name)[0] + '.journal'
+        self.compacting_file_name = self.journal_file_name + '.compacting'
+        self.journal = None
+        self.compaction = None
+        self.saver = None
+        self.closed = False
+        self.batch_depth = 0
+
+    # reads the snapshot (starting empty if there is none yet), replays the journals over it,
+    # cuts off a partly written last record and attaches this storage so the changes that
+    # follow are journaled
+    def load(self):
+        previous = open_journals.get(os.path.abspath(self.file_name))
+        if previous is not None:
+            previous.close()
+        open_journals[os.path.abspath(self.file_name)] = self
+
+        car_data, length = self.read()
+        repair_journal(self.journal_file_name, length)
+        car_data.add_listener(self)
+        if os.path.exists(self.compacting_file_name) or \
+                (os.path.exists(self.journal_file_name) and os.path.getsize(self.journal_file_name) > compact_threshold):
+            self.start_compaction()
+        return car_data
+
+    # returns the snapshot (empty if there is none yet) with the journals replayed over it and
+    # the length of the journal up to its last whole record, nothing is attached or written
+    def read(self):
+        car_data = cm.CarMaintenance()
+        if os.path.exists(self.file_name):
+            car_data = super().load()
+        replay_journal(car_data, self.compacting_file_name)
+        return car_data, replay_journal(car_data, self.journal_file_name)
+
+    # writes a new snapshot of the CarMaintenance object and empties the journals
+    def save(self, car_data):
+        previous = open_journals.pop(os.path.abspath(self.file_name), None)
+        if previous is not None:
+            previous.close()
+        write_file_atomically(self.file_name, pickle.dumps(car_data))
+        for file_name in (self.compacting_file_name, self.journal_file_name):
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+    # flushes the journal to disc
+    def flush(self):
+        if self.journal is not None:
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+
+    # waits for any compaction to finish and closes the journal, no more changes are journaled
+    def close(self):
+        self.closed = True
+        if self.compaction is not None:
+            self.compaction.join()
+            self.compaction = None
+        if self.journal is not None:
+            self.flush()
+            self.journal.close()
+            self.journal = None
+
+    # appends a record for the change to the journal (handed to the OS so it survives a crash of the app)
+    def append(self, *record):
+        if self.closed:
+            return
+        if self.journal is None:
+            self.journal = open(self.journal_file_name, 'a', encoding='utf-8')
+        self.journal.write(json.dumps(record, separators=(',', ':')) + '\n')
+        if self.batch_depth == 0:
+            self.journal.flush()
+            if self.journal.tell() > compact_threshold and self.compaction is None and self.saver is None:
+                self.start_compaction()
+
+    # the records of the changes between begin_batch and end_batch are handed to the OS together
+    def begin_batch(self):
+        self.batch_depth += 1
+
+    def end_batch(self):
+        self.batch_depth -= 1
+        if self.batch_depth == 0 and self.journal is not None:
+            self.journal.flush()
+            if self.journal.tell() > compact_threshold and self.compaction is None and self.saver is None:
+                self.start_compaction()
+
+    # moves the journal aside and starts folding it into the snapshot on a background thread,
+    # a journal left aside by an unfinished compaction is folded in first
+    def start_compaction(self):
+        if not os.path.exists(self.compacting_file_name):
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            os.replace(self.journal_file_name, self.compacting_file_name)
+        self.compaction = threading.Thread(target=self.compact, name='journal-compaction')
+        self.compaction.start()
+
+    # writes a new snapshot from the old snapshot with the moved journal replayed over it,
+    # only the files are used so the data being edited is never touched by this thread
+    def compact(self):
+        snapshot = cm.CarMaintenance()
+        if os.path.exists(self.file_name):
+            snapshot = PickleStorage(self.file_name).load()
+        replay_journal(snapshot, self.compacting_file_name)
+        write_file_atomically(self.file_name, pickle.dumps(snapshot))
+        os.remove(self.compacting_file_name)
+        self.compaction = None
+
+    # moves the journal aside before the AutoSaver copies the data (no change is being journaled
+    # meanwhile), the changes that follow go to a new journal.  The changes of a snapshot that
+    # failed to be written are still aside, the journal is added to them.
+    def start_snapshot(self):
+        compaction = self.compaction
+        if compaction is not None:
+            compaction.join()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if not os.path.exists(self.journal_file_name):
+            return
+        if os.path.exists(self.compacting_file_name):
+            with open(self.journal_file_name, 'rb') as journal, open(self.compacting_file_name, 'ab') as compacting:
+                shutil.copyfileobj(journal, compacting)
+            os.remove(self.journal_file_name)
+        else:
+            os.replace(self.journal_file_name, self.compacting_file_name)
+
+    # removes the moved journal once the snapshot holding its changes has been written
+    def end_snapshot(self):
+        if os.path.exists(self.compacting_file_name):
+            os.remove(self.compacting_file_name)
+
+    # listener methods - journal each change
+    def add_car(self, car_name, mileage):
+        self.append('add_car', car_name, mileage)
+
+    def del_car(self, car_name):
+        self.append('del_car', car_name)
+
+    def set_mileage(self, car_name, mileage):
+        self.append('set_mileage', car_name, mileage)
+
+    def add_car_items(self, car_name, item_name, freq_miles, freq_time, last_mileage, last_date):
+        self.append('add_car_items', car_name, item_name, freq_miles, freq_time, last_mileage,
+                    date_to_ordinal(last_date))
+
+    def del_car_items(self, car_name, item_name):
+        self.append('del_car_items', car_name, item_name)
+
+
+#
+# Stores the cars, items and maintenance history in SQLite tables, changes are written
+# through one row at a time when attached to the CarMaintenance object
+#
+class SQLiteStorage(Storage):
+
+    # store the file name, the database is opened when first used
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        self.connection = None
+        self.batch_depth = 0
+
+    # opens the database and creates the tables and indexes
+    def connect(self):
+        if self.connection is None:
+            try:
+                self.connection = sqlite3.connect(self.file_name, check_same_thread=False)
+            except sqlite3.Error as error:
+                raise OSError(str(error))
+            self.connection.execute("PRAGMA foreign_keys = ON")
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS cars (
+                    car_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE,
+                    mileage INTEGER);
+                CREATE TABLE IF NOT EXISTS items (
+                    car_id INTEGER NOT NULL REFERENCES cars(car_id) ON DELETE CASCADE,
+                    name TEXT NOT NULL,
+                    freq_miles INTEGER,
+                    freq_time INTEGER,
+                    last_mileage INTEGER,
+                    last_date INTEGER,
+                    due_mileage INTEGER,
+                    due_date INTEGER,
+                    PRIMARY KEY (car_id, name));
+                CREATE TABLE IF NOT EXISTS history (
+                    car_id INTEGER NOT NULL REFERENCES cars(car_id) ON DELETE CASCADE,
+                    item TEXT NOT NULL,
+                    mileage INTEGER,
+                    date INTEGER);
+                CREATE INDEX IF NOT EXISTS items_due_mileage ON items (car_id, due_mileage);
+                CREATE INDEX IF NOT EXISTS items_due_date ON items (due_date);
+                CREATE INDEX IF NOT EXISTS history_item ON history (car_id, item);
+                """)
+        return self.connection
+
+    # reads the car names and attaches this storage to the CarMaintenance object so later changes
+    # are written through, each car's mileage and items are read when the car is first used
+    # (see load_car).  An existing pickle file (and its journal) is migrated the first time.
+    def load(self):
+        pickle_storage = JournaledPickleStorage(os.path.splitext(self.file_name)[0] + '.dat')
+        pickle_files = (pickle_storage.file_name, pickle_storage.journal_file_name, pickle_storage.compacting_file_name)
+        if not os.path.exists(self.file_name) and any(os.path.exists(file_name) for file_name in pickle_files):
+            migrate_pickle_to_sqlite(pickle_storage.file_name, self.file_name)
+
+        connection = self.connect()
+        car_data = cm.CarMaintenance()
+        car_names = [car_name for (car_name,) in connection.execute("SELECT name FROM cars ORDER BY car_id")]
+        car_data.cars = cm.LazyCars(car_names, self)
+        car_data.add_listener(self)
+        return car_data
+
+    # reads the car's mileage and items using the car name index
+    def load_car(self, car_name):
+        connection = self.connect()
+        car_id, mileage = connection.execute("SELECT car_id, mileage FROM cars WHERE name = ?",
+                                             (car_name,)).fetchone()
+        car = cm.CarToMaintain(car_name, mileage)
+        for item_name, freq_miles, freq_time, last_mileage, last_date in connection.execute("""
+                SELECT name, freq_miles, freq_time, last_mileage, last_date FROM items
+                WHERE car_id = ? ORDER BY rowid""", (car_id,)):
+            car.items[item_name] = cm.MaintenanceItem(freq_miles, freq_time, last_mileage,
+                                                      ordinal_to_date(last_date))
+        return car
+
+    # replaces the contents of the database with the CarMaintenance object
+    def save(self, car_data):
+        connection = self.connect()
+        with connection:
+            connection.execute("DELETE FROM history")
+            connection.execute("DELETE FROM items")
+            connection.execute("DELETE FROM cars")
+            for car_name, car in car_data.cars.items():
+                connection.execute("INSERT INTO cars (name, mileage) VALUES (?, ?)", (car_name, car.mileage))
+                for item_name, item in car.items.items():
+                    self.write_item(car_name, item_name, item.freq_miles, item.freq_time,
+                                    item.last_mileage, item.last_date)
+
+    # commits the changes written through
+    def flush(self):
+        if self.connection is not None:
+            self.connection.commit()
+
+    # closes the database
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    # writes the item's row, recording a history row when the last maintenance performed changes
+    def write_item(self, car_name, item_name, freq_miles, freq_time, last_mileage, last_date):
+        connection = self.connect()
+        car_id = connection.execute("SELECT car_id FROM cars WHERE name = ?", (car_name,)).fetchone()[0]
+        last_ordinal = date_to_ordinal(last_date)
+        previous = connection.execute("SELECT last_mileage, last_date FROM items WHERE car_id = ? AND name = ?",
+                                      (car_id, item_name)).fetchone()
+        if (last_mileage is not None or last_date is not None) and previous != (last_mileage, last_ordinal):
+            connection.execute("INSERT INTO history (car_id, item, mileage, date) VALUES (?, ?, ?, ?)",
+                               (car_id, item_name, last_mileage, last_ordinal))
+
+        due_mileage = None
+        if freq_miles:
+            due_mileage = (last_mileage or 0) + freq_miles
+        due_date = None
+        if last_date is not None and freq_time is not None:
+            due_date = cm.add_months_to_date(last_date, freq_time).toordinal()
+        connection.execute("""
+            INSERT INTO items (car_id, name, freq_miles, freq_time, last_mileage, last_date, due_mileage, due_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (car_id, name) DO UPDATE SET
+                freq_miles = excluded.freq_miles, freq_time = excluded.freq_time,
+                last_mileage = excluded.last_mileage, last_date = excluded.last_date,
+                due_mileage = excluded.due_mileage, due_date = excluded.due_date""",
+                           (car_id, item_name, freq_miles, freq_time, last_mileage, last_ordinal,
+                            due_mileage, due_date))
+
+    # listener methods - write each change through to the database
+    def add_car(self, car_name, mileage):
+        connection = self.connect()
+        connection.execute("""
+            INSERT INTO cars (name, mileage) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET mileage = excluded.mileage""", (car_name, mileage))
+        connection.execute("DELETE FROM items WHERE car_id = (SELECT car_id FROM cars WHERE name = ?)",
+                           (car_name,))
+        self.commit_change()
+
+    def del_car(self, car_name):
+        self.connect().execute("DELETE FROM cars WHERE name = ?", (car_name,))
+        self.commit_change()
+
+    def set_mileage(self, car_name, mileage):
+        self.connect().execute("UPDATE cars SET mileage = ? WHERE name = ?", (mileage, car_name))
+        self.commit_change()
+
+    def add_car_items(self, car_name, item_name, freq_miles, freq_time, last_mileage, last_date):
+        self.write_item(car_name, item_name, freq_miles, freq_time, last_mileage, last_date)
+        self.commit_change()
+
+    def del_car_items(self, car_name, item_name):
+        self.connect().execute("DELETE FROM items WHERE name = ? AND car_id = (SELECT car_id FROM cars WHERE name = ?)",
+                               (item_name, car_name))
+        self.commit_change()
+
+    # commits the change just written unless a batch of changes is being written
+    def commit_change(self):
+        if self.batch_depth == 0:
+            self.connection.commit()
+
+    # the changes between begin_batch and end_batch are committed together
+    def begin_batch(self):
+        self.batch_depth += 1
+
+    def end_batch(self):
+        self.batch_depth -= 1
+        if self.batch_depth == 0:
+            self.flush()
+
+    # returns a dictionary of car name -> items needing maintenance (same rules as
+    # CarMaintenance.does_item_need_maintenance) using the due mileage and due date columns
+    def get_items_due(self, today=None):
+        if today is None:
+            today = date.today()
+        items_due = {}
+        for car_name, item_name in self.connect().execute("""
+                SELECT cars.name, items.name FROM items JOIN cars ON cars.car_id = items.car_id
+                WHERE cars.mileage > items.due_mileage OR items.due_date <= ?
+                ORDER BY cars.car_id, items.rowid""", (today.toordinal(),)):
+            items_due.setdefault(car_name, []).append(item_name)
+        return items_due
+
+    # returns the names of the cars needing maintenance
+    def get_cars_due(self, today=None):
+        return list(self.get_items_due(today))
+
+    # returns the (mileage, date) of each recorded maintenance of the car's item, oldest first
+    def get_history(self, car_name, item_name):
+        return [(mileage, ordinal_to_date(ordinal)) for mileage, ordinal in self.connect().execute("""
+                SELECT history.mileage, history.date FROM history JOIN cars ON cars.car_id = history.car_id
+                WHERE cars.name = ? AND history.item = ? ORDER BY history.rowid""", (car_name, item_name))]
+
+
+#
+# Stores the cars and items in a binary fleet file with fixed size records
+#
+class BinaryStorage(Storage):
+
+    # reads the binary fleet file
+    def load(self):
+        import binaryfleet
+        return binaryfleet.read_binary_fleet(self.file_name)
+
+    # writes the binary fleet file
+    def save(self, car_data):
+        import binaryfleet
+        binaryfleet.write_binary_fleet(car_data, self.file_name)
+
+
+#
+# Maps file name extensions and file format names to the storage backend classes
+#
+storage_classes = {
+    '.dat': JournaledPickleStorage,
+    '.bak': PickleStorage,
+    '.db': SQLiteStorage,
+    '.sqlite': SQLiteStorage,
+    '.cmb': BinaryStorage,
+}
+storage_formats = {
+    'pickle': PickleStorage,
+    'journal': JournaledPickleStorage,
+    'sqlite': SQLiteStorage,
+    'binary': BinaryStorage,
+}
+
+
+#
+# Returns the storage backend class for the file format, or for the file name's extension
+# when no format is given (pickle if the extension is not known)
+#
+def get_storage_class(file_name, file_format=None):
+    if file_format is not None:
+        return storage_formats[file_format]
+    return storage_classes.get(os.path.splitext(file_name)[1].lower(), PickleStorage)
+
+
+#
+# The JournaledPickleStorage attached for each snapshot file and the journal size in bytes at
+# which it is folded into the snapshot
+#
+open_journals = {}
+compact_threshold = 1 << 20
+
+
+#
+# Stores the CarMaintenance object to the file, only committing the changes already written
+# through if a storage for this file is attached to the object
+#
+def store(car_data, file_name, file_format=None):
+    storage_class = get_storage_class(file_name, file_format)
+    for listener in car_data.listeners:
+        if type(listener) is storage_class and os.path.abspath(listener.file_name) == os.path.abspath(file_name):
+            listener.flush()
+            return
+    storage_class(file_name).save(car_data)
+
+
+#
+# Retrieves the CarMaintenance object from the file
+#
+def retrieve(file_name, file_format=None):
+    return get_storage_class(file_name, file_format)(file_name).load()
+
+
+#
+# Closes the storages attached to the CarMaintenance object (waiting for a journal compaction
+# to finish), before another process may use the data file
+#
+def close_attached(car_data):
+    for listener in car_data.listeners:
+        if isinstance(listener, Storage):
+            listener.close()
+
+
+#
+# Copies the car maintenance data in a pickle file, with its journal replayed over it, into a
+# new SQLite database
+#
+def migrate_pickle_to_sqlite(pickle_file_name, sqlite_file_name):
+    car_data, length = JournaledPickleStorage(pickle_file_name).read()
+    sqlite_storage = SQLiteStorage(sqlite_file_name)
+    sqlite_storage.save(car_data)
+    sqlite_storage.close()
+
+
+#
+# Writes the data to a temporary file, syncs it to disc and renames it over the file,
+# so a crash leaves either the old or the new file and never a partly written one
+#
+def write_file_atomically(file_name, data):
+    temp_file_name = file_name + '.tmp'
+    with open(temp_file_name, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file_name, file_name)
+
+
+#
+# Applies the changes recorded in the journal file to the CarMaintenance object, returns the
+# length of the journal up to the end of the last whole record.  A partly written last record
+# (the app stopped while writing it) is not replayed, an unreadable record before it is
+# skipped, and changes to cars or items that no longer exist are skipped (they can be replayed
+# a second time if the app stopped during a compaction) - each skipped record is reported.
+#
+def replay_journal(car_data, journal_file_name):
+    if not os.path.exists(journal_file_name):
+        return 0
+    length = 0
+    with open(journal_file_name, 'rb') as journal:
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                if not line.endswith(b'\n'):
+                    break
+                length += len(line)
+                print("Skipped unreadable record in journal " + journal_file_name + ": " +
+                      line.decode('utf-8', 'replace').rstrip())
+                continue
+            length += len(line)
+            method_name, args = record[0], record[1:]
+            if method_name == 'add_car_items':
+                args[5] = ordinal_to_date(args[5])
+            try:
+                getattr(car_data, method_name)(*args)
+            except KeyError:
+                print("Skipped journal record for a car or item that no longer exists: " +
+                      line.decode('utf-8').rstrip())
+    return length
+
+
+#
+# Cuts a partly written last record off the journal file and ends the last whole record with
+# a new line if it has none, so the records appended next start on a line of their own
+#
+def repair_journal(journal_file_name, length):
+    if not os.path.exists(journal_file_name):
+        return
+    with open(journal_file_name, 'r+b') as journal:
+        if os.path.getsize(journal_file_name) > length:
+            journal.truncate(length)
+        if length > 0:
+            journal.seek(length - 1)
+            if journal.read(1) != b'\n':
+                journal.write(b'\n')
+
+
+#
+# Converts a date to a day ordinal for storing, None stays None
+#
+def date_to_ordinal(date_value):
+    if date_value is None:
+        return None
+    return date_value.toordinal()
+
+
+#
+# Converts a stored day ordinal back to a date, None stays None
+#
+def ordinal_to_date(ordinal):
+    if ordinal is None:
+        return None
+    return date.fromordinal(ordinal)
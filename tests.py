@@ -0,0 +1,466 @@
+"""
+Name
+    tests
+
+DESCRIPTION
+    This module contains regression tests for the car maintenance data and its storage.
+    Run it from the command line and name the tests to run (all are run if none are
+    named), e.g.
+
+        python tests.py cli_after_journal_only_session
+
+    Each test raises AssertionError when it fails; the exit status is 1 if any test failed.
+
+CLASS
+    None
+
+FUNCTION
+    run_cli                             -- runs the command line interface, returns (exit status, stdout)
+    run_status_request                  -- runs a status worker request, returns the statuses found
+    test_add_months_closed_form         -- add_months_to_date gives the same dates as the original day
+                                           stepping version
+    test_cli_after_journal_only_session -- the command line keeps the cars of a session that left
+                                           only a journal (no snapshot yet)
+    test_cli_load_errors                -- the command line prints load errors and skipped journal records
+                                           on stderr and fails when the data file cannot be read
+    test_torn_journal_record            -- the changes made after a partly written journal record
+                                           survive the next load
+    test_migrate_journal                -- the migration to SQLite keeps the journaled changes
+    test_concurrent_sqlite_status       -- threads checking the status of SQLite cars read each car
+                                           once and count every status check
+    test_status_worker_cache            -- the status worker answers from the status cache and the
+                                           FleetStatus, sending only the cars missing to the workers
+    test_fleet_status_edits             -- the FleetStatus columns kept in step with car and item changes
+                                           give the same results as columns built from scratch
+    test_autosave_journal               -- the autosave writes the journaled data file's snapshot while
+                                           the data changes, keeping every change once
+    test_restore_backup_file            -- restoring the older backup file changes the data in place,
+                                           the restored cars and later changes are journaled
+    main                                -- runs the tests named on the command line
+
+DATA
+    tests                               -- maps test names to the functions running them
+"""
+
+import concurrent.futures
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from datetime import date, timedelta
+import carmaintenance as cm
+import storage
+
+
+#
+# Runs the command line interface with the arguments, returns (exit status, standard output)
+#
+def run_cli(args):
+    import carmaintcli
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        status = carmaintcli.main(args)
+    return status, output.getvalue()
+
+
+#
+# The closed form add_months_to_date must give the same date as the original day stepping version
+# (kept in benchmarks) for every day of three decades (leap years, month ends) - every day for
+# the usual frequencies, every fifth day for the long ones
+#
+def test_add_months_closed_form():
+    import benchmarks
+
+    first_day = date(1996, 1, 1)
+    for day_step, months in ((1, (0, 1, 2, 3, 6, 12)), (5, (11, 13, 24, 60, 120))):
+        for day in range(0, (date(2026, 1, 1) - first_day).days, day_step):
+            last_date = first_day + timedelta(days=day)
+            for num_months in months:
+                expected = benchmarks.add_months_by_day_stepping(last_date, num_months)
+                assert cm.add_months_to_date.__wrapped__(last_date, num_months) == expected, (last_date, num_months)
+
+
+#
+# The application journals each change and writes the snapshot only when the journal is
+# compacted, so after a short session the data file does not exist yet - importing with the
+# command line must keep the journaled cars
+#
+def test_cli_after_journal_only_session():
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'CarMaintenance.dat')
+        session = storage.JournaledPickleStorage(file_name)
+        car_data = session.load()
+        car_data.add_car('Honda', 52000)
+        car_data.add_car_items('Honda', 'Oil change', 5000, 6, 45000, date(2020, 1, 1))
+        session.close()
+        assert not os.path.exists(file_name) and os.path.exists(session.journal_file_name)
+
+        import_file_name = os.path.join(directory, 'import.csv')
+        with open(import_file_name, 'w', encoding='utf-8') as file:
+            file.write("record,car,mileage\ncar,Ford,12000\n")
+        status, output = run_cli(['--file', file_name, 'import', import_file_name])
+        assert status == 0, output
+
+        status, output = run_cli(['--file', file_name, 'due'])
+        assert status == 0 and "Honda\tOil change" in output, output
+
+        car_data = storage.JournaledPickleStorage(file_name).load()
+        assert car_data.get_car_list() == ['Honda', 'Ford'], car_data.get_car_list()
+        assert car_data.get_mileage('Honda') == 52000
+        storage.open_journals.pop(os.path.abspath(file_name)).close()
+
+
+#
+# The messages printed while the command line loads the data file must not be mixed into
+# output written to stdout (e.g. `due --csv`), and a data file that cannot be read must fail
+# the command instead of running it on an empty fleet
+#
+def test_cli_load_errors():
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'CarMaintenance.bak')
+        errors = io.StringIO()
+        with contextlib.redirect_stderr(errors):
+            status, output = run_cli(['--file', file_name, 'due', '--csv'])
+        assert status == 2 and output == "" and file_name in errors.getvalue(), (output, errors.getvalue())
+
+        file_name = os.path.join(directory, 'CarMaintenance.dat')
+        session = storage.JournaledPickleStorage(file_name)
+        car_data = session.load()
+        car_data.add_car('Honda', 52000)
+        session.close()
+        with open(session.journal_file_name, 'a', encoding='utf-8') as journal:
+            journal.write('not a record\n["set_mileage","Ford",1000]\n')
+        errors = io.StringIO()
+        with contextlib.redirect_stderr(errors):
+            status, output = run_cli(['--file', file_name, 'due', '--csv'])
+        assert status == 0 and output == "car,item,mileage,due_date\n", output
+        assert errors.getvalue().count("Skipped") == 2, errors.getvalue()
+
+
+#
+# The app stopping while a journal record is written leaves a partly written last line - the
+# changes journaled in the next session must not be appended to it (and lost with it)
+#
+def test_torn_journal_record():
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'CarMaintenance.dat')
+        session = storage.JournaledPickleStorage(file_name)
+        car_data = session.load()
+        car_data.add_car('Honda', 52000)
+        session.close()
+        with open(session.journal_file_name, 'a', encoding='utf-8') as journal:
+            journal.write('["set_mileage","Honda",53')
+
+        for mileage, car_name in ((54000, 'Ford'), (55000, 'Mazda')):
+            session = storage.JournaledPickleStorage(file_name)
+            car_data = session.load()
+            car_data.set_mileage('Honda', mileage)
+            car_data.add_car(car_name, 1000)
+            session.close()
+
+        session = storage.JournaledPickleStorage(file_name)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            car_data = session.load()
+        session.close()
+        assert car_data.get_car_list() == ['Honda', 'Ford', 'Mazda'], car_data.get_car_list()
+        assert car_data.get_mileage('Honda') == 55000
+        assert output.getvalue() == "", output.getvalue()
+
+
+#
+# Migrating the pickle file to a new SQLite database must replay the journal over it, the
+# journal holds every change made since the snapshot was written
+#
+def test_migrate_journal():
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'CarMaintenance.dat')
+        storage.PickleStorage(file_name).save(cm.CarMaintenance())
+        session = storage.JournaledPickleStorage(file_name)
+        car_data = session.load()
+        car_data.add_car('Honda', 52000)
+        car_data.add_car_items('Honda', 'Oil change', 5000, 6, 45000, date(2020, 1, 1))
+        session.close()
+
+        sqlite_storage = storage.SQLiteStorage(os.path.join(directory, 'CarMaintenance.db'))
+        car_data = sqlite_storage.load()
+        assert car_data.get_car_list() == ['Honda'], car_data.get_car_list()
+        assert car_data.get_item_last_date('Honda', 'Oil change') == date(2020, 1, 1)
+        sqlite_storage.close()
+
+
+#
+# Threads checking the status of the cars of a ConcurrentCarMaintenance read from SQLite (the
+# cars are read from the storage as they are reached) must read each car once and count every
+# status check
+#
+def test_concurrent_sqlite_status():
+    import concurrentfleet
+
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite_storage = storage.SQLiteStorage(os.path.join(directory, 'CarMaintenance.db'))
+        car_data = cm.CarMaintenance()
+        for car in range(400):
+            car_data.add_car('car%d' % car, 10000 + car)
+            car_data.add_car_items('car%d' % car, 'Oil change', 5000, 6, 4000 + 2 * car, date(2020, 1, 1))
+        sqlite_storage.save(car_data)
+        sqlite_storage.close()
+
+        sqlite_storage = storage.SQLiteStorage(sqlite_storage.file_name)
+        car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(sqlite_storage.load())
+        car_names = car_data.get_car_list()
+
+        def check_cars(thread):
+            for car_name in car_names[thread % 2::2] + car_names[(thread + 1) % 2::2]:
+                car_data.does_car_need_maintenance(car_name)
+
+        threads = [threading.Thread(target=check_cars, args=(thread,)) for thread in range(8)]
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        stats = car_data.get_status_cache_stats()
+        assert car_data.cars.unloaded == 0, car_data.cars.unloaded
+        assert stats == {'hits': 7 * len(car_names), 'misses': 2 * len(car_names), 'cars': len(car_names),
+                         'items': len(car_names)}, stats
+        assert car_data.get_cars_needing_maintenance() == car_names
+        sqlite_storage.close()
+
+
+#
+# Runs the after() calls of a status worker until its requests are answered (in place of the
+# tkinter event loop), returns the statuses handed to the callback
+#
+def run_status_request(worker, request):
+    statuses = {}
+    worker.tk.function = None
+    request(statuses.update)
+    while worker.tk.function is not None:
+        function, worker.tk.function = worker.tk.function, None
+        function()
+        time.sleep(0.01)
+    return statuses
+
+
+#
+# The status worker answers the status in the status cache (or the FleetStatus) on the user
+# interface thread and sends only the cars missing from the cache to the worker threads, whose
+# checks fill the cache
+#
+def test_status_worker_cache():
+    import benchmarks
+    import concurrentfleet
+    import statusworker
+
+    class PollTimer:
+        def after(self, delay, function):
+            self.function = function
+            return 1
+
+        def after_idle(self, function):
+            return self.after(0, function)
+
+        def after_cancel(self, after_id):
+            self.function = None
+
+    car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(benchmarks.make_fleet(300, 5))
+    car_names = car_data.get_car_list()
+    expected = {car_name: any(car_data.compute_item_need(car_name, item) for item in car_data.get_items_list(car_name))
+                for car_name in car_names}
+    worker = statusworker.StatusWorker(PollTimer())
+    try:
+        assert run_status_request(worker, lambda callback: worker.request_cars(car_data, car_names, callback)) == expected
+        assert car_data.get_status_cache_stats()['cars'] == len(car_names)
+
+        car_data.set_mileage('car7', 500000)
+        known, missing = statusworker.get_known_car_status(car_data, car_names)
+        assert missing == ['car7'], missing
+        expected['car7'] = True
+        assert run_status_request(worker, lambda callback: worker.request_cars(car_data, car_names, callback)) == expected
+
+        items = run_status_request(worker, lambda callback: worker.request_items(
+            car_data, 'car7', car_data.get_items_list('car7'), callback))
+        assert items == {item: car_data.compute_item_need('car7', item) for item in car_data.get_items_list('car7')}
+
+        car_data.get_fleet_status()
+        car_data.car_status.clear()
+        known, missing = statusworker.get_known_car_status(car_data, car_names)
+        assert missing == [] and dict(known) == expected
+    finally:
+        worker.close()
+
+
+#
+# The FleetStatus columns updated by every car and item change (rows appended, updated in place,
+# tombstoned and compacted) must give the items needing maintenance in car list order, as columns
+# built from scratch and the per item checks do - with NumPy and with plain lists
+#
+def test_fleet_status_edits():
+    import random
+    import fleetstatus
+
+    numpy = fleetstatus.np
+    try:
+        for fleetstatus.np in {numpy, None}:
+            rng = random.Random(1)
+            car_data = cm.CarMaintenance()
+            for car in range(20):
+                car_data.add_car('car%d' % car, rng.randint(0, 60000))
+            car_data.get_fleet_status()
+            for step in range(3000):
+                car_names = car_data.get_car_list()
+                choice = rng.random()
+                if choice < 0.1 or not car_names:
+                    car_data.add_car('car%d' % rng.randint(0, 40), rng.randint(0, 60000))
+                elif choice < 0.15:
+                    car_data.del_car(rng.choice(car_names))
+                elif choice < 0.6:
+                    car_data.add_car_items(rng.choice(car_names), 'item%d' % rng.randint(0, 6),
+                                           rng.choice((None, 3000, 5000)), rng.choice((None, 6, 12, 24)),
+                                           rng.choice((None, rng.randint(0, 60000))),
+                                           rng.choice((None, date(2015, 1, 31) + timedelta(days=rng.randint(0, 4000)))))
+                elif choice < 0.8:
+                    car_name = rng.choice(car_names)
+                    if car_data.get_items_list(car_name):
+                        car_data.del_car_items(car_name, rng.choice(car_data.get_items_list(car_name)))
+                else:
+                    car_data.set_mileage(rng.choice(car_names), rng.randint(0, 60000))
+
+                if step % 100 == 0:
+                    expected = {}
+                    for car_name in car_data.get_car_list():
+                        for item_name in car_data.get_items_list(car_name):
+                            if car_data.compute_item_need(car_name, item_name):
+                                expected.setdefault(car_name, []).append(item_name)
+                    items_due = car_data.get_items_needing_maintenance()
+                    assert list(items_due.items()) == list(expected.items()), step
+                    assert list(fleetstatus.FleetStatus(car_data).get_items_due().items()) == list(expected.items())
+                    assert car_data.get_cars_needing_maintenance() == list(expected), step
+    finally:
+        fleetstatus.np = numpy
+
+
+#
+# The autosave writes the snapshot of the journaled data file, moving the journal aside while the
+# data is copied: with a thread changing the cars during the saves, the snapshot with the journal
+# replayed over it must hold every change exactly once (no record replayed over a snapshot
+# already holding it) and the journal must only hold the changes made since the last save
+#
+def test_autosave_journal():
+    import autosave
+    import concurrentfleet
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'CarMaintenance.dat')
+        session = storage.JournaledPickleStorage(file_name)
+        car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(session.load())
+        saver = autosave.start_autosave(car_data, file_name)
+        assert saver.journal is session
+        saver.delay = 0.0
+        for car in range(50):
+            car_data.add_car('car%d' % car, 1000)
+            car_data.add_car_items('car%d' % car, 'Oil change', 5000, 6, 0, date(2020, 1, 1))
+
+        def change_cars():
+            for mileage in range(1001, 1201):
+                for car in range(0, 50, 7):
+                    car_data.set_mileage('car%d' % car, mileage)
+                car_data.add_car_items('car%d' % (mileage % 50), 'Tires %d' % mileage, 30000, None, mileage, None)
+                if mileage > 1003:
+                    car_data.del_car_items('car%d' % ((mileage - 3) % 50), 'Tires %d' % (mileage - 3))
+                time.sleep(0.0005)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            change_cars_thread = concurrent.futures.ThreadPoolExecutor(1)
+            change_cars_thread.submit(change_cars).result()
+            change_cars_thread.shutdown()
+            saver.close()
+            assert saver.get_stats()['saves'] > 1, saver.get_stats()
+            assert not os.path.exists(session.compacting_file_name)
+            assert not os.path.exists(session.journal_file_name) or os.path.getsize(session.journal_file_name) == 0
+
+            car_data.set_mileage('car1', 5000)
+            session.flush()
+            stored, length = storage.JournaledPickleStorage(file_name).read()
+        session.close()
+        assert output.getvalue() == "", output.getvalue()
+        assert stored.get_mileage('car1') == 5000
+        assert str(stored) == str(car_data.get_snapshot())
+
+
+#
+# Restoring the backup file made by older versions (Restore with no snapshots) must change the data
+# in place, so the journal attached to it records the restored cars and the changes that follow
+#
+def test_restore_backup_file():
+    import concurrentfleet
+
+    with tempfile.TemporaryDirectory() as directory:
+        backup = cm.CarMaintenance()
+        backup.add_car('Honda', 52000)
+        backup.add_car_items('Honda', 'Oil change', 5000, 6, 45000, date(2020, 1, 1))
+        backup.add_car('Ford', 12000)
+        backup_file_name = os.path.join(directory, 'CarMaintenance.bak')
+        storage.PickleStorage(backup_file_name).save(backup)
+
+        file_name = os.path.join(directory, 'CarMaintenance.dat')
+        session = storage.JournaledPickleStorage(file_name)
+        car_data = concurrentfleet.ConcurrentCarMaintenance.from_car_data(session.load())
+        car_data.add_car('Mazda', 1000)
+        car_data.add_car('Ford', 11000)
+        car_data.restore_cars(storage.retrieve(backup_file_name))
+        car_data.set_mileage('Honda', 53000)
+        session.close()
+
+        stored, length = storage.JournaledPickleStorage(file_name).read()
+        assert stored.get_car_list() == ['Ford', 'Honda'], stored.get_car_list()
+        assert stored.get_mileage('Ford') == 12000 and stored.get_mileage('Honda') == 53000
+        assert stored.get_item_last_date('Honda', 'Oil change') == date(2020, 1, 1)
+        assert session in car_data.listeners
+
+
+tests = {
+    'add_months_closed_form': test_add_months_closed_form,
+    'cli_after_journal_only_session': test_cli_after_journal_only_session,
+    'cli_load_errors': test_cli_load_errors,
+    'torn_journal_record': test_torn_journal_record,
+    'migrate_journal': test_migrate_journal,
+    'concurrent_sqlite_status': test_concurrent_sqlite_status,
+    'status_worker_cache': test_status_worker_cache,
+    'fleet_status_edits': test_fleet_status_edits,
+    'autosave_journal': test_autosave_journal,
+    'restore_backup_file': test_restore_backup_file,
+}
+
+
+#
+# Runs the tests named on the command line (all of them if none named)
+#
+def main(args):
+    names = args or list(tests)
+    for name in names:
+        if name not in tests:
+            print("Unknown test " + name + " (choose from: " + ", ".join(tests) + ")")
+            return 1
+    failed = 0
+    for name in names:
+        try:
+            tests[name]()
+            print("ok      " + name)
+        except Exception:
+            failed += 1
+            print("FAILED  " + name)
+            traceback.print_exc()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
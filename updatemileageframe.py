@@ -15,6 +15,7 @@ FUNCTION
                                       object, and initializes the widgets in the window
                                       allowing the user update the current mileage for the
                                       selected car in the maintenance list
+    refresh                        -- shows the selected car and its mileage each time the view is shown
     do_update                      -- update the mileage in cm.car_data object and return control
                                       to the ItemsFrame object
     do_cancel                      -- returns control to the ItemsFrame object
@@ -31,7 +32,7 @@ DATA
 import carmaintenance as cm
 import validation as v
 from tkinter import *
-from PIL import ImageTk, Image
+import assets
 
 
 #
@@ -49,15 +50,11 @@ class UpdateMileageFrame:
         self.frame.pack(fill=BOTH, expand=TRUE)
 
         # Create and insert phone background image
-        load_file = "phone-background.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-background.png")
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=0, y=0, relwidth=1, relheight=1, anchor=NW)
-        load_file = "phone-hdr.png"
-        img = Image.open(load_file)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("phone-hdr.png")
         self.img_hdr_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_hdr_panel.image = photo
         self.img_hdr_panel.place(x=20, y=80, anchor=NW)
@@ -69,10 +66,7 @@ class UpdateMileageFrame:
         self.cancel_button.place(x=10, y=95, anchor=NW)
 
         # Create and insert car image
-        load_file = "car.png"
-        img = Image.open(load_file)
-        img = img.resize((75,75),Image.ANTIALIAS)
-        photo = ImageTk.PhotoImage(img)
+        photo = assets.get_photo("car.png", (75, 75))
         self.img_panel = Label(self.frame, image=photo, bg=self.tk.background)
         self.img_panel.image = photo
         self.img_panel.place(x=150, y=190, anchor=CENTER)
@@ -98,7 +92,12 @@ class UpdateMileageFrame:
                                     font=("Helvetica", 10), bg=self.tk.background)
         self.update_button.place(x=150, y=515, anchor=CENTER)
 
+        self.refresh()
+
+    # shows the selected car and its mileage (called each time the view is shown)
+    def refresh(self):
         car = cm.selections.get_car_selected()
+        self.update_mileage_entry.delete(0, END)
         self.update_mileage_entry.insert(0, str(cm.car_data.get_mileage(car)))
         car_text_entry = car.replace('_', ' ')
         self.car_name_label.config(text=car_text_entry)
@@ -106,14 +105,15 @@ class UpdateMileageFrame:
 
     # update the mileage in cm.car_data object and return control to ItemsFrame view
     def do_update(self):
-        mileage = self.update_mileage_entry.get()
+        mileage, error = v.parse_number(self.update_mileage_entry.get())
 
         # validate mileage was entered as valid number
-        if not v.is_valid_number(mileage):
+        if mileage is None:
             self.info_label.config(text="Enter mileage as a number!")
         else:
             car = cm.selections.get_car_selected()
-            cm.car_data.set_mileage(car, mileage)
+            with self.master.data_lock.write_locked():
+                cm.car_data.set_mileage(car, mileage)
             self.master.activate_items_window()
 
     # activates the ItemsFrame view
@@ -5,49 +5,128 @@ Name
 DESCRIPTION
     This module contains functions for validating the user input
 
+    The parse functions validate and convert the text in one pass, returning (value, error)
+    where error is None when the text is valid and one of the error messages below when not,
+    so the text never has to be parsed again to get its value.  Blank text is valid for the
+    parse functions and gives None.  The parse_numbers/parse_dates forms validate a whole
+    column of values at once (e.g. for bulk imports).  The is_valid functions are kept for
+    the callers only needing to know if the text is valid.
+
 CLASS
     None
 
 FUNCTION
+   parse_number                -- returns (non-negative integer or None if blank, error)
+   parse_date                  -- returns (date or None if blank, error) for mm/dd/yyyy text
+   parse_numbers               -- returns ([value], {index: error}) for a column of numbers
+   parse_dates                 -- returns ([value], {index: error}) for a column of dates
    is_valid_number             -- returns true if text is positive integer
    is_valid_number_or_blank    -- returns true if text is positive integer or blank
-   is_valid_day                -- returns true if day value is valid for the selected month
-   is_valid_date               -- returns true if date value is a valid date (mm/dd/yy format)
+   is_valid_day                -- returns true if day value is valid for the selected month (and year)
+   is_valid_date               -- returns true if date value is a valid date (mm/dd/yyyy format)
 
 DATA
     text                       -- contains the user input in string format
+    number_error               -- error for text that is not a non-negative integer
+    date_format_error          -- error for text that is not in the mm/dd/yyyy format
+    date_range_error           -- error for a month or day that does not exist (e.g. 02/30/2024)
+    date_pattern               -- compiled pattern matching mm/dd/yyyy (one or two digit month and day)
 """
 
 import re
+from datetime import date
 
+number_error = "Not a number"
+date_format_error = "Not a mm/dd/yyyy date"
+date_range_error = "Not a valid date"
+date_pattern = re.compile(r'(\d\d?)/(\d\d?)/(\d\d\d\d)\Z', re.ASCII)
 
-# validate text entered is a non-negative integer
-def is_valid_number(text):
 
-    is_valid = True
+# parse text entered as a non-negative integer, blank text is None
+def parse_number(text):
+    if text.isdecimal():
+        return int(text), None
+    if text == "":
+        return None, None
+
+    # slow path for the text int() also accepts, e.g. surrounding spaces
     try:
         value = int(text)
-        if value < 0:
-            raise ValueError
     except ValueError:
-        is_valid = False
-    return is_valid
+        return None, number_error
+    if value < 0:
+        return None, number_error
+    return value, None
+
+
+# parse a date entered as mm/dd/yyyy, blank text is None
+def parse_date(text):
+    date_match = date_pattern.match(text)
+    if date_match is None:
+        if text == "":
+            return None, None
+        return None, date_format_error
+    month, day, year = date_match.groups()
+    try:
+        return date(int(year), int(month), int(day)), None
+    except ValueError:
+        return None, date_range_error
+
+
+# parse a list of numbers, returns the values (None if blank or invalid) and the errors by index -
+# the plain digits are converted in one pass and only the other texts are parsed one at a time
+def parse_numbers(texts):
+    values = [int(text) if text.isdecimal() else None for text in texts]
+    errors = {}
+    index = 0
+    while True:
+        try:
+            index = values.index(None, index)
+        except ValueError:
+            return values, errors
+        values[index], error = parse_number(texts[index])
+        if error is not None:
+            errors[index] = error
+        index += 1
+
+
+# parse a column of dates (each distinct text is only parsed once), returns the values (None if
+# blank or invalid) and the errors by index
+def parse_dates(texts):
+    values = []
+    errors = {}
+    parsed = {}
+    append = values.append
+    for index, text in enumerate(texts):
+        result = parsed.get(text)
+        if result is None:
+            result = parsed[text] = parse_date(text)
+        if result[1] is not None:
+            errors[index] = result[1]
+        append(result[0])
+    return values, errors
+
+
+# validate text entered is a non-negative integer
+def is_valid_number(text):
+    return text != "" and parse_number(text)[1] is None
 
 
 # validate text entered is a non-negative integer or blank
 def is_valid_number_or_blank(text):
-    is_valid = True
-    if text != "":
-        is_valid = is_valid_number(text)
-    return is_valid
+    return parse_number(text)[1] is None
 
 
-# validate the day selected based on the month selected
-def is_valid_day(month, day):
+# validate the day selected based on the month selected, February 29th is only valid in
+# leap years (and is accepted when no year is given)
+def is_valid_day(month, day, year=None):
     is_valid = True
     if int(month) in [2,4,6,9,11]: # Feb, April, June, Sept, Nov
         if int(month) == 2:    # February
-            if int(day) > 28:  # no leap year logic at this time, sorry!
+            if year is None or (int(year) % 4 == 0 and (int(year) % 100 != 0 or int(year) % 400 == 0)):
+                if int(day) > 29:
+                    is_valid = False
+            elif int(day) > 28:
                 is_valid = False
         else:
             if int(day) > 30:
@@ -58,19 +137,6 @@ def is_valid_day(month, day):
     return is_valid
 
 
-# validate a date in the format mm/dd/yy was entered
+# validate a date in the format mm/dd/yyyy was entered
 def is_valid_date(text):
-    is_valid = True
-    if text != "":
-        date_match = re.match('^[0-9][0-9][/](.*)[0-9][0-9][/](.*)[0-9][0-9]$', text)
-        if date_match is not None:
-            extract_date = re.split('[/]', text)
-            month = extract_date[0]
-            if int(month) > 12:
-                is_valid = False
-            else:
-                day = extract_date[1]
-                is_valid = is_valid_day(month, day)
-        else:
-            is_valid = False
-    return is_valid
+    return parse_date(text)[1] is None
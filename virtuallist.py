@@ -0,0 +1,135 @@
+"""
+Name
+    virtuallist
+
+DESCRIPTION
+    This module contains the list box used for lists too long to insert into a Listbox.
+    Only the rows visible are inserted into the Listbox, the text and background color of a
+    row are asked for when the row is scrolled into view, so showing or scrolling the list
+    takes the same time for ten rows as for a hundred thousand.  The scrollbar, mouse wheel
+    and selection are mapped from the visible rows to the rows of the whole list.
+
+CLASS
+    VirtualListbox        -- list box inserting only its visible rows
+
+FUNCTION
+                            -- VirtualListbox methods
+    __init__              -- creates the Listbox and Scrollbar and stores the row text/color functions
+    set_row_count         -- sets the number of rows in the list and shows the first rows
+    redraw                -- inserts the visible rows into the Listbox and updates the scrollbar
+    recolor               -- sets the background color of the visible rows again
+    yview                 -- scrolls the list (called by the scrollbar)
+    on_mouse_wheel        -- scrolls the list with the mouse wheel
+    see                   -- scrolls a row into view
+    curselection          -- returns the row selected (as the Listbox method)
+    get                   -- returns the text of a row (as the Listbox method)
+    bind                  -- binds an event to the Listbox
+    place                 -- places the Listbox
+    config                -- configures the Listbox
+
+DATA
+    self.listbox          -- Listbox holding the visible rows
+    self.scrollbar        -- Scrollbar of the whole list
+    self.get_text         -- function returning the text of a row from its index
+    self.get_color        -- function returning the background color of a row (None for the default)
+    self.row_count        -- number of rows in the list
+    self.first            -- index of the first row visible
+    self.height           -- number of rows visible
+"""
+
+from tkinter import *
+
+
+#
+# List box inserting only its visible rows into a Listbox
+#
+class VirtualListbox:
+
+    # creates the Listbox and Scrollbar, get_text(index) and get_color(index) give the text
+    # and background color of a row
+    def __init__(self, master, get_text, get_color=None, height=10, **options):
+        self.get_text = get_text
+        self.get_color = get_color
+        self.height = height
+        self.row_count = 0
+        self.first = 0
+        self.scrollbar = Scrollbar(master, orient="vertical", command=self.yview)
+        self.listbox = Listbox(master, exportselection=0, height=height, **options)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.listbox.bind(sequence, self.on_mouse_wheel)
+
+    # sets the number of rows in the list, keeping the scroll position if the rows are still there
+    def set_row_count(self, row_count):
+        self.row_count = row_count
+        self.first = max(0, min(self.first, row_count - self.height))
+        self.redraw()
+
+    # inserts the visible rows into the Listbox and updates the scrollbar
+    def redraw(self):
+        self.listbox.delete(0, END)
+        last = min(self.first + self.height, self.row_count)
+        for index in range(self.first, last):
+            self.listbox.insert(END, self.get_text(index))
+        self.recolor()
+        if self.row_count > 0:
+            self.scrollbar.set(self.first / self.row_count, last / self.row_count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    # sets the background color of the visible rows again (e.g. when their status changed)
+    def recolor(self):
+        if self.get_color is None:
+            return
+        for row in range(min(self.height, self.row_count - self.first)):
+            color = self.get_color(self.first + row)
+            if color is not None:
+                self.listbox.itemconfig(row, {'bg': color})
+
+    # scrolls the list, called by the scrollbar with ('moveto', fraction) or ('scroll', count, 'units'/'pages')
+    def yview(self, *args):
+        first = self.first
+        if args[0] == 'moveto':
+            first = int(float(args[1]) * self.row_count)
+        elif args[0] == 'scroll':
+            count = int(args[1])
+            first += count * self.height if args[2] == 'pages' else count
+        first = max(0, min(first, self.row_count - self.height))
+        if first != self.first:
+            self.first = first
+            self.redraw()
+
+    # scrolls the list three rows at a time with the mouse wheel
+    def on_mouse_wheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.yview('scroll', -3, 'units')
+        else:
+            self.yview('scroll', 3, 'units')
+        return "break"
+
+    # scrolls the row into view
+    def see(self, index):
+        if index < self.first:
+            self.yview('moveto', index / max(self.row_count, 1))
+        elif index >= self.first + self.height:
+            self.first = max(0, min(index - self.height + 1, self.row_count - self.height))
+            self.redraw()
+
+    # returns the indexes of the rows selected in the whole list
+    def curselection(self):
+        return tuple(self.first + row for row in self.listbox.curselection())
+
+    # returns the text of the row
+    def get(self, index):
+        return self.get_text(index)
+
+    # binds the event to the Listbox
+    def bind(self, sequence, function):
+        self.listbox.bind(sequence, function)
+
+    # places the Listbox
+    def place(self, **options):
+        self.listbox.place(**options)
+
+    # configures the Listbox
+    def config(self, **options):
+        self.listbox.config(**options)